@@ -0,0 +1,45 @@
+"""Add contact intake queue
+
+Revision ID: 1234d0ef3b1f
+Revises: b51d0e7f9c28
+Create Date: 2026-10-18 19:51:04.243853
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1234d0ef3b1f'
+down_revision: Union[str, Sequence[str], None] = 'b51d0e7f9c28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('contact_intake',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('lead_identifier', sa.String(), nullable=False),
+    sa.Column('source_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('available_at', sa.DateTime(), nullable=False),
+    sa.Column('processed_at', sa.DateTime(), nullable=True),
+    sa.Column('contact_id', sa.Integer(), nullable=True),
+    sa.Column('operator_id', sa.Integer(), nullable=True),
+    sa.Column('error', sa.String(), nullable=True),
+    sa.ForeignKeyConstraint(['contact_id'], ['contacts.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # Covers the workers' claim query (due pending rows, oldest first)
+    op.create_index('ix_contact_intake_status_available_at', 'contact_intake', ['status', 'available_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_contact_intake_status_available_at', table_name='contact_intake')
+    op.drop_table('contact_intake')
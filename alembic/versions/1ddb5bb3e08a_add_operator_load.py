@@ -0,0 +1,36 @@
+"""Add operator load
+
+Revision ID: 1ddb5bb3e08a
+Revises: 1234d0ef3b1f
+Create Date: 2026-10-18 20:02:11.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1ddb5bb3e08a'
+down_revision: Union[str, Sequence[str], None] = '1234d0ef3b1f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('operators', sa.Column('load', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill with every assigned contact (the default all_time policy);
+    # the app re-syncs it for the configured policy on startup
+    op.execute(
+        "UPDATE operators SET load = "
+        "(SELECT count(contacts.id) FROM contacts WHERE contacts.operator_id = operators.id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('operators') as batch_op:
+        batch_op.drop_column('load')
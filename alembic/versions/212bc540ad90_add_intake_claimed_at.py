@@ -0,0 +1,29 @@
+"""Add intake claimed_at
+
+Revision ID: 212bc540ad90
+Revises: b64fb82100e1
+Create Date: 2026-10-18 22:41:07.118402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '212bc540ad90'
+down_revision: Union[str, Sequence[str], None] = 'b64fb82100e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('contact_intake', sa.Column('claimed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('contact_intake') as batch_op:
+        batch_op.drop_column('claimed_at')
@@ -0,0 +1,27 @@
+"""Index intake contact_id
+
+Revision ID: 4382d5f18efb
+Revises: f81f76ac7b98
+Create Date: 2026-10-19 00:41:12.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4382d5f18efb'
+down_revision: Union[str, Sequence[str], None] = 'f81f76ac7b98'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_contact_intake_contact_id', 'contact_intake', ['contact_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_contact_intake_contact_id', table_name='contact_intake')
@@ -0,0 +1,45 @@
+"""Add hot path indexes
+
+Revision ID: 4c7e2b9d1a35
+Revises: dc2da2167281
+Create Date: 2026-10-18 10:12:41.301554
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c7e2b9d1a35'
+down_revision: Union[str, Sequence[str], None] = 'dc2da2167281'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The id columns are INTEGER PRIMARY KEYs (rowid aliases), so these
+    # indexes duplicate the table itself and only slow down inserts
+    op.drop_index(op.f('ix_contacts_id'), table_name='contacts')
+    op.drop_index(op.f('ix_leads_id'), table_name='leads')
+    op.drop_index(op.f('ix_operators_id'), table_name='operators')
+    op.drop_index(op.f('ix_sources_id'), table_name='sources')
+
+    op.create_index('ix_contacts_operator_id_created_at', 'contacts', ['operator_id', 'created_at'], unique=False)
+    op.create_index('ix_contacts_source_id_operator_id', 'contacts', ['source_id', 'operator_id'], unique=False)
+    op.create_index('ix_contacts_created_at', 'contacts', ['created_at'], unique=False)
+    op.create_index('ix_contacts_lead_id', 'contacts', ['lead_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_contacts_lead_id', table_name='contacts')
+    op.drop_index('ix_contacts_created_at', table_name='contacts')
+    op.drop_index('ix_contacts_source_id_operator_id', table_name='contacts')
+    op.drop_index('ix_contacts_operator_id_created_at', table_name='contacts')
+
+    op.create_index(op.f('ix_sources_id'), 'sources', ['id'], unique=False)
+    op.create_index(op.f('ix_operators_id'), 'operators', ['id'], unique=False)
+    op.create_index(op.f('ix_leads_id'), 'leads', ['id'], unique=False)
+    op.create_index(op.f('ix_contacts_id'), 'contacts', ['id'], unique=False)
@@ -0,0 +1,31 @@
+"""Add source config version and config operator index
+
+Revision ID: 86c6fe2d2ab1
+Revises: 1ddb5bb3e08a
+Create Date: 2026-10-18 20:41:37.209514
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '86c6fe2d2ab1'
+down_revision: Union[str, Sequence[str], None] = '1ddb5bb3e08a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('sources', sa.Column('config_version', sa.Integer(), server_default='0', nullable=False))
+    op.create_index('ix_source_operator_configs_operator_id', 'source_operator_configs', ['operator_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_source_operator_configs_operator_id', table_name='source_operator_configs')
+    with op.batch_alter_table('sources') as batch_op:
+        batch_op.drop_column('config_version')
@@ -0,0 +1,73 @@
+"""Add distribution counter tables
+
+Revision ID: 8f3a6d2c5b17
+Revises: 4c7e2b9d1a35
+Create Date: 2026-10-18 11:40:05.118230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f3a6d2c5b17'
+down_revision: Union[str, Sequence[str], None] = '4c7e2b9d1a35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('contact_totals',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('operator_contact_counts',
+    sa.Column('operator_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['operator_id'], ['operators.id'], ),
+    sa.PrimaryKeyConstraint('operator_id')
+    )
+    op.create_table('source_contact_counts',
+    sa.Column('source_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['source_id'], ['sources.id'], ),
+    sa.PrimaryKeyConstraint('source_id')
+    )
+    op.create_table('operator_source_contact_counts',
+    sa.Column('operator_id', sa.Integer(), nullable=False),
+    sa.Column('source_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['operator_id'], ['operators.id'], ),
+    sa.ForeignKeyConstraint(['source_id'], ['sources.id'], ),
+    sa.PrimaryKeyConstraint('operator_id', 'source_id')
+    )
+
+    # Backfill from existing contacts (same as `python -m app.stats rebuild`)
+    op.execute(
+        "INSERT INTO contact_totals (id, count) SELECT 1, count(id) FROM contacts"
+    )
+    op.execute(
+        "INSERT INTO operator_contact_counts (operator_id, count) "
+        "SELECT operator_id, count(id) FROM contacts WHERE operator_id IS NOT NULL GROUP BY operator_id"
+    )
+    op.execute(
+        "INSERT INTO source_contact_counts (source_id, count) "
+        "SELECT source_id, count(id) FROM contacts GROUP BY source_id"
+    )
+    op.execute(
+        "INSERT INTO operator_source_contact_counts (operator_id, source_id, count) "
+        "SELECT operator_id, source_id, count(id) FROM contacts "
+        "WHERE operator_id IS NOT NULL GROUP BY operator_id, source_id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('operator_source_contact_counts')
+    op.drop_table('source_contact_counts')
+    op.drop_table('operator_contact_counts')
+    op.drop_table('contact_totals')
@@ -0,0 +1,35 @@
+"""Add contact status
+
+Revision ID: a12edc9d7345
+Revises: 86c6fe2d2ab1
+Create Date: 2026-10-18 21:06:52.118604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a12edc9d7345'
+down_revision: Union[str, Sequence[str], None] = '86c6fe2d2ab1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The server default backfills every existing contact as open, which
+    # matches how they were counted before (all_time)
+    op.add_column('contacts', sa.Column('status', sa.String(), server_default='open', nullable=False))
+    op.add_column('contacts', sa.Column('closed_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_contacts_open_operator_id', 'contacts', ['operator_id'], unique=False, sqlite_where=sa.text("status = 'open'"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_contacts_open_operator_id', table_name='contacts', sqlite_where=sa.text("status = 'open'"))
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.drop_column('closed_at')
+        batch_op.drop_column('status')
@@ -0,0 +1,44 @@
+"""Add contact rollups
+
+Revision ID: b51d0e7f9c28
+Revises: 8f3a6d2c5b17
+Create Date: 2026-10-18 12:55:37.640912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b51d0e7f9c28'
+down_revision: Union[str, Sequence[str], None] = '8f3a6d2c5b17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('contact_rollups',
+    sa.Column('granularity', sa.String(), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('operator_id', sa.Integer(), nullable=False),
+    sa.Column('source_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('granularity', 'bucket_start', 'operator_id', 'source_id')
+    )
+
+    # Backfill existing contacts as hour buckets; the compaction job folds
+    # the old ones into days on its first run
+    op.execute(
+        "INSERT INTO contact_rollups (granularity, bucket_start, operator_id, source_id, count) "
+        "SELECT 'hour', strftime('%Y-%m-%d %H:00:00.000000', created_at) AS bucket, "
+        "coalesce(operator_id, 0) AS op, source_id, count(id) FROM contacts "
+        "GROUP BY bucket, op, source_id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('contact_rollups')
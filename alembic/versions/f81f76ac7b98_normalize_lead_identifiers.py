@@ -0,0 +1,63 @@
+"""Normalize lead identifiers
+
+Revision ID: f81f76ac7b98
+Revises: 212bc540ad90
+Create Date: 2026-10-18 22:58:40.203516
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f81f76ac7b98'
+down_revision: Union[str, Sequence[str], None] = '212bc540ad90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+_PAGE_SIZE = 10000
+
+
+def _normalize(identifier: str) -> str:
+    # Frozen copy of app.crud.normalize_identifier
+    identifier = identifier.strip()
+    return identifier.lower() if "@" in identifier else identifier
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Leads are now looked up by their normalized identifier. Rewrite the
+    # ones stored before that, unless the normalized form already exists: two
+    # leads are not merged here, the older spelling just stops matching.
+    # Every lead is compared in Python: SQLite's lower() and trim() only know
+    # ASCII, while _normalize strips and lower-cases Unicode.
+    conn = op.get_bind()
+    taken = set()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.text("SELECT id, identifier FROM leads WHERE id > :last ORDER BY id LIMIT :size"),
+            {"last": last_id, "size": _PAGE_SIZE},
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        for lead_id, identifier in rows:
+            if identifier is None:
+                continue
+            target = _normalize(identifier)
+            if target == identifier or target in taken:
+                continue
+            exists = conn.execute(sa.text("SELECT 1 FROM leads WHERE identifier = :i"), {"i": target}).first()
+            if exists is None:
+                conn.execute(sa.text("UPDATE leads SET identifier = :i WHERE id = :id"), {"i": target, "id": lead_id})
+                taken.add(target)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The original spellings are not kept
+    pass
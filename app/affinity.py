@@ -0,0 +1,105 @@
+"""
+Sticky lead -> operator routing (AFFINITY_MODE).
+
+With "source", a returning lead goes back to the operator that had it last
+for the same source; with "any", to the operator that had it last for any
+source. The previous operators live in a size-bounded LRU map, warmed at
+startup from the most recent AFFINITY_CACHE_SIZE contacts and updated after
+every commit that assigns one.
+
+A hit skips the weighted draw and costs only the usual one-statement claim.
+If that operator is inactive, at its limit or (with "source") no longer
+configured for the source, the lead gets a normal draw and the map follows
+the new operator. Each process keeps its own map, so a lead last assigned
+by another worker may still go to its previous operator here.
+"""
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from . import metrics, models
+from .cache import LRUCache
+from .config import settings
+
+OFF = "off"
+SOURCE = "source"
+ANY = "any"
+
+
+class AffinityMap:
+    def __init__(self, maxsize: int):
+        self._cache = LRUCache(maxsize)
+        # Hits whose operator could not take the contact
+        self.stale = 0
+
+    @property
+    def mode(self) -> str:
+        return settings.affinity_mode
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != OFF
+
+    def _key(self, lead_id: int, source_id: int):
+        return (lead_id, source_id) if self.mode == SOURCE else lead_id
+
+    def lookup(self, lead_id: int, source_id: int) -> int | None:
+        if not self.enabled:
+            return None
+        operator_id = self._cache.get(self._key(lead_id, source_id))
+        if operator_id is None:
+            metrics.affinity_lookups.inc("miss")
+        return operator_id
+
+    def reused(self):
+        metrics.affinity_lookups.inc("hit")
+
+    def refused(self):
+        self.stale += 1
+        metrics.affinity_lookups.inc("stale")
+
+    def remember(self, lead_id: int, source_id: int, operator_id: int | None):
+        # Call after commit; unassigned contacts keep the previous operator
+        if self.enabled and operator_id is not None:
+            self._cache.put(self._key(lead_id, source_id), operator_id)
+
+    async def warm(self, db: AsyncSession) -> int:
+        """Loads the most recent assigned contacts, newest last so they are the most recently used."""
+        if not self.enabled or self._cache.maxsize <= 0:
+            return 0
+        contact = models.Contact
+        last_id = (await db.execute(select(func.max(contact.id)))).scalar_one()
+        if last_id is None:
+            return 0
+        # A primary key range rather than ORDER BY id DESC LIMIT, so it is a seek
+        result = await db.execute(
+            select(contact.lead_id, contact.source_id, contact.operator_id)
+            .where(contact.id > last_id - self._cache.maxsize, contact.operator_id.is_not(None))
+            .order_by(contact.id)
+        )
+        rows = result.all()
+        for lead_id, source_id, operator_id in rows:
+            self._cache.put(self._key(lead_id, source_id), operator_id)
+        return len(rows)
+
+    def clear(self):
+        self._cache.clear()
+        self.stale = 0
+
+    def stats(self) -> dict:
+        cache = self._cache.stats()
+        lookups = cache["hits"] + cache["misses"]
+        reused = cache["hits"] - self.stale
+        return {
+            "mode": self.mode,
+            "size": cache["size"],
+            "maxsize": cache["maxsize"],
+            "lookups": lookups,
+            "reused": reused,
+            "stale": self.stale,
+            "misses": cache["misses"],
+            # Contacts that went back to their previous operator
+            "hit_rate": reused / lookups if lookups else 0.0,
+        }
+
+
+assignments = AffinityMap(settings.affinity_cache_size)
@@ -0,0 +1,127 @@
+"""
+Hot/cold archival of old contacts.
+
+archive() moves contacts created more than ARCHIVE_AFTER_DAYS ago from
+contacts to contacts_archive, ARCHIVE_BATCH_SIZE rows per transaction with a
+short pause in between, so the writer lock is never held for long and the
+hot table (and every query on it) only holds recent contacts.
+
+Only contacts that no longer count towards a workload are moved: under the
+"open" policy open contacts stay, under "window" nothing inside the window
+moves. Under "all_time" the workload queries count the archive too (see
+workload.counts_archived). The distribution counters and rollups are not
+touched, so GET /stats/ and /stats/timeseries keep reporting archived
+contacts; stats.check/rebuild aggregate over both tables. Exports read both
+tables too. contact_intake.contact_id is cleared for moved contacts, since it
+references contacts.
+
+    python -m app.archive              # uses ARCHIVE_AFTER_DAYS
+    python -m app.archive --days 90
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, literal, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from . import metrics, models, workload
+from .config import settings
+from .rollups import utcnow
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = ["id", "lead_id", "source_id", "operator_id", "created_at", "status", "closed_at"]
+
+
+def cutoff_for(days: int, now: datetime | None = None) -> datetime:
+    cutoff = (now or utcnow()) - timedelta(days=days)
+    if workload.counters.policy == workload.WINDOW:
+        # Contacts inside the window still count towards the workload
+        cutoff = min(cutoff, workload.window_start())
+    return cutoff
+
+
+def archivable(cutoff: datetime) -> list:
+    contact = models.Contact
+    conditions = [contact.created_at < cutoff]
+    if workload.counters.policy == workload.OPEN:
+        conditions.append(contact.status == models.Contact.CLOSED)
+    return conditions
+
+
+async def archive_batch(db: AsyncSession, cutoff: datetime, batch_size: int) -> int:
+    """Moves about batch_size archivable contacts, oldest first, in one transaction."""
+    contact = models.Contact
+    # Bound the batch by id instead of binding a list of ids (ids grow with
+    # created_at); the condition is re-checked by the INSERT and DELETE,
+    # which run under the write lock
+    first_ids = (
+        select(contact.id).where(*archivable(cutoff)).order_by(contact.created_at).limit(batch_size).subquery()
+    )
+    last_id = (await db.execute(select(func.max(first_ids.c.id)))).scalar_one()
+    if last_id is None:
+        return 0
+    batch = [contact.id <= last_id, *archivable(cutoff)]
+    await db.execute(insert(models.ContactArchive).from_select(
+        _COLUMNS + ["archived_at"],
+        select(*[getattr(contact, name) for name in _COLUMNS], literal(utcnow())).where(*batch),
+    ))
+    intake = models.ContactIntake
+    await db.execute(
+        update(intake)
+        .where(intake.contact_id.in_(select(contact.id).where(*batch)))
+        .values(contact_id=None)
+        .execution_options(synchronize_session=False)
+    )
+    moved = (await db.execute(delete(contact).where(*batch))).rowcount
+    await db.commit()
+    metrics.contacts_archived.inc(amount=moved)
+    return moved
+
+
+async def archive(session_factory, days: int, batch_size: int | None = None, pause: float | None = None) -> int:
+    """Moves every archivable contact older than `days`, returns how many were moved."""
+    batch_size = batch_size or settings.archive_batch_size
+    pause = settings.archive_batch_pause_ms / 1000 if pause is None else pause
+    cutoff = cutoff_for(days)
+    total = 0
+    while True:
+        async with session_factory() as db:
+            moved = await archive_batch(db, cutoff, batch_size)
+        total += moved
+        if not moved:
+            return total
+        # Let other writers in between batches
+        await asyncio.sleep(pause)
+
+
+async def archive_forever(session_factory, days: int, interval: float):
+    while True:
+        try:
+            moved = await archive(session_factory, days)
+            if moved:
+                logger.info("Archived %d contact(s)", moved)
+        except Exception:
+            logger.exception("Contact archival failed")
+        await asyncio.sleep(interval)
+
+
+async def _main(days: int, batch_size: int) -> int:
+    from .database import AsyncSessionLocal
+
+    moved = await archive(AsyncSessionLocal, days, batch_size)
+    print(f"Archived {moved} contact(s) created before {cutoff_for(days):%Y-%m-%d %H:%M:%S} UTC")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old contacts to contacts_archive")
+    parser.add_argument("--days", type=int, default=settings.archive_after_days,
+                        help="Archive contacts older than this (default ARCHIVE_AFTER_DAYS)")
+    parser.add_argument("--batch-size", type=int, default=settings.archive_batch_size)
+    args = parser.parse_args()
+    if args.days is None:
+        parser.error("--days is required when ARCHIVE_AFTER_DAYS is not set")
+    sys.exit(asyncio.run(_main(args.days, args.batch_size)))
@@ -0,0 +1,83 @@
+from typing import Literal
+from pydantic_settings import BaseSettings
+
+
+class Settings(BaseSettings):
+    database_url: str = "sqlite+aiosqlite:///./mini_crm.db"
+    # Log every SQL statement (slow, synchronous logging; for debugging only)
+    db_echo: bool = False
+
+    # SQLite engine profile, applied to every new connection
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    # Negative values are KiB, positive values are pages (see PRAGMA cache_size)
+    sqlite_cache_size: int = -64000
+    sqlite_busy_timeout_ms: int = 5000
+    # Separate read-only pool used by the GET routes
+    read_pool_size: int = 5
+
+    # Seconds between re-syncs of the in-memory workload counters with the DB
+    workload_reconcile_interval: float = 60.0
+    # Which contacts count towards an operator's workload_limit: "open"
+    # (not yet closed), "all_time" or "window" (only the last
+    # workload_window_hours, tracked in workload_window_buckets ring-buffer slots)
+    workload_policy: Literal["open", "all_time", "window"] = "open"
+    workload_window_hours: int = 24
+    workload_window_buckets: int = 24
+    # Upper bound on items accepted by POST /contacts/batch
+    contacts_batch_max_size: int = 10000
+    # Upper bound on items accepted by POST/PATCH /operators/batch
+    operators_batch_max_size: int = 1000
+    # Seconds between checks of sources.config_version against the cached
+    # routing tables (catches weight/operator changes made by other workers)
+    routing_version_check_interval: float = 5.0
+    # identifier -> lead_id entries kept in memory; 0 disables the cache
+    lead_cache_size: int = 100_000
+    # Time-bucketed rollups: minute buckets older than this are folded into
+    # hour buckets, hour buckets into day buckets
+    rollup_minute_retention_hours: int = 48
+    rollup_hour_retention_days: int = 90
+    rollup_compact_interval: float = 300.0
+    # Archival (archive.py): contacts older than this many days are moved to
+    # contacts_archive; None disables the background job
+    archive_after_days: int | None = None
+    archive_interval: float = 3600.0
+    # Contacts moved per transaction, and the pause between transactions so
+    # other writers get the lock
+    archive_batch_size: int = 1000
+    archive_batch_pause_ms: float = 10.0
+    # Bulk lead import (lead_import.py): records per transaction / checkpoint
+    import_batch_size: int = 5000
+    # Sticky routing (affinity.py): send a returning lead to its previous
+    # operator for the same source ("source") or any source ("any")
+    affinity_mode: Literal["off", "source", "any"] = "off"
+    # lead -> operator entries kept in memory, also how many recent contacts warm it
+    affinity_cache_size: int = 100_000
+    # Group commit: POST /contacts/ requests are queued and written together
+    group_commit_enabled: bool = False
+    group_commit_window_ms: float = 5.0
+    group_commit_max_batch: int = 256
+    # Async distribution: POST /contacts/ stores the contact in the
+    # contact_intake table and answers 202; intake_workers assign them
+    async_distribution_enabled: bool = False
+    intake_workers: int = 4
+    # POST /contacts/ answers 503 once this many contacts are waiting
+    intake_max_pending: int = 10000
+    intake_max_attempts: int = 5
+    # Retry n waits intake_retry_base_seconds * 2**(n-1)
+    intake_retry_base_seconds: float = 0.5
+    # Seconds between queue polls when nothing wakes the dispatcher
+    intake_poll_interval: float = 1.0
+    # A claimed row not finished within this many seconds goes back to pending
+    intake_lease_seconds: float = 60.0
+    # Per-request SQL profiler (see profiler.py): "off", "header" (requests
+    # sending X-SQL-Profile: 1) or "always"
+    sql_profile: Literal["off", "header", "always"] = "off"
+    # Executions of one statement shape in a request that count as an N+1
+    sql_profile_n_plus_one: int = 3
+    # Finished profiles kept for GET /debug/sql-profiles
+    sql_profile_keep: int = 200
+
+
+settings = Settings()
@@ -1,17 +1,71 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
-import os
+from sqlalchemy import event
+from .config import settings
+from . import metrics, profiler
 
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./mini_crm.db")
+DATABASE_URL = settings.database_url
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+def _apply_sqlite_profile(engine, read_only: bool = False):
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+        cursor.execute(f"PRAGMA cache_size={int(settings.sqlite_cache_size)}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+# In-memory databases keep SQLAlchemy's default single-connection pool
+_memory = ":memory:" in DATABASE_URL
+
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=settings.db_echo,
+    **({} if _memory else {"poolclass": metrics.TimedQueuePool, "pool_logging_name": "write"}),
+)
+_apply_sqlite_profile(engine)
+metrics.instrument_engine(engine, "write")
+profiler.instrument_engine(engine)
+
+# Reads get their own pool so GET /stats/ and /leads/ don't queue behind
+# contact writes for a connection (with WAL they don't block on the lock either).
+# An in-memory database exists only inside its one connection, so a second
+# engine would open a separate, empty one: reads share the write engine there.
+if _memory:
+    read_engine = engine
+else:
+    read_engine = create_async_engine(
+        DATABASE_URL,
+        echo=settings.db_echo,
+        poolclass=metrics.TimedQueuePool,
+        pool_logging_name="read",
+        pool_size=settings.read_pool_size,
+    )
+    _apply_sqlite_profile(read_engine, read_only=True)
+    metrics.instrument_engine(read_engine, "read")
+    profiler.instrument_engine(read_engine)
 
 AsyncSessionLocal = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+ReadSessionLocal = sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False
+)
+
 Base = declarative_base()
 
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
+
+async def get_read_db():
+    async with ReadSessionLocal() as session:
+        yield session
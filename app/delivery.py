@@ -0,0 +1,171 @@
+"""
+Static asset and page delivery.
+
+PrecompressedStatic serves /static from memory: every file is read once at
+startup, gzip and (if the optional `brotli` package is installed) brotli
+variants are built, and each variant gets a strong ETag. Rendered template
+pages are cached per URL and revalidated with ETag / 304 Not Modified.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from fastapi import Request
+from fastapi.templating import Jinja2Templates
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from .cache import LRUCache
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+STATIC_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Pages embed the request URL, so clients must revalidate (cheap with 304s)
+PAGE_CACHE_CONTROL = "no-cache"
+# Tie-break between equal q-values, smallest first
+ENCODING_PREFERENCE = ("br", "gzip", "identity")
+# q-value of identity when Accept-Encoding doesn't mention it
+IDENTITY_QUALITY = 0.001
+
+
+def _etag(data: bytes, suffix: str = "") -> str:
+    return f'"{hashlib.sha256(data).hexdigest()[:32]}{suffix}"'
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+def _accepted_encodings(accept_encoding: str) -> dict[str, float]:
+    """Encoding -> q-value from an Accept-Encoding header (1 when not given)."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, *params = part.split(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+
+class _Asset:
+    def __init__(self, data: bytes, media_type: str):
+        self.media_type = media_type
+        # encoding -> (body, etag); "identity" is always present
+        self.variants = {"identity": (data, _etag(data))}
+        compressed = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed["br"] = brotli.compress(data, quality=11)
+        for encoding, body in compressed.items():
+            # Already-compressed formats (PNG) don't shrink; skip useless variants
+            if len(body) < len(data):
+                self.variants[encoding] = (body, _etag(data, f"-{encoding}"))
+
+    def pick(self, accept_encoding: str) -> str:
+        """The variant with the highest q-value; br, then gzip, on a tie."""
+        accepted = _accepted_encodings(accept_encoding)
+        wildcard = accepted.get("*", 0.0)
+
+        def quality(encoding: str) -> float:
+            if encoding in accepted:
+                return accepted[encoding]
+            # identity is acceptable unless excluded, but only as a last resort
+            return IDENTITY_QUALITY if encoding == "identity" else wildcard
+
+        candidates = [e for e in ENCODING_PREFERENCE if e in self.variants and quality(e) > 0]
+        return max(candidates, key=quality, default="identity")
+
+
+class PrecompressedStatic:
+    """ASGI app serving a directory from memory with precompressed variants."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.assets: dict[str, _Asset] | None = None
+
+    def load(self):
+        assets = {}
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                full_path = os.path.join(root, name)
+                rel_path = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+                media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                with open(full_path, "rb") as f:
+                    assets[rel_path] = _Asset(f.read(), media_type)
+        self.assets = assets
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if self.assets is None:
+            self.load()
+
+        if scope["method"] not in ("GET", "HEAD"):
+            response = Response(status_code=405, headers={"Allow": "GET, HEAD"})
+            await response(scope, receive, send)
+            return
+
+        # Mounted apps see the full path; the mount prefix is in root_path
+        path, root_path = scope["path"], scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        asset = self.assets.get(path.lstrip("/"))
+        if asset is None:
+            await Response("Not Found", status_code=404, media_type="text/plain")(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding = asset.pick(request_headers.get("accept-encoding", ""))
+        body, etag = asset.variants[encoding]
+        headers = {
+            "ETag": etag,
+            "Cache-Control": STATIC_CACHE_CONTROL,
+            "Vary": "Accept-Encoding",
+        }
+        if _etag_matches(request_headers.get("if-none-match"), etag):
+            await Response(status_code=304, headers=headers)(scope, receive, send)
+            return
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        if scope["method"] == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            body = b""
+        await Response(body, media_type=asset.media_type, headers=headers)(scope, receive, send)
+
+
+templates = Jinja2Templates(directory="templates")
+page_cache = LRUCache(256)
+
+
+def render_page(request: Request, name: str) -> Response:
+    """
+    Renders a template once per URL and serves it from memory afterwards,
+    answering 304 when the client already has the current version.
+    """
+    url = request.url
+    key = (name, url.scheme, url.netloc, url.path, url.query)
+    cached = page_cache.get(key)
+    if cached is None:
+        body = templates.get_template(name).render(request=request).encode()
+        cached = (body, _etag(body))
+        page_cache.put(key, cached)
+
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": PAGE_CACHE_CONTROL}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="text/html", headers=headers)
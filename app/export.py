@@ -0,0 +1,98 @@
+"""
+Streaming exports of contacts and leads as NDJSON or CSV.
+
+Rows are read through a server-side cursor (AsyncSession.stream with
+yield_per) in its own read-only session and encoded one partition at a time,
+so memory stays flat however many rows are exported and the client gets the
+first bytes as soon as the first partition is read.
+
+Archived contacts (see archive.py) are exported too: both queries read
+contacts and contacts_archive.
+"""
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from typing import AsyncIterator, Literal
+from sqlalchemy.future import select
+from sqlalchemy import exists, or_, union_all
+from . import database, models
+
+EXPORT_PARTITION_SIZE = 5000
+
+ExportFormat = Literal["ndjson", "csv"]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _as_utc(ts: datetime) -> datetime:
+    # created_at is stored as naive UTC; comparing it with an aware value's
+    # local wall time would shift the window by the client's offset
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _contact_filters(contact, source_id=None, operator_id=None, created_from=None, created_to=None) -> list:
+    # contact is models.Contact or models.ContactArchive (same columns)
+    filters = []
+    if source_id is not None:
+        filters.append(contact.source_id == source_id)
+    if operator_id is not None:
+        filters.append(contact.operator_id == operator_id)
+    if created_from is not None:
+        filters.append(contact.created_at >= _as_utc(created_from))
+    if created_to is not None:
+        filters.append(contact.created_at < _as_utc(created_to))
+    return filters
+
+
+def contacts_query(**filters):
+    # No ORDER BY: sorting would make SQLite build a temp B-tree of the whole
+    # result before the first row comes out
+    return union_all(*[
+        select(
+            contact.id, contact.lead_id, contact.source_id, contact.operator_id, contact.created_at, contact.status
+        ).where(*_contact_filters(contact, **filters))
+        for contact in (models.Contact, models.ContactArchive)
+    ])
+
+
+def leads_query(**filters):
+    """Leads, optionally only those with a contact (hot or archived) matching the filters."""
+    stmt = select(models.Lead.id, models.Lead.identifier)
+    if any(value is not None for value in filters.values()):
+        archive = models.ContactArchive
+        stmt = stmt.where(or_(
+            exists().where(models.Contact.lead_id == models.Lead.id, *_contact_filters(models.Contact, **filters)),
+            # Not correlated: the archive has no lead_id index, so its matching
+            # lead ids are collected once instead of probed per lead
+            models.Lead.id.in_(select(archive.lead_id).where(*_contact_filters(archive, **filters))),
+        ))
+    return stmt
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _encode(rows, columns: list[str], fmt: ExportFormat) -> bytes:
+    if fmt == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([[_value(v) for v in row] for row in rows])
+        return buffer.getvalue().encode()
+    return "".join(
+        json.dumps(dict(zip(columns, (_value(v) for v in row))), separators=(",", ":")) + "\n"
+        for row in rows
+    ).encode()
+
+
+async def stream_rows(stmt, fmt: ExportFormat) -> AsyncIterator[bytes]:
+    columns = [c.name for c in stmt.selected_columns]
+    if fmt == "csv":
+        yield (",".join(columns) + "\r\n").encode()
+    # The session lives as long as the response body, not the request handler
+    async with database.ReadSessionLocal() as db:
+        result = await db.stream(stmt.execution_options(yield_per=EXPORT_PARTITION_SIZE))
+        async for partition in result.partitions():
+            yield _encode(partition, columns, fmt)
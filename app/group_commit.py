@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import time
+from . import database, logic, models, schemas
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class GroupCommitWriter:
+    """
+    Collects contact creations from concurrent requests and writes them in
+    one transaction, so N requests share one commit (one fsync on SQLite)
+    instead of serializing on the writer lock.
+
+    A batch is flushed when max_batch items are queued or window_ms has passed
+    since its first item arrived. stop() lets the batch in flight commit and
+    writes everything still queued before returning.
+    """
+
+    def __init__(self, session_factory, window_ms: float, max_batch: int):
+        self.session_factory = session_factory
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self.batches = 0
+        self.items = 0
+        # Batch-size distribution; keys are power-of-two upper bounds "1", "2", "4", ...
+        self.batch_sizes: dict[str, int] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done() and not self._stopping
+
+    def start(self):
+        if not self.running:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        # No cancellation: a batch cancelled mid-flush would leave its futures
+        # pending and its reservations taken. The loop finishes the batch in
+        # flight, writes what is still queued and exits; None wakes it up.
+        self._stopping = True
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, contact: schemas.ContactCreate) -> models.Contact:
+        future = asyncio.get_running_loop().create_future()
+        if self.running:
+            self._queue.put_nowait((contact, future))
+        else:
+            # Stopping or stopped: nothing drains the queue any more
+            await self._flush([(contact, future)])
+        return await future
+
+    def _drain(self, limit: int) -> list:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while not self._stopping:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch and not self._stopping:
+                batch.extend(self._drain(self.max_batch - len(batch)))
+                remaining = deadline - time.monotonic()
+                if len(batch) >= self.max_batch or remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush([item for item in batch if item is not None])
+        # Whatever is still queued gets written before shutdown
+        while not self._queue.empty():
+            await self._flush([item for item in self._drain(self.max_batch) if item is not None])
+
+    async def _flush(self, batch: list):
+        if not batch:
+            return
+        self._record(len(batch))
+        try:
+            async with self.session_factory() as db:
+                # Unknown sources are written as-is, like the inline path does
+                created = await logic.distribute_contacts(
+                    db, [contact for contact, _ in batch], require_source=False
+                )
+        except Exception as exc:
+            logger.exception("Group commit of %d contacts failed", len(batch))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), contact in zip(batch, created):
+            if not future.done():
+                future.set_result(contact)
+
+    def _record(self, size: int):
+        self.batches += 1
+        self.items += size
+        bucket = 1
+        while bucket < size:
+            bucket *= 2
+        self.batch_sizes[str(bucket)] = self.batch_sizes.get(str(bucket), 0) + 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.running,
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items(), key=lambda kv: int(kv[0]))),
+        }
+
+
+writer = GroupCommitWriter(
+    database.AsyncSessionLocal, settings.group_commit_window_ms, settings.group_commit_max_batch
+)
@@ -0,0 +1,297 @@
+"""
+Asynchronous distribution mode (ASYNC_DISTRIBUTION_ENABLED).
+
+POST /contacts/ only writes the raw contact to the contact_intake table and
+answers 202, so the request never waits on lead lookup, operator selection or
+the contact insert. A dispatcher claims due rows in batches with a single
+UPDATE ... RETURNING and hands them to a pool of worker tasks through a
+bounded queue, so claiming stops while every worker is busy. A worker assigns
+the contact and marks its row done in the same transaction; failures are
+retried with exponential backoff until INTAKE_MAX_ATTEMPTS.
+
+The table is the queue, so nothing is lost on restart. A claimed row is
+leased to the worker that took it: a pool that stops hands its own unfinished
+rows back, and rows of a process that died go back to pending once their
+claim is INTAKE_LEASE_SECONDS old. A worker only finishes (or reschedules) a
+row that still carries the claim it took, so even if a slow worker's lease
+expires and the row is handed out again, it is assigned once.
+"""
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from . import crud, database, logic, metrics, models, schemas
+from .config import settings
+from .rollups import utcnow
+
+logger = logging.getLogger(__name__)
+
+Intake = models.ContactIntake
+
+
+class QueueFull(Exception):
+    pass
+
+
+class IntakePool:
+    def __init__(self, session_factory, workers: int, max_pending: int, max_attempts: int,
+                 retry_base: float, poll_interval: float, lease: float):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.poll_interval = poll_interval
+        self.lease = lease
+        # Claimed rows waiting for a free worker; bounded so the dispatcher
+        # only claims what the pool can start on
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=workers)
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        # Rows this pool has claimed and not finished: id -> attempts at claim
+        self._held: dict[int, int] = {}
+        self._next_sweep = 0.0
+        self._stopping = False
+        # pending + processing rows, kept in memory for the 503 check and metrics
+        self.depth = 0
+        self.in_flight = 0
+        self.done = 0
+        self.retried = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        if self.running:
+            return
+        async with self.session_factory() as db:
+            self._set_depth(await count_waiting(db))
+        self._next_sweep = 0.0
+        self._stopping = False
+        self._queue = asyncio.Queue(maxsize=self.workers)
+        self._tasks = [asyncio.create_task(self._dispatch())]
+        self._tasks += [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        if not self.running:
+            return
+        # No task is cancelled mid-transaction: the dispatcher stops claiming,
+        # workers finish the row they are on and skip the rest of the queue
+        self._stopping = True
+        self._wakeup.set()
+        dispatcher, *workers = self._tasks
+        await asyncio.gather(dispatcher, return_exceptions=True)
+        for _ in workers:
+            await self._queue.put(None)
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._tasks = []
+        # Give back what this pool claimed but did not finish; other
+        # processes' claims are left alone
+        held, self._held = self._held, {}
+        if held:
+            async with self.session_factory() as db:
+                await self._release(db, held)
+
+    async def enqueue(self, db: AsyncSession, contact: schemas.ContactCreate) -> models.ContactIntake:
+        if self.depth >= self.max_pending:
+            raise QueueFull()
+        now = utcnow()
+        row = Intake(
+            lead_identifier=contact.lead_identifier, source_id=contact.source_id,
+            status=Intake.PENDING, attempts=0, created_at=now, available_at=now,
+        )
+        db.add(row)
+        await db.commit()
+        self._set_depth(self.depth + 1)
+        self._wakeup.set()
+        return row
+
+    def _set_depth(self, depth: int):
+        self.depth = max(0, depth)
+        metrics.intake_depth.set(self.depth)
+
+    async def _release(self, db: AsyncSession, held: dict[int, int]):
+        # Only rows still under our claim: one whose lease expired may have
+        # been claimed again by someone else
+        table = Intake.__table__
+        await db.execute(
+            update(table)
+            .where(table.c.id == bindparam("b_id"), table.c.status == Intake.PROCESSING,
+                   table.c.attempts == bindparam("b_attempts"))
+            .values(status=Intake.PENDING, claimed_at=None),
+            [{"b_id": id_, "b_attempts": attempts} for id_, attempts in held.items()],
+        )
+        await db.commit()
+
+    async def _sweep(self) -> int:
+        """Returns rows whose claim outlived the lease to pending."""
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(Intake)
+                .where(Intake.status == Intake.PROCESSING, Intake.claimed_at < utcnow() - timedelta(seconds=self.lease))
+                .values(status=Intake.PENDING, claimed_at=None)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        if result.rowcount:
+            logger.warning("Released %d queued contacts whose claim expired", result.rowcount)
+        return result.rowcount
+
+    async def _claim(self, limit: int) -> list:
+        due = (
+            select(Intake.id)
+            .where(Intake.status == Intake.PENDING, Intake.available_at <= utcnow())
+            .order_by(Intake.available_at)
+            .limit(limit)
+        )
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(Intake)
+                .where(Intake.id.in_(due.scalar_subquery()))
+                .values(status=Intake.PROCESSING, attempts=Intake.attempts + 1, claimed_at=utcnow())
+                .returning(Intake.id, Intake.lead_identifier, Intake.source_id, Intake.attempts, Intake.created_at)
+                .execution_options(synchronize_session=False)
+            )
+            rows = sorted(result.all(), key=lambda row: row.id)
+            await db.commit()
+        self._held.update((row.id, row.attempts) for row in rows)
+        return rows
+
+    async def _dispatch(self):
+        while not self._stopping:
+            if time.monotonic() >= self._next_sweep:
+                self._next_sweep = time.monotonic() + self.lease / 2
+                try:
+                    await self._sweep()
+                except Exception:
+                    logger.exception("Releasing expired claims failed")
+            try:
+                rows = await self._claim(self.workers)
+            except Exception:
+                logger.exception("Claiming queued contacts failed")
+                rows = []
+            for row in rows:
+                await self._queue.put(row)  # blocks while every worker is busy
+            if len(rows) < self.workers:
+                # Drained: sleep until a new contact arrives or a retry falls due
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _work(self):
+        while True:
+            row = await self._queue.get()
+            if row is None:
+                return
+            if self._stopping:
+                continue  # still held, released by stop()
+            self.in_flight += 1
+            metrics.intake_in_flight.set(self.in_flight)
+            try:
+                await self._process(row)
+            finally:
+                self.in_flight -= 1
+                metrics.intake_in_flight.set(self.in_flight)
+
+    async def _process(self, row):
+        try:
+            async with self.session_factory() as db:
+                lead_id = await crud.resolve_lead_id(db, row.lead_identifier)
+                operator_id = await logic.select_operator(db, row.source_id, lead_id)
+                contact = await crud.create_contact(
+                    db, lead_id, row.source_id, operator_id, intake_id=row.id, intake_attempts=row.attempts
+                )
+        except Exception as exc:
+            logger.warning("Assigning queued contact %d failed (attempt %d): %s", row.id, row.attempts, exc)
+            self._held.pop(row.id, None)
+            await self._retry_or_fail(row, exc)
+            return
+        # Not in a finally: if stop() cancels us, the row is still ours to release
+        self._held.pop(row.id, None)
+        if contact is None:
+            self._lost(row)
+            return
+        self.done += 1
+        self._set_depth(self.depth - 1)
+        metrics.intake_processed.inc("done")
+        metrics.intake_lag.observe((utcnow() - row.created_at).total_seconds())
+
+    async def _retry_or_fail(self, row, exc: Exception):
+        give_up = row.attempts >= self.max_attempts
+        values = {"error": f"{type(exc).__name__}: {exc}"[:500]}
+        if give_up:
+            values.update(status=Intake.FAILED, processed_at=utcnow())
+        else:
+            delay = self.retry_base * 2 ** (row.attempts - 1)
+            values.update(status=Intake.PENDING, available_at=utcnow() + timedelta(seconds=delay))
+        try:
+            async with self.session_factory() as db:
+                result = await db.execute(
+                    update(Intake)
+                    .where(Intake.id == row.id, Intake.status == Intake.PROCESSING, Intake.attempts == row.attempts)
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+        except Exception:
+            # Still marked processing; handed out again once the lease expires
+            logger.exception("Could not reschedule queued contact %d", row.id)
+            return
+        if result.rowcount == 0:
+            self._lost(row)
+            return
+        if give_up:
+            self.failed += 1
+            self._set_depth(self.depth - 1)
+            metrics.intake_processed.inc("failed")
+        else:
+            self.retried += 1
+            metrics.intake_processed.inc("retry")
+
+    def _lost(self, row):
+        # The lease expired and the row went to another worker, which finishes it
+        logger.warning("Queued contact %d was claimed again by another worker, dropping attempt %d",
+                       row.id, row.attempts)
+        metrics.intake_processed.inc("lost")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.running,
+            "workers": self.workers,
+            "depth": self.depth,
+            "in_flight": self.in_flight,
+            "max_pending": self.max_pending,
+            "done": self.done,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+async def count_waiting(db: AsyncSession) -> int:
+    result = await db.execute(
+        select(func.count(Intake.id)).where(Intake.status.in_([Intake.PENDING, Intake.PROCESSING]))
+    )
+    return result.scalar_one()
+
+
+async def get_intake(db: AsyncSession, intake_id: int):
+    result = await db.execute(select(Intake).where(Intake.id == intake_id))
+    return result.scalar_one_or_none()
+
+
+pool = IntakePool(
+    database.AsyncSessionLocal,
+    workers=settings.intake_workers,
+    max_pending=settings.intake_max_pending,
+    max_attempts=settings.intake_max_attempts,
+    retry_base=settings.intake_retry_base_seconds,
+    poll_interval=settings.intake_poll_interval,
+    lease=settings.intake_lease_seconds,
+)
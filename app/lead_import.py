@@ -0,0 +1,289 @@
+"""
+Streaming bulk lead import from CSV or NDJSON.
+
+The file is read record by record (an uploaded body is first spooled to a
+temporary file, never held in memory) and written IMPORT_BATCH_SIZE records
+per transaction: identifiers are normalized and deduplicated within the
+batch, upserted into leads with one executemany INSERT ... DO NOTHING and,
+if the import has a source, given one contact each with that source and
+optional operator. The lead_imports row is updated in the same transaction,
+so its rows_done is an exact checkpoint: a resumed run skips that many
+records and carries on.
+
+CSV files need an `identifier` (or `lead_identifier`) column; NDJSON lines
+are objects with one of those keys, or bare strings. Records without a
+usable identifier are counted in rows_skipped.
+
+POST /leads/import creates the job once the upload is spooled and runs it
+as a background task (start()); at shutdown, running imports stop after
+their current batch and are marked failed, ready to be resumed.
+
+    python -m app.lead_import leads.csv
+    python -m app.lead_import history.ndjson --source-id 3 --operator-id 7
+    python -m app.lead_import leads.csv --resume 12
+"""
+import argparse
+import asyncio
+import csv
+import io
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import AsyncIterator, Callable, IO, Iterator
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from . import crud, models, workload
+from .config import settings
+from .export import ExportFormat
+from .rollups import utcnow
+
+logger = logging.getLogger(__name__)
+
+Job = models.LeadImport
+
+IDENTIFIER_COLUMNS = ("identifier", "lead_identifier")
+
+
+def normalize_identifier(value) -> str | None:
+    """The identifier as crud stores it (crud.normalize_identifier); None if unusable."""
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        return None
+    return crud.normalize_identifier(str(value)) or None
+
+
+def read_records(stream: IO[str], fmt: ExportFormat) -> Iterator[str | None]:
+    """
+    One normalized identifier (or None) per record, read lazily. A CSV
+    header without an identifier column raises ValueError here, not on the
+    first batch.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        column = next((c for c in IDENTIFIER_COLUMNS if c in (reader.fieldnames or [])), None)
+        if column is None:
+            raise ValueError(f"CSV needs one of the columns {', '.join(IDENTIFIER_COLUMNS)}")
+        return (normalize_identifier(row[column]) for row in reader)
+    return _read_ndjson(stream)
+
+
+def _read_ndjson(stream: IO[str]) -> Iterator[str | None]:
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            value = json.loads(line)
+        except ValueError:
+            yield None
+            continue
+        if isinstance(value, dict):
+            value = next((value[c] for c in IDENTIFIER_COLUMNS if c in value), None)
+        yield normalize_identifier(value)
+
+
+async def spool(chunks: AsyncIterator[bytes]) -> IO[str]:
+    """Copies a streamed upload to a temporary file and returns it opened for reading."""
+    spooled = tempfile.TemporaryFile("w+b")
+    try:
+        async for chunk in chunks:
+            spooled.write(chunk)
+    except BaseException:
+        # e.g. the client disconnected half way
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return io.TextIOWrapper(spooled, encoding="utf-8-sig", newline="")
+
+
+async def create_job(
+    db: AsyncSession, name: str, fmt: ExportFormat, source_id: int | None = None,
+    operator_id: int | None = None, contact_status: str = models.Contact.CLOSED,
+) -> models.LeadImport:
+    if operator_id is not None and source_id is None:
+        raise ValueError("operator_id needs a source_id")
+    if source_id is not None and not await crud.get_existing_source_ids(db, {source_id}):
+        raise ValueError("Source not found")
+    if operator_id is not None and await crud.get_operator(db, operator_id) is None:
+        raise ValueError("Operator not found")
+    now = utcnow()
+    job = Job(
+        name=name, format=fmt, status=Job.RUNNING, source_id=source_id, operator_id=operator_id,
+        contact_status=contact_status if source_id is not None else None,
+        rows_done=0, rows_skipped=0, leads_created=0, contacts_created=0, created_at=now, updated_at=now,
+    )
+    db.add(job)
+    await db.commit()
+    return job
+
+
+async def get_job(db: AsyncSession, job_id: int):
+    result = await db.execute(select(Job).where(Job.id == job_id))
+    return result.scalar_one_or_none()
+
+
+async def reopen_job(db: AsyncSession, job: models.LeadImport) -> models.LeadImport:
+    """Marks a failed (or interrupted) job running again before it is resumed."""
+    if job.status == Job.FAILED:
+        await db.execute(update(Job).where(Job.id == job.id).values(status=Job.RUNNING, error=None, updated_at=utcnow()))
+        await db.commit()
+        job = await get_job(db, job.id)
+    return job
+
+
+class Interrupted(Exception):
+    pass
+
+
+async def _update(session_factory, job_id: int, **values) -> models.LeadImport:
+    async with session_factory() as db:
+        await db.execute(update(Job).where(Job.id == job_id).values(updated_at=utcnow(), **values))
+        await db.commit()
+        return await get_job(db, job_id)
+
+
+async def _import_batch(db: AsyncSession, job: models.LeadImport, batch: list[str | None]) -> tuple[int, int]:
+    """Writes one batch and its checkpoint in a single transaction, returns (leads, contacts) created."""
+    identifiers = list(dict.fromkeys(i for i in batch if i is not None))
+    created, lead_ids = await crud.import_leads(db, identifiers, with_ids=job.source_id is not None)
+    contacts = 0
+    if job.source_id is not None:
+        contacts = await crud.import_contacts(
+            db, [lead_ids[i] for i in identifiers], job.source_id, job.operator_id, job.contact_status
+        )
+    await db.execute(
+        update(Job).where(Job.id == job.id).values(
+            rows_done=Job.rows_done + len(batch),
+            rows_skipped=Job.rows_skipped + batch.count(None),
+            leads_created=Job.leads_created + created,
+            contacts_created=Job.contacts_created + contacts,
+            updated_at=utcnow(),
+        )
+    )
+    await db.commit()
+    return created, contacts
+
+
+async def run(
+    session_factory, job_id: int, records: Iterator[str | None], batch_size: int | None = None,
+    progress: Callable[[models.LeadImport], None] | None = None,
+) -> models.LeadImport:
+    """Imports records into the job, starting after its checkpoint. Returns the finished job."""
+    batch_size = batch_size or settings.import_batch_size
+    async with session_factory() as db:
+        job = await get_job(db, job_id)
+    if job.status == Job.DONE:
+        return job
+    # Resuming: the first rows_done records were committed by an earlier run
+    records = itertools.islice(records, job.rows_done, None)
+    try:
+        while True:
+            if _stopping:
+                raise Interrupted("stopped at shutdown, resume to continue")
+            batch = list(itertools.islice(records, batch_size))
+            if not batch:
+                break
+            async with session_factory() as db:
+                created, contacts = await _import_batch(db, job, batch)
+            if contacts and job.operator_id is not None and workload.counts_status(job.contact_status):
+                workload.counters.increment(job.operator_id, contacts)
+            job.rows_done += len(batch)
+            job.rows_skipped += batch.count(None)
+            job.leads_created += created
+            job.contacts_created += contacts
+            if progress:
+                progress(job)
+    except Exception as exc:
+        # Everything up to the last checkpoint is kept; run again to resume
+        await _update(session_factory, job_id, status=Job.FAILED, error=f"{type(exc).__name__}: {exc}"[:500])
+        raise
+    return await _update(session_factory, job_id, status=Job.DONE, finished_at=utcnow(), error=None)
+
+
+# Imports started by the API, by job id
+_tasks: dict[int, asyncio.Task] = {}
+_stopping = False
+
+
+def running(job_id: int) -> bool:
+    return job_id in _tasks
+
+
+def start(session_factory, job_id: int, records: Iterator[str | None], stream: IO[str]):
+    """Runs the import in the background; the stream is closed when it ends."""
+    async def _run():
+        try:
+            await run(session_factory, job_id, records)
+        except Interrupted:
+            logger.warning("Lead import %d stopped at shutdown, resume with ?resume=%d", job_id, job_id)
+        except Exception:
+            # The job row has the error
+            logger.exception("Lead import %d failed", job_id)
+        finally:
+            stream.close()
+            _tasks.pop(job_id, None)
+
+    _tasks[job_id] = asyncio.create_task(_run())
+
+
+async def stop():
+    """Lets running imports finish their current batch, then stops them (resumable)."""
+    global _stopping
+    _stopping = True
+    try:
+        await asyncio.gather(*_tasks.values(), return_exceptions=True)
+    finally:
+        _stopping = False
+
+
+def format_for(path: str) -> ExportFormat:
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+
+async def _main(args) -> int:
+    from .database import AsyncSessionLocal
+
+    fmt = args.format or format_for(args.file)
+    async with AsyncSessionLocal() as db:
+        if args.resume is not None:
+            job = await get_job(db, args.resume)
+            if job is None:
+                print(f"Import {args.resume} not found")
+                return 1
+            job = await reopen_job(db, job)
+            fmt = job.format
+        else:
+            try:
+                job = await create_job(db, os.path.basename(args.file), fmt, args.source_id, args.operator_id, args.status)
+            except ValueError as exc:
+                print(exc)
+                return 1
+    print(f"Import {job.id}: {args.file} ({fmt}), resume with --resume {job.id}")
+    started, first_row = time.perf_counter(), job.rows_done
+
+    def report(job: models.LeadImport):
+        rate = (job.rows_done - first_row) / max(time.perf_counter() - started, 1e-9)
+        print(f"  {job.rows_done} rows, {job.leads_created} new leads, {job.contacts_created} contacts, "
+              f"{job.rows_skipped} skipped ({rate:.0f} rows/s)", flush=True)
+
+    with open(args.file, encoding="utf-8-sig", newline="") as stream:
+        job = await run(AsyncSessionLocal, job.id, read_records(stream, fmt), args.batch_size, report)
+    print(f"Import {job.id} {job.status}: {job.rows_done} rows, {job.leads_created} new leads, "
+          f"{job.contacts_created} contacts, {job.rows_skipped} skipped")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream leads from a CSV or NDJSON file into the database")
+    parser.add_argument("file")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Default: from the file extension")
+    parser.add_argument("--source-id", type=int, help="Also create a contact per lead with this source")
+    parser.add_argument("--operator-id", type=int, help="Operator for those contacts (default unassigned)")
+    parser.add_argument("--status", choices=[models.Contact.OPEN, models.Contact.CLOSED], default=models.Contact.CLOSED,
+                        help="Status of the imported contacts (default closed: historical data)")
+    parser.add_argument("--resume", type=int, metavar="IMPORT_ID", help="Continue an interrupted import")
+    parser.add_argument("--batch-size", type=int, default=settings.import_batch_size)
+    sys.exit(asyncio.run(_main(parser.parse_args())))
@@ -1,45 +1,167 @@
-import random
+import collections
+import time
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from . import models, crud
+from . import affinity, crud, metrics, models, routing, schemas, workload
 
-async def select_operator(db: AsyncSession, source_id: int) -> int | None:
+async def select_operator(db: AsyncSession, source_id: int, lead_id: int | None = None) -> int | None:
     """
     Selects an operator for a new contact based on:
     1. Source configuration (weights)
     2. Operator activity status
     3. Operator workload limit
+
+    The source's routing table is cached (see routing.py), so a warm call
+    costs a constant-time alias-method draw plus the one-statement claim.
+    The claim runs in the caller's transaction and is undone if it rolls back.
+    With sticky routing on (affinity.py) and a lead_id, the lead's previous
+    operator is claimed first and the draw skipped if that works.
     """
-    
-    # 1. Get all operators configured for this source
-    stmt = select(models.SourceOperatorConfig, models.Operator).join(
-        models.Operator, models.SourceOperatorConfig.operator_id == models.Operator.id
-    ).where(
-        models.SourceOperatorConfig.source_id == source_id,
-        models.Operator.is_active == True
-    )
-    
-    result = await db.execute(stmt)
-    configs = result.all() # List of (SourceOperatorConfig, Operator)
-    
-    if not configs:
+    start = time.perf_counter()
+    await workload.counters.ensure_loaded(db)
+    table = await routing.tables.get(db, source_id)
+    operator_id = None
+    if lead_id is not None:
+        operator_id = await _claim_previous(db, table, source_id, lead_id)
+    if operator_id is None:
+        operator_id = await _claim(db, table)
+    metrics.select_operator_latency.observe(time.perf_counter() - start)
+    return operator_id
+
+def _previous_operator(table: routing.RoutingTable, source_id: int, lead_id: int) -> int | None:
+    # The lead's previous operator if it may take this contact as far as this
+    # process knows; the claim has the final word
+    operator_id = affinity.assignments.lookup(lead_id, source_id)
+    if operator_id is None:
         return None
+    if affinity.assignments.mode == affinity.SOURCE and not table.accepts(operator_id):
+        affinity.assignments.refused()
+        return None
+    return operator_id
 
-    # 2. Filter by workload limit
-    eligible_operators = []
-    weights = []
-    
-    for config, operator in configs:
-        current_workload = await crud.get_operator_workload(db, operator.id)
-        if current_workload < operator.workload_limit:
-            eligible_operators.append(operator)
-            weights.append(config.weight)
-    
-    if not eligible_operators:
+async def _claim_previous(db: AsyncSession, table: routing.RoutingTable, source_id: int, lead_id: int) -> int | None:
+    operator_id = _previous_operator(table, source_id, lead_id)
+    if operator_id is None:
+        return None
+    if not await crud.claim_operator(db, operator_id):
+        affinity.assignments.refused()
+        table.mark_full(operator_id)
         return None
-        
-    # 3. Weighted random selection
-    # random.choices returns a list, we take the first element
-    selected_operator = random.choices(eligible_operators, weights=weights, k=1)[0]
-    
-    return selected_operator.id
+    affinity.assignments.reused()
+    return operator_id
+
+async def _claim(db: AsyncSession, table: routing.RoutingTable) -> int | None:
+    # Draw, then take the slot atomically; if another request or worker
+    # process got the last one, fall back to the next weighted candidate
+    while True:
+        operator_id = table.select()
+        if operator_id is None or await crud.claim_operator(db, operator_id):
+            return operator_id
+        table.mark_full(operator_id)
+
+async def select_operators(
+    db: AsyncSession, source_ids: list[int], lead_ids: list[int] | None = None,
+    reserved: collections.Counter | None = None,
+) -> list[int | None]:
+    """
+    Assigns operators for a whole batch in one pass.
+
+    Each pick immediately reserves a slot in the workload counters so later
+    items in the same batch see it and limits hold inside the batch. The
+    reservations are tracked in `reserved` as they are made, so the caller
+    can release them if the batch is not committed, even if this raises half
+    way. The slots are then claimed in the DB with one statement for the
+    whole batch; an operator refused there (it has fewer free slots than the
+    batch wants) is claimed slot by slot before its items are re-picked.
+    Leads with a usable previous operator (sticky routing) keep it.
+    """
+    if reserved is None:
+        reserved = collections.Counter()
+    await workload.counters.ensure_loaded(db)
+    tables = []
+    assigned = []
+    sticky = []
+    for i, source_id in enumerate(source_ids):
+        table = await routing.tables.get(db, source_id)
+        operator_id = None
+        if lead_ids is not None:
+            operator_id = _previous_operator(table, source_id, lead_ids[i])
+        sticky.append(operator_id is not None)
+        if operator_id is None:
+            operator_id = table.select()
+        if operator_id is not None:
+            workload.counters.increment(operator_id)
+            reserved[operator_id] += 1
+        tables.append(table)
+        assigned.append(operator_id)
+
+    # Claim every picked operator's slots in one statement
+    picked = list(assigned)
+    wanted = collections.Counter(op_id for op_id in assigned if op_id is not None)
+    refused = wanted.keys() - await crud.claim_operators(db, dict(wanted))
+    if refused:
+        # Other workers used some of those operators' slots, maybe not all:
+        # claim their items one slot at a time and only re-pick once an
+        # operator really is full
+        full = set()
+        for op_id in refused:
+            workload.counters.increment(op_id, -wanted[op_id])
+            reserved[op_id] -= wanted[op_id]
+        for i, (table, op_id) in enumerate(zip(tables, assigned)):
+            if op_id not in refused:
+                continue
+            if op_id in full or not await crud.claim_operator(db, op_id):
+                full.add(op_id)
+                table.mark_full(op_id)
+                assigned[i] = await _claim(db, table)
+            if assigned[i] is not None:
+                workload.counters.increment(assigned[i])
+                reserved[assigned[i]] += 1
+    for is_sticky, op_id, final in zip(sticky, picked, assigned):
+        if is_sticky:
+            if final == op_id:
+                affinity.assignments.reused()
+            else:
+                affinity.assignments.refused()
+    return assigned
+
+async def distribute_contacts(
+    db: AsyncSession, contacts: list[schemas.ContactCreate], require_source: bool = True
+) -> list[models.Contact | None]:
+    """
+    Creates many contacts in one transaction: leads are resolved with
+    set-based queries, operators assigned in one pass, contacts inserted with
+    a single executemany. Returns one entry per input, None for items
+    rejected because their source does not exist (only with require_source).
+    """
+    # 1. Resolve sources, then the leads of accepted items only (a rejected
+    # item must not create a lead), with set-based queries
+    if require_source:
+        known_sources = await crud.get_existing_source_ids(db, {c.source_id for c in contacts})
+        accepted = [i for i, c in enumerate(contacts) if c.source_id in known_sources]
+    else:
+        accepted = list(range(len(contacts)))
+    lead_ids = await crud.resolve_lead_ids(db, [contacts[i].lead_identifier for i in accepted])
+
+    # 2. Assign operators in one pass (limits are respected inside the batch)
+    reserved = collections.Counter()
+    try:
+        operator_ids = await select_operators(
+            db, [contacts[i].source_id for i in accepted], [lead_ids[contacts[i].lead_identifier] for i in accepted],
+            reserved,
+        )
+    except BaseException:
+        # Nothing is committed (cancellation included): hand the reserved
+        # counter slots back; the DB claims go with the caller's rollback
+        for op_id, count in reserved.items():
+            if count:
+                workload.counters.increment(op_id, -count)
+        raise
+
+    # 3. Insert every contact in a single transaction (create_contacts
+    # releases the reservations itself if that fails)
+    rows = [
+        {"lead_id": lead_ids[contacts[i].lead_identifier], "source_id": contacts[i].source_id, "operator_id": op_id}
+        for i, op_id in zip(accepted, operator_ids)
+    ]
+    created = dict(zip(accepted, await crud.create_contacts(db, rows))) if rows else {}
+    return [created.get(i) for i in range(len(contacts))]
@@ -1,114 +1,69 @@
 from fastapi import FastAPI, Request
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
-from .routers import operators, sources, contacts, view
-import re
+from fastapi.responses import PlainTextResponse
+from contextlib import asynccontextmanager
+from .routers import operators, sources, contacts, view, debug
+from .config import settings
+from .opengraph import OpenGraphMiddleware
+from . import affinity, archive, database, delivery, group_commit, intake, lead_import, metrics, profiler, rollups, routing, workload
+import asyncio
 
-app = FastAPI(title="Mini-CRM Lead Distribution")
-
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build compressed static variants before the first request
+    static_files.load()
+    # Load workload counters once so the first contacts don't pay for it
+    async with database.AsyncSessionLocal() as db:
+        await workload.counters.load(db)
+        # Bring operators.load in line with the policy in force (it may have changed)
+        await workload.sync_operator_loads(db)
+        await db.commit()
+        # Sticky routing: recent lead -> operator assignments
+        await affinity.assignments.warm(db)
+    reconciler = asyncio.create_task(
+        workload.reconcile_forever(database.AsyncSessionLocal, settings.workload_reconcile_interval)
+    )
+    compactor = asyncio.create_task(
+        rollups.compact_forever(database.AsyncSessionLocal, settings.rollup_compact_interval)
+    )
+    version_checker = asyncio.create_task(
+        routing.check_versions_forever(database.AsyncSessionLocal, settings.routing_version_check_interval)
+    )
+    archiver = None
+    if settings.archive_after_days is not None:
+        archiver = asyncio.create_task(
+            archive.archive_forever(database.AsyncSessionLocal, settings.archive_after_days, settings.archive_interval)
+        )
+    if settings.group_commit_enabled:
+        group_commit.writer.start()
+    if settings.async_distribution_enabled:
+        await intake.pool.start()
+    yield
+    await lead_import.stop()
+    await intake.pool.stop()
+    await group_commit.writer.stop()
+    reconciler.cancel()
+    compactor.cancel()
+    version_checker.cancel()
+    if archiver:
+        archiver.cancel()
 
-# Templates
-templates = Jinja2Templates(directory="templates")
+# docs_url=None: /docs is our own Swagger page below, not FastAPI's built-in one
+app = FastAPI(title="Mini-CRM Lead Distribution", lifespan=lifespan, docs_url=None)
 
-class OpenGraphMiddleware(BaseHTTPMiddleware):
-    """Add Open Graph meta tags to all HTML responses"""
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        
-        # Only process HTML responses
-        content_type = response.headers.get('content-type', '')
-        if not content_type.startswith('text/html'):
-            return response
-        
-        # Read response body from iterator
-        body = b""
-        async for chunk in response.body_iterator:
-            body += chunk
-        
-        if not body:
-            return response
-        
-        try:
-            body_str = body.decode('utf-8', errors='ignore')
-        except:
-            return response
-        
-        # Check if meta tags already exist
-        if 'og:title' in body_str.lower():
-            # Return original response but we need to recreate it since we consumed the iterator
-            return HTMLResponse(
-                content=body_str,
-                status_code=response.status_code,
-                headers=dict(response.headers)
-            )
-        
-        # Generate meta tags
-        base_url = f"{request.url.scheme}://{request.url.netloc}"
-        image_url = f"{base_url}/static/preview.png"
-        meta_tags = f'''
-    <!-- Open Graph / Facebook -->
-    <meta property="og:type" content="website">
-    <meta property="og:url" content="{request.url}">
-    <meta property="og:title" content="Mini-CRM Lead Distribution System">
-    <meta property="og:description" content="Professional lead distribution system for CRM operations. Distribute leads efficiently across multiple operators with customizable weights and real-time statistics.">
-    <meta property="og:image" content="{image_url}">
-    <meta property="og:image:secure_url" content="{image_url}">
-    <meta property="og:image:type" content="image/png">
-    <meta property="og:image:width" content="860">
-    <meta property="og:image:height" content="942">
-    <meta property="og:site_name" content="Mini-CRM">
+# Mount static files (served from memory, precompressed, with ETags)
+static_files = delivery.PrecompressedStatic("static")
+app.mount("/static", static_files, name="static")
 
-    <!-- Twitter -->
-    <meta name="twitter:card" content="summary_large_image">
-    <meta name="twitter:url" content="{request.url}">
-    <meta name="twitter:title" content="Mini-CRM Lead Distribution System">
-    <meta name="twitter:description" content="Professional lead distribution system for CRM operations. Distribute leads efficiently across multiple operators with customizable weights and real-time statistics.">
-    <meta name="twitter:image" content="{image_url}">
-'''
-        
-        # Insert before </head> or at the beginning if no </head>
-        if re.search(r'</head>', body_str, re.IGNORECASE):
-            body_str = re.sub(
-                r'</head>',
-                meta_tags + '    </head>',
-                body_str,
-                flags=re.IGNORECASE
-            )
-        elif re.search(r'<body', body_str, re.IGNORECASE):
-            # If no head tag, add before body
-            body_str = re.sub(
-                r'<body',
-                '<head>' + meta_tags + '</head>\n<body',
-                body_str,
-                flags=re.IGNORECASE
-            )
-        else:
-            # If no head or body, prepend
-            body_str = '<!DOCTYPE html><html><head>' + meta_tags + '</head><body>' + body_str + '</body></html>'
-        
-        # Create new response with updated headers
-        new_headers = dict(response.headers)
-        # Remove Content-Length as it will be recalculated
-        new_headers.pop('content-length', None)
-        
-        return HTMLResponse(
-            content=body_str,
-            status_code=response.status_code,
-            headers=new_headers
-        )
-
-# Add middleware
+# Add middleware (the last one added is outermost, so metrics time everything)
 app.add_middleware(OpenGraphMiddleware)
+app.add_middleware(profiler.SQLProfilerMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
 app.include_router(operators.router)
 app.include_router(sources.router)
 app.include_router(contacts.router)
 app.include_router(view.router)
+app.include_router(debug.router)
 
 @app.get("/")
 async def root():
@@ -117,4 +72,8 @@ async def root():
 @app.get("/docs")
 async def swagger_ui(request: Request):
     """Custom Swagger UI with Open Graph meta tags"""
-    return templates.TemplateResponse("swagger.html", {"request": request})
+    return delivery.render_page(request, "swagger.html")
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,250 @@
+"""
+In-process metrics in the Prometheus text format, served at GET /metrics.
+
+No client library or external service: counters and histograms are plain
+dicts keyed by label values, updated from the request middleware, the
+SQLAlchemy cursor events and a few call sites on the hot path. Recording is
+a dict lookup plus a bisect, cheap enough to leave on in production.
+"""
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Seconds; tuned for an API whose requests mostly finish in a few ms
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+inf last), sum]
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values):
+        series = self.values.get(label_values)
+        if series is None:
+            series = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        for label_values, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, label_values + (bound,))} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Set directly, or read at scrape time from a callback returning {label values: value}."""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (), collect=None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.collect = collect
+        self.values: dict[tuple, float] = {}
+
+    def set(self, value: float, *label_values):
+        self.values[label_values] = value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        values = self.collect() if self.collect is not None else self.values
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+registry: list = []
+
+
+def _register(metric):
+    registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    return "\n".join(line for metric in registry for line in metric.render()) + "\n"
+
+
+http_requests = _register(Counter(
+    "http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")))
+http_latency = _register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route")))
+request_db_statements = _register(Histogram(
+    "http_request_db_statements", "DB statements issued per request", ("method", "route"), COUNT_BUCKETS))
+request_db_time = _register(Histogram(
+    "http_request_db_seconds", "Time spent in DB statements per request", ("method", "route")))
+db_statements = _register(Counter(
+    "db_statements_total", "DB statements executed", ("engine",)))
+db_latency = _register(Histogram(
+    "db_statement_duration_seconds", "DB statement execution time", ("engine",)))
+pool_wait = _register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", ("engine",)))
+select_operator_latency = _register(Histogram(
+    "select_operator_duration_seconds", "Latency of a single operator selection"))
+contacts_unassigned = _register(Counter(
+    "contacts_unassigned_total", "Contacts created with no eligible operator"))
+operator_assignments = _register(Counter(
+    "operator_assignments_total", "Contacts assigned, by operator", ("operator_id",)))
+intake_depth = _register(Gauge(
+    "intake_queue_depth", "Async-mode contacts waiting or being assigned"))
+intake_in_flight = _register(Gauge(
+    "intake_in_flight", "Async-mode contacts currently held by a worker"))
+intake_lag = _register(Histogram(
+    "intake_lag_seconds", "Time from accepting an async-mode contact to its assignment", (),
+    (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)))
+intake_processed = _register(Counter(
+    "intake_processed_total", "Async-mode assignment attempts by result", ("result",)))
+affinity_lookups = _register(Counter(
+    "affinity_lookups_total", "Sticky-routing lookups by result (hit, stale, miss)", ("result",)))
+contacts_archived = _register(Counter(
+    "contacts_archived_total", "Contacts moved to contacts_archive"))
+
+# engine name -> AsyncEngine; the pool is looked up at scrape time since
+# dispose() replaces it
+_engines: dict[str, object] = {}
+pool_checked_out = _register(Gauge(
+    "db_pool_checked_out", "Connections currently checked out", ("engine",),
+    lambda: {
+        (name,): engine.sync_engine.pool.checkedout()
+        for name, engine in _engines.items() if hasattr(engine.sync_engine.pool, "checkedout")
+    },
+))
+
+# Per-request [statement count, seconds in DB]; the cursor events run in
+# SQLAlchemy's greenlet, which shares the request task's context
+_request_db: ContextVar[list | None] = ContextVar("request_db", default=None)
+
+
+def record_assignments(operator_ids):
+    """Call after a commit with the operator id (or None) of each new contact."""
+    for operator_id in operator_ids:
+        if operator_id is None:
+            contacts_unassigned.inc()
+        else:
+            operator_assignments.inc(operator_id)
+
+
+def instrument_engine(engine, name: str):
+    """Times every statement run on an engine and attributes it to the current request."""
+    _engines[name] = engine
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_start"].pop()
+        db_statements.inc(name)
+        db_latency.observe(elapsed, name)
+        current = _request_db.get()
+        if current is not None:
+            current[0] += 1
+            current[1] += elapsed
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def failed(exception_context):
+        # after_cursor_execute doesn't fire for failed statements
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("metrics_start"):
+            connection.info["metrics_start"].pop()
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool recording how long each checkout waited; labelled by pool_logging_name."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait.observe(time.perf_counter() - start, self.logging_name or "default")
+
+
+class MetricsMiddleware:
+    """
+    Records per-route request counts, latency and DB usage.
+
+    Routes are labelled by their template (/operators/{operator_id}), not the
+    raw path, so the number of series stays bounded; requests that match no
+    route share the "unmatched" label and mounted apps are labelled by prefix.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        root_path = scope.get("root_path", "")
+        db_usage = [0, 0.0]
+        token = _request_db.set(db_usage)
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_db.reset(token)
+            label = getattr(scope.get("route"), "path", None)
+            if label is None and scope.get("root_path", "") != root_path:
+                # Mounted apps (/static) only leave their prefix in root_path
+                label = scope["root_path"][len(root_path):]
+            label = label or "unmatched"
+            method = scope["method"]
+            http_requests.inc(method, label, status)
+            http_latency.observe(elapsed, method, label)
+            request_db_statements.observe(db_usage[0], method, label)
+            request_db_time.observe(db_usage[1], method, label)
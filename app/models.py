@@ -1,15 +1,18 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from .database import Base
 
 class Operator(Base):
     __tablename__ = "operators"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String, index=True)
     is_active = Column(Boolean, default=True)
     workload_limit = Column(Integer, default=10)
+    # Contacts counting towards workload_limit, taken atomically by
+    # crud.claim_operator(s) in the transaction that inserts the contact
+    load = Column(Integer, nullable=False, default=0, server_default="0")
 
     # Relationships
     source_configs = relationship("SourceOperatorConfig", back_populates="operator")
@@ -18,8 +21,12 @@ class Operator(Base):
 class Source(Base):
     __tablename__ = "sources"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String, unique=True, index=True)
+    # Bumped whenever the routing config of this source changes (weights, or
+    # the activity/limit of a configured operator), so cached routing tables
+    # in other processes can tell they are stale
+    config_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     # Relationships
     operator_configs = relationship("SourceOperatorConfig", back_populates="source")
@@ -36,10 +43,16 @@ class SourceOperatorConfig(Base):
     source = relationship("Source", back_populates="operator_configs")
     operator = relationship("Operator", back_populates="source_configs")
 
+    __table_args__ = (
+        # The primary key leads with source_id; operator changes look up
+        # the sources an operator is configured for
+        Index("ix_source_operator_configs_operator_id", "operator_id"),
+    )
+
 class Lead(Base):
     __tablename__ = "leads"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     identifier = Column(String, unique=True, index=True) # e.g., email, phone
 
     # Relationships
@@ -48,13 +61,148 @@ class Lead(Base):
 class Contact(Base):
     __tablename__ = "contacts"
 
-    id = Column(Integer, primary_key=True, index=True)
+    OPEN = "open"
+    CLOSED = "closed"
+
+    id = Column(Integer, primary_key=True)
     lead_id = Column(Integer, ForeignKey("leads.id"))
     source_id = Column(Integer, ForeignKey("sources.id"))
     operator_id = Column(Integer, ForeignKey("operators.id"), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    status = Column(String, nullable=False, default=OPEN, server_default=OPEN)
+    closed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Workload counts per operator (optionally windowed by created_at)
+        Index("ix_contacts_operator_id_created_at", "operator_id", "created_at"),
+        # Open-contact workload ("open" policy); only open rows are indexed, so
+        # it stays as small as the current workload however much history piles up.
+        # Queries must spell status = 'open' as a literal for SQLite to use it
+        Index("ix_contacts_open_operator_id", "operator_id", sqlite_where=text("status = 'open'")),
+        # Covers the per-source and per-operator x source aggregations
+        Index("ix_contacts_source_id_operator_id", "source_id", "operator_id"),
+        Index("ix_contacts_created_at", "created_at"),
+        Index("ix_contacts_lead_id", "lead_id"),
+    )
 
     # Relationships
     lead = relationship("Lead", back_populates="contacts")
     source = relationship("Source", back_populates="contacts")
     operator = relationship("Operator", back_populates="contacts")
+
+class ContactArchive(Base):
+    """Contacts moved out of the hot table by archive.py; same columns plus archived_at."""
+    __tablename__ = "contacts_archive"
+
+    id = Column(Integer, primary_key=True)  # the id the contact had in contacts
+    lead_id = Column(Integer)
+    source_id = Column(Integer)
+    operator_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True))
+    status = Column(String, nullable=False)
+    closed_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # all_time workload still counts archived contacts per operator
+        Index("ix_contacts_archive_operator_id", "operator_id"),
+    )
+
+# Precomputed distribution counters, maintained in the same transaction that
+# inserts contacts (see stats.py) so /stats/ never aggregates contacts.
+class OperatorContactCount(Base):
+    __tablename__ = "operator_contact_counts"
+
+    operator_id = Column(Integer, ForeignKey("operators.id"), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class SourceContactCount(Base):
+    __tablename__ = "source_contact_counts"
+
+    source_id = Column(Integer, ForeignKey("sources.id"), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class OperatorSourceContactCount(Base):
+    __tablename__ = "operator_source_contact_counts"
+
+    operator_id = Column(Integer, ForeignKey("operators.id"), primary_key=True)
+    source_id = Column(Integer, ForeignKey("sources.id"), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class ContactTotal(Base):
+    __tablename__ = "contact_totals"
+
+    # Single row with id=1
+    id = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class ContactRollup(Base):
+    """Contacts per (operator, source) in a time bucket, see rollups.py."""
+    __tablename__ = "contact_rollups"
+
+    granularity = Column(String, primary_key=True)  # "minute", "hour" or "day"
+    bucket_start = Column(DateTime, primary_key=True)  # UTC
+    # 0 means unassigned, so the primary key never contains NULL
+    operator_id = Column(Integer, primary_key=True)
+    source_id = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class ContactIntake(Base):
+    """A contact accepted by POST /contacts/ in async mode, assigned later by the intake workers (intake.py)."""
+    __tablename__ = "contact_intake"
+
+    PENDING = "pending"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
+    id = Column(Integer, primary_key=True)
+    lead_identifier = Column(String, nullable=False)
+    source_id = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, default=PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    # Naive UTC; a row is not picked up before available_at (retry backoff)
+    created_at = Column(DateTime, nullable=False)
+    available_at = Column(DateTime, nullable=False)
+    # When a worker claimed it; a processing row older than the lease is
+    # handed out again (its worker is presumed dead)
+    claimed_at = Column(DateTime, nullable=True)
+    processed_at = Column(DateTime, nullable=True)
+    contact_id = Column(Integer, ForeignKey("contacts.id"), nullable=True)
+    operator_id = Column(Integer, nullable=True)
+    error = Column(String, nullable=True)
+
+    __table_args__ = (
+        # The workers' claim query: due pending rows, oldest first
+        Index("ix_contact_intake_status_available_at", "status", "available_at"),
+        # archive.py clears contact_id for the contacts it moves
+        Index("ix_contact_intake_contact_id", "contact_id"),
+    )
+
+class LeadImport(Base):
+    """A bulk lead import (lead_import.py); rows_done is the resume checkpoint."""
+    __tablename__ = "lead_imports"
+
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)  # file name, for humans
+    format = Column(String, nullable=False)  # "csv" or "ndjson"
+    status = Column(String, nullable=False, default=RUNNING)
+    # Optional contact per imported lead, with this source/operator/status
+    source_id = Column(Integer, nullable=True)
+    operator_id = Column(Integer, nullable=True)
+    contact_status = Column(String, nullable=True)
+    # Records committed so far (including skipped ones); a resumed run skips these
+    rows_done = Column(Integer, nullable=False, default=0)
+    rows_skipped = Column(Integer, nullable=False, default=0)
+    leads_created = Column(Integer, nullable=False, default=0)
+    contacts_created = Column(Integer, nullable=False, default=0)
+    # Naive UTC
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    error = Column(String, nullable=True)
+
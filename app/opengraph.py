@@ -0,0 +1,169 @@
+import html
+from starlette.datastructures import URL, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from .cache import LRUCache
+
+TITLE = "Mini-CRM Lead Distribution System"
+DESCRIPTION = (
+    "Professional lead distribution system for CRM operations. Distribute leads efficiently "
+    "across multiple operators with customizable weights and real-time statistics."
+)
+
+META_TEMPLATE = '''
+    <!-- Open Graph / Facebook -->
+    <meta property="og:type" content="website">
+    <meta property="og:url" content="{url}">
+    <meta property="og:title" content="{title}">
+    <meta property="og:description" content="{description}">
+    <meta property="og:image" content="{image_url}">
+    <meta property="og:image:secure_url" content="{image_url}">
+    <meta property="og:image:type" content="image/png">
+    <meta property="og:image:width" content="860">
+    <meta property="og:image:height" content="942">
+    <meta property="og:site_name" content="Mini-CRM">
+
+    <!-- Twitter -->
+    <meta name="twitter:card" content="summary_large_image">
+    <meta name="twitter:url" content="{url}">
+    <meta name="twitter:title" content="{title}">
+    <meta name="twitter:description" content="{description}">
+    <meta name="twitter:image" content="{image_url}">
+'''
+
+
+class _Injector:
+    """
+    Inserts the meta block into an HTML body fed in chunks.
+
+    Only the document head is held back: once </head> (or <body, or an
+    existing og:title) has been seen, everything else streams straight
+    through. Each chunk is lower-cased and searched once, from a few bytes
+    before its start, so a head that arrives in many chunks costs O(n).
+    """
+
+    # Longest marker minus one: enough to find a marker split across chunks
+    OVERLAP = len(b"og:title") - 1
+
+    def __init__(self, meta: bytes):
+        self.meta = meta
+        self.buffer = bytearray()
+        self.lowered = bytearray()
+        self.done = False
+
+    def feed(self, chunk: bytes) -> bytes:
+        if self.done:
+            return chunk
+        start = max(0, len(self.lowered) - self.OVERLAP)
+        self.buffer += chunk
+        self.lowered += chunk.lower()
+        head_end = self.lowered.find(b"</head>", start)
+        og = self.lowered.find(b"og:title", start)
+        if og != -1 and (head_end == -1 or og < head_end):
+            return self._release(self.buffer)
+        if head_end != -1:
+            return self._release(self.buffer[:head_end] + self.meta + b"    " + self.buffer[head_end:])
+        body = self.lowered.find(b"<body", start)
+        if body != -1:
+            return self._release(
+                self.buffer[:body] + b"<head>" + self.meta + b"</head>\n" + self.buffer[body:]
+            )
+        return b""
+
+    def finish(self) -> bytes:
+        if self.done:
+            return b""
+        # Neither head nor body: wrap the fragment in a document
+        return self._release(
+            b"<!DOCTYPE html><html><head>" + self.meta + b"</head><body>" + self.buffer + b"</body></html>"
+        )
+
+    def _release(self, data: bytearray) -> bytes:
+        self.done = True
+        self.buffer = bytearray()
+        self.lowered = bytearray()
+        return bytes(data)
+
+
+class OpenGraphMiddleware:
+    """
+    Add Open Graph meta tags to all HTML responses.
+
+    Pure ASGI: non-HTML responses (the JSON API) are passed through untouched
+    after one header check, and HTML bodies are streamed with the meta block
+    inserted before </head>. Rendered meta blocks are cached per URL.
+    """
+
+    def __init__(self, app: ASGIApp, cache_size: int = 1024):
+        self.app = app
+        self.meta_cache = LRUCache(cache_size)
+
+    def _meta(self, scope: Scope) -> bytes:
+        headers = dict(scope["headers"])
+        key = (scope.get("scheme"), headers.get(b"host"), scope.get("root_path", "") + scope["path"], scope.get("query_string"))
+        meta = self.meta_cache.get(key)
+        if meta is None:
+            url = URL(scope=scope)
+            image_url = f"{url.scheme}://{url.netloc}/static/preview.png"
+            meta = META_TEMPLATE.format(
+                url=html.escape(str(url)),
+                title=TITLE,
+                description=DESCRIPTION,
+                image_url=html.escape(image_url),
+            ).encode()
+            self.meta_cache.put(key, meta)
+        return meta
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start: Message | None = None
+        injector: _Injector | None = None
+        passthrough = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start, injector, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                if not headers.get("content-type", "").startswith("text/html") or "content-encoding" in headers:
+                    passthrough = True
+                    await send(message)
+                    return
+                # Hold the start message until we know whether the body arrives in one piece
+                start = message
+                injector = _Injector(self._meta(scope))
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                headers = MutableHeaders(raw=start["headers"])
+                if not more_body:
+                    # Whole body at once (the common case): exact Content-Length
+                    out = injector.feed(body) + injector.finish() if body else b""
+                    if body:
+                        headers["content-length"] = str(len(out))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": out})
+                    passthrough = True
+                    return
+                del headers["content-length"]
+                await send(start)
+                start = None
+
+            out = injector.feed(body)
+            if not more_body:
+                out += injector.finish()
+            if out or not more_body:
+                await send({"type": "http.response.body", "body": out, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,27 @@
+import base64
+import json
+
+
+def encode_cursor(last_id: int) -> str:
+    """Opaque keyset cursor: the primary key of the last row on the page."""
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> int:
+    """Raises ValueError for tokens we did not issue."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        last_id = json.loads(raw)["id"]
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
+    if not isinstance(last_id, int):
+        raise ValueError("Invalid cursor")
+    return last_id
+
+
+def next_cursor(rows: list, limit: int) -> str | None:
+    # A short page means there is nothing after it
+    if limit > 0 and len(rows) == limit:
+        return encode_cursor(rows[-1].id)
+    return None
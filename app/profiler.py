@@ -0,0 +1,175 @@
+"""
+Per-request SQL profiler and N+1 detector.
+
+With SQL_PROFILE=header a request sending `X-SQL-Profile: 1` is profiled;
+with SQL_PROFILE=always every request is. Each statement the request issues
+is recorded with its timing, statements are grouped by normalized SQL, and a
+shape executed SQL_PROFILE_N_PLUS_ONE or more times is flagged as an N+1
+suspect. The response carries a one-line summary in X-SQL-Profile and an id
+in X-SQL-Profile-Id; the full report is kept in memory for
+GET /debug/sql-profiles/{id}.
+
+capture() does the same for any block of code, which is what the
+query_budget test fixture uses to hold endpoints to a query budget.
+"""
+import itertools
+import re
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from .config import settings
+
+OFF = "off"
+HEADER = "header"
+ALWAYS = "always"
+
+REQUEST_HEADER = "x-sql-profile"
+
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize(statement: str) -> str:
+    """Statement shape: literals become ?, IN lists of any length collapse to (?...)."""
+    shape = _STRING.sub("?", statement)
+    shape = _NUMBER.sub("?", shape)
+    shape = _IN_LIST.sub("(?...)", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+
+class Profile:
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.statements: list[tuple[str, float, bool]] = []  # (sql, seconds, executemany)
+        self.started = time.perf_counter()
+        self.duration: float | None = None
+
+    def record(self, statement: str, elapsed: float, executemany: bool):
+        self.statements.append((statement, elapsed, executemany))
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def db_time(self) -> float:
+        return sum(elapsed for _, elapsed, _ in self.statements)
+
+    def groups(self) -> list[dict]:
+        grouped: dict[str, dict] = {}
+        for statement, elapsed, executemany in self.statements:
+            shape = normalize(statement)
+            group = grouped.setdefault(shape, {"sql": shape, "count": 0, "total_ms": 0.0, "executemany": executemany})
+            group["count"] += 1
+            group["total_ms"] += elapsed * 1000
+        return sorted(grouped.values(), key=lambda g: (-g["count"], -g["total_ms"]))
+
+    def n_plus_one(self) -> list[dict]:
+        threshold = settings.sql_profile_n_plus_one
+        return [group for group in self.groups() if group["count"] >= threshold]
+
+    def summary(self) -> str:
+        return f"statements={self.count}; db_ms={self.db_time * 1000:.2f}; n_plus_one={len(self.n_plus_one())}"
+
+    def report(self) -> dict:
+        return {
+            "label": self.label,
+            "duration_ms": None if self.duration is None else self.duration * 1000,
+            "statements": self.count,
+            "db_ms": self.db_time * 1000,
+            "n_plus_one": self.n_plus_one(),
+            "groups": self.groups(),
+            "timeline": [
+                {"sql": " ".join(statement.split()), "ms": elapsed * 1000, "executemany": executemany}
+                for statement, elapsed, executemany in self.statements
+            ],
+        }
+
+
+_current: ContextVar[Profile | None] = ContextVar("sql_profile", default=None)
+
+# Finished request profiles, oldest evicted first
+profiles: "OrderedDict[int, Profile]" = OrderedDict()
+_ids = itertools.count(1)
+
+
+def _store(profile_id: int, profile: Profile):
+    profiles[profile_id] = profile
+    while len(profiles) > settings.sql_profile_keep:
+        profiles.popitem(last=False)
+
+
+def instrument_engine(engine):
+    """Records statements into the active Profile; a contextvar lookup when none is."""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("profile_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        profile = _current.get()
+        if profile is not None and conn.info.get("profile_start"):
+            profile.record(statement, time.perf_counter() - conn.info["profile_start"].pop(), executemany)
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def failed(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("profile_start"):
+            connection.info["profile_start"].pop()
+
+
+@contextmanager
+def capture(label: str = ""):
+    """Profiles every statement issued inside the block (and tasks it starts)."""
+    profile = Profile(label)
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+        profile.duration = time.perf_counter() - profile.started
+
+
+class SQLProfilerMiddleware:
+    """Profiles opted-in requests; a no-op unless SQL_PROFILE is enabled."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    def _wanted(self, scope: Scope) -> bool:
+        mode = settings.sql_profile
+        if mode == ALWAYS:
+            return True
+        if mode == HEADER:
+            return Headers(scope=scope).get(REQUEST_HEADER, "") not in ("", "0")
+        return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or settings.sql_profile == OFF or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = next(_ids)
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                # Streaming responses keep querying after this; the stored
+                # report has the full picture
+                headers = MutableHeaders(raw=message["headers"])
+                headers["X-SQL-Profile"] = profile.summary()
+                headers["X-SQL-Profile-Id"] = str(profile_id)
+            await send(message)
+
+        with capture(f"{scope['method']} {scope['path']}") as profile:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                _store(profile_id, profile)
@@ -0,0 +1,134 @@
+"""
+Time-bucketed contact rollups keyed by (operator, source).
+
+New contacts are counted into minute buckets in the same transaction that
+inserts them. compact() periodically folds minute buckets older than
+ROLLUP_MINUTE_RETENTION_HOURS into hour buckets and hour buckets older than
+ROLLUP_HOUR_RETENTION_DAYS into day buckets, so storage stays bounded.
+Queries re-bucket whatever granularity is stored, which means ranges that
+were already compacted come back at the coarser resolution.
+"""
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from . import models
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("minute", "hour", "day")
+UNASSIGNED = 0
+
+
+def utcnow() -> datetime:
+    # Naive UTC, like SQLite's CURRENT_TIMESTAMP
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def truncate(ts: datetime, granularity: str) -> datetime:
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+async def _bump(db: AsyncSession, granularity: str, counts: Counter):
+    if not counts:
+        return
+    stmt = sqlite_insert(models.ContactRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["granularity", "bucket_start", "operator_id", "source_id"],
+        set_={"count": models.ContactRollup.count + stmt.excluded.count},
+    )
+    await db.execute(stmt, [
+        {"granularity": granularity, "bucket_start": bucket, "operator_id": op_id, "source_id": source_id, "count": n}
+        for (bucket, op_id, source_id), n in counts.items()
+    ])
+
+
+async def record_contacts(db: AsyncSession, contacts: list[tuple[int, int | None]], now: datetime | None = None):
+    """Counts (source_id, operator_id) pairs into the current minute bucket. Does not commit."""
+    bucket = truncate(now or utcnow(), "minute")
+    await _bump(db, "minute", Counter(
+        (bucket, op_id if op_id is not None else UNASSIGNED, source_id) for source_id, op_id in contacts
+    ))
+
+
+async def _fold(db: AsyncSession, finer: str, coarser: str, cutoff: datetime) -> int:
+    rollup = models.ContactRollup
+    cond = (rollup.granularity == finer) & (rollup.bucket_start < cutoff)
+    rows = (await db.execute(
+        select(rollup.bucket_start, rollup.operator_id, rollup.source_id, rollup.count).where(cond)
+    )).all()
+    if not rows:
+        return 0
+    folded = Counter()
+    for bucket, op_id, source_id, count in rows:
+        folded[(truncate(bucket, coarser), op_id, source_id)] += count
+    await _bump(db, coarser, folded)
+    await db.execute(delete(rollup).where(cond))
+    return len(rows)
+
+
+async def compact(db: AsyncSession, now: datetime | None = None) -> int:
+    """Folds old fine-grained buckets into coarser ones, returns how many rows were folded."""
+    now = now or utcnow()
+    hour_cutoff = truncate(now - timedelta(hours=settings.rollup_minute_retention_hours), "hour")
+    day_cutoff = truncate(now - timedelta(days=settings.rollup_hour_retention_days), "day")
+    folded = await _fold(db, "minute", "hour", hour_cutoff)
+    folded += await _fold(db, "hour", "day", day_cutoff)
+    await db.commit()
+    return folded
+
+
+async def compact_forever(session_factory, interval: float):
+    while True:
+        try:
+            async with session_factory() as db:
+                folded = await compact(db)
+            if folded:
+                logger.info("Compacted %d rollup bucket(s)", folded)
+        except Exception:
+            logger.exception("Rollup compaction failed")
+        await asyncio.sleep(interval)
+
+
+async def read_timeseries(
+    db: AsyncSession,
+    start: datetime,
+    end: datetime,
+    granularity: str,
+    operator_id: int | None = None,
+    source_id: int | None = None,
+) -> list[dict]:
+    """Contacts per (bucket, operator, source) in [start, end), read only from the rollup table."""
+    rollup = models.ContactRollup
+    stmt = select(rollup.bucket_start, rollup.operator_id, rollup.source_id, rollup.count).where(
+        rollup.granularity.in_(GRANULARITIES),
+        rollup.bucket_start >= start,
+        rollup.bucket_start < end,
+    )
+    if operator_id is not None:
+        stmt = stmt.where(rollup.operator_id == operator_id)
+    if source_id is not None:
+        stmt = stmt.where(rollup.source_id == source_id)
+
+    points = Counter()
+    for bucket, op_id, src_id, count in (await db.execute(stmt)).all():
+        # Coarser buckets than requested stay at their own start
+        points[(truncate(bucket, granularity), op_id, src_id)] += count
+    return [
+        {
+            "bucket_start": bucket,
+            "operator_id": op_id if op_id != UNASSIGNED else None,
+            "source_id": src_id,
+            "count": count,
+        }
+        for (bucket, op_id, src_id), count in sorted(points.items())
+    ]
@@ -1,26 +1,119 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from .. import crud, schemas, database, logic
+from typing import List, Optional
+from datetime import datetime
+from .. import crud, models, schemas, database, logic, group_commit, export, intake
+from ..config import settings
 
 router = APIRouter(
     prefix="/contacts",
     tags=["contacts"],
 )
 
-@router.post("/", response_model=schemas.Contact)
+@router.post("/", response_model=schemas.Contact, responses={202: {"model": schemas.ContactAccepted}})
 async def create_contact(contact: schemas.ContactCreate, db: AsyncSession = Depends(database.get_db)):
-    # 1. Find or create lead
-    lead = await crud.get_lead_by_identifier(db, contact.lead_identifier)
-    if not lead:
-        lead = await crud.create_lead(db, contact.lead_identifier)
+    # Async mode: store it in the intake queue and let the workers assign it
+    if intake.pool.running:
+        try:
+            queued = await intake.pool.enqueue(db, contact)
+        except intake.QueueFull:
+            raise HTTPException(status_code=503, detail="Intake queue is full", headers={"Retry-After": "1"})
+        status_url = f"/contacts/intake/{queued.id}"
+        return JSONResponse(
+            status_code=202,
+            content={"id": queued.id, "status": queued.status, "status_url": status_url},
+            headers={"Location": status_url},
+        )
+
+    # Group-commit mode: the writer task assigns and inserts it with other pending contacts
+    if group_commit.writer.running:
+        return await group_commit.writer.submit(contact)
+
+    # 1. Find or create lead (cached, otherwise a single upsert statement)
+    lead_id = await crud.resolve_lead_id(db, contact.lead_identifier)
     
     # 2. Select operator
-    operator_id = await logic.select_operator(db, contact.source_id)
+    operator_id = await logic.select_operator(db, contact.source_id, lead_id)
     
     # 3. Create contact
     # Note: If operator_id is None, we still create the contact but it's unassigned.
     # The prompt says: "If no eligible operators exist: either create contact without an operator or return 4xx error"
     # We choose to create it without an operator so we don't lose the lead.
-    new_contact = await crud.create_contact(db, lead.id, contact.source_id, operator_id)
+    new_contact = await crud.create_contact(db, lead_id, contact.source_id, operator_id)
     
     return new_contact
+
+@router.post("/batch", response_model=List[schemas.ContactBatchResult])
+async def create_contacts_batch(contacts: List[schemas.ContactCreate], db: AsyncSession = Depends(database.get_db)):
+    if len(contacts) > settings.contacts_batch_max_size:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large, at most {settings.contacts_batch_max_size} contacts per request",
+        )
+
+    results = await logic.distribute_contacts(db, contacts)
+    return [
+        {"index": i, "contact": contact} if contact is not None else {"index": i, "error": "Source not found"}
+        for i, contact in enumerate(results)
+    ]
+
+@router.get("/intake/{intake_id}", response_model=schemas.ContactIntake)
+async def get_contact_intake(intake_id: int, db: AsyncSession = Depends(database.get_read_db)):
+    # Status of a contact accepted with 202; contact_id is set once it's assigned
+    queued = await intake.get_intake(db, intake_id)
+    if queued is None:
+        raise HTTPException(status_code=404, detail="Queued contact not found")
+    return queued
+
+async def _set_status(contact_ids: List[int], status: str, db: AsyncSession):
+    if len(contact_ids) > settings.contacts_batch_max_size:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large, at most {settings.contacts_batch_max_size} contacts per request",
+        )
+    changed = await crud.set_contacts_status(db, contact_ids, status)
+    return {"status": status, "changed": len(changed), "contact_ids": [contact.id for contact in changed]}
+
+@router.post("/close", response_model=schemas.ContactStatusChange)
+async def close_contacts(contact_ids: List[int], db: AsyncSession = Depends(database.get_db)):
+    return await _set_status(contact_ids, models.Contact.CLOSED, db)
+
+@router.post("/reopen", response_model=schemas.ContactStatusChange)
+async def reopen_contacts(contact_ids: List[int], db: AsyncSession = Depends(database.get_db)):
+    return await _set_status(contact_ids, models.Contact.OPEN, db)
+
+async def _set_one_status(contact_id: int, status: str, db: AsyncSession):
+    changed = await crud.set_contacts_status(db, [contact_id], status)
+    if changed:
+        return changed[0]
+    # Already in that status (a no-op) or unknown
+    contact = await crud.get_contact(db, contact_id)
+    if contact is None:
+        raise HTTPException(status_code=404, detail="Contact not found")
+    return contact
+
+@router.post("/{contact_id}/close", response_model=schemas.Contact)
+async def close_contact(contact_id: int, db: AsyncSession = Depends(database.get_db)):
+    return await _set_one_status(contact_id, models.Contact.CLOSED, db)
+
+@router.post("/{contact_id}/reopen", response_model=schemas.Contact)
+async def reopen_contact(contact_id: int, db: AsyncSession = Depends(database.get_db)):
+    return await _set_one_status(contact_id, models.Contact.OPEN, db)
+
+@router.get("/export")
+async def export_contacts(
+    format: export.ExportFormat = "ndjson",
+    source_id: Optional[int] = None,
+    operator_id: Optional[int] = None,
+    created_from: Optional[datetime] = Query(None, alias="from"),
+    created_to: Optional[datetime] = Query(None, alias="to"),
+):
+    stmt = export.contacts_query(
+        source_id=source_id, operator_id=operator_id, created_from=created_from, created_to=created_to
+    )
+    return StreamingResponse(
+        export.stream_rows(stmt, format),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="contacts.{format}"'},
+    )
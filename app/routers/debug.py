@@ -0,0 +1,29 @@
+from fastapi import APIRouter, HTTPException
+from .. import profiler
+from ..config import settings
+
+router = APIRouter(
+    prefix="/debug",
+    tags=["debug"],
+)
+
+def _require_profiling():
+    # Reports contain raw SQL, so the routes only exist while profiling is on
+    if settings.sql_profile == profiler.OFF:
+        raise HTTPException(status_code=404, detail="SQL profiling is disabled")
+
+@router.get("/sql-profiles")
+async def list_sql_profiles():
+    _require_profiling()
+    return [
+        {"id": profile_id, "label": profile.label, "summary": profile.summary()}
+        for profile_id, profile in reversed(profiler.profiles.items())
+    ]
+
+@router.get("/sql-profiles/{profile_id}")
+async def get_sql_profile(profile_id: int):
+    _require_profiling()
+    profile = profiler.profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile.report()
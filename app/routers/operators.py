@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
-from .. import crud, schemas, database
+from typing import List, Optional
+from .. import crud, schemas, database, pagination
+from ..config import settings
 
 router = APIRouter(
     prefix="/operators",
@@ -12,9 +13,38 @@ router = APIRouter(
 async def create_operator(operator: schemas.OperatorCreate, db: AsyncSession = Depends(database.get_db)):
     return await crud.create_operator(db=db, operator=operator)
 
+def _check_batch_size(items: list):
+    if len(items) > settings.operators_batch_max_size:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large, at most {settings.operators_batch_max_size} operators per request",
+        )
+
+@router.post("/batch", response_model=List[schemas.Operator])
+async def create_operators_batch(operators: List[schemas.OperatorCreate], db: AsyncSession = Depends(database.get_db)):
+    _check_batch_size(operators)
+    return await crud.create_operators(db, operators)
+
+# Declared before /{operator_id} so "batch" isn't parsed as an id
+@router.patch("/batch", response_model=List[schemas.Operator])
+async def update_operators_batch(updates: List[schemas.OperatorUpdate], db: AsyncSession = Depends(database.get_db)):
+    _check_batch_size(updates)
+    operators, missing = await crud.update_operators(db, updates)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Operators not found: {missing}")
+    return operators
+
 @router.get("/", response_model=List[schemas.Operator])
-async def read_operators(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(database.get_db)):
-    operators = await crud.get_operators(db, skip=skip, limit=limit)
+async def read_operators(response: Response, skip: int = 0, limit: int = 100, after: Optional[str] = None, db: AsyncSession = Depends(database.get_read_db)):
+    # `after` is the X-Next-Cursor of the previous page; `skip` still works
+    try:
+        after_id = pagination.decode_cursor(after) if after else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    operators = await crud.get_operators(db, skip=skip, limit=limit, after_id=after_id)
+    cursor = pagination.next_cursor(operators, limit)
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
     return operators
 
 @router.patch("/{operator_id}", response_model=schemas.Operator)
@@ -12,7 +12,9 @@ router = APIRouter(
 async def create_source(source: schemas.SourceCreate, db: AsyncSession = Depends(database.get_db)):
     return await crud.create_source(db=db, source=source)
 
-@router.post("/{source_id}/weights")
+@router.post("/{source_id}/weights", response_model=schemas.SourceWeightsResult)
 async def set_source_weights(source_id: int, weights: List[schemas.SourceWeight], db: AsyncSession = Depends(database.get_db)):
-    await crud.set_source_weights(db, source_id, weights)
-    return {"status": "ok"}
+    result = await crud.set_source_weights(db, source_id, weights)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Source not found")
+    return result
@@ -1,50 +1,145 @@
-from fastapi import APIRouter, Depends, Request
-from fastapi.templating import Jinja2Templates
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from sqlalchemy import func
-from typing import List
-from .. import models, schemas, database
+from typing import List, Literal, Optional
+from datetime import datetime, timedelta, timezone
+from .. import affinity, crud, schemas, database, delivery, export, group_commit, intake, lead_import, pagination, rollups, stats, workload
+from ..config import settings
 
 router = APIRouter(
     tags=["view"],
 )
 
-templates = Jinja2Templates(directory="templates")
-
 @router.get("/leads/", response_model=List[schemas.Lead])
-async def read_leads(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(database.get_db)):
-    result = await db.execute(select(models.Lead).offset(skip).limit(limit))
-    return result.scalars().all()
+async def read_leads(response: Response, skip: int = 0, limit: int = 100, after: Optional[str] = None, db: AsyncSession = Depends(database.get_read_db)):
+    # `after` is the X-Next-Cursor of the previous page; `skip` still works
+    try:
+        after_id = pagination.decode_cursor(after) if after else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    leads = await crud.get_leads(db, skip=skip, limit=limit, after_id=after_id)
+    cursor = pagination.next_cursor(leads, limit)
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
+    return leads
 
-@router.get("/stats/", response_model=schemas.DistributionStats)
-async def get_stats(db: AsyncSession = Depends(database.get_db)):
-    # Total contacts
-    total_res = await db.execute(select(func.count(models.Contact.id)))
-    total = total_res.scalar_one()
-    
-    # By Operator
-    op_res = await db.execute(
-        select(models.Operator.name, func.count(models.Contact.id))
-        .join(models.Operator, models.Contact.operator_id == models.Operator.id)
-        .group_by(models.Operator.name)
+@router.get("/leads/export")
+async def export_leads(
+    format: export.ExportFormat = "ndjson",
+    source_id: Optional[int] = None,
+    operator_id: Optional[int] = None,
+    created_from: Optional[datetime] = Query(None, alias="from"),
+    created_to: Optional[datetime] = Query(None, alias="to"),
+):
+    # Filters select leads that have at least one matching contact
+    stmt = export.leads_query(
+        source_id=source_id, operator_id=operator_id, created_from=created_from, created_to=created_to
     )
-    by_operator = {name: count for name, count in op_res.all()}
-    
-    # By Source
-    src_res = await db.execute(
-        select(models.Source.name, func.count(models.Contact.id))
-        .join(models.Source, models.Contact.source_id == models.Source.id)
-        .group_by(models.Source.name)
+    return StreamingResponse(
+        export.stream_rows(stmt, format),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="leads.{format}"'},
     )
-    by_source = {name: count for name, count in src_res.all()}
-    
-    return {
-        "total_contacts": total,
-        "by_operator": by_operator,
-        "by_source": by_source
-    }
+
+@router.post("/leads/import", response_model=schemas.LeadImport, status_code=202)
+async def import_leads(
+    request: Request,
+    response: Response,
+    format: export.ExportFormat = "ndjson",
+    name: str = "upload",
+    source_id: Optional[int] = None,
+    operator_id: Optional[int] = None,
+    contact_status: Literal["open", "closed"] = "closed",
+    resume: Optional[int] = None,
+    db: AsyncSession = Depends(database.get_db),
+):
+    # The body is the raw file; pass resume=<id> with the same file to
+    # continue an import that stopped part way. The import runs in the
+    # background, follow it at the Location URL.
+    job = None
+    if resume is not None:
+        job = await lead_import.get_job(db, resume)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Import not found")
+        if lead_import.running(job.id):
+            raise HTTPException(status_code=409, detail="Import is already running")
+        format = job.format
+    # The job only exists once the whole upload is on disk
+    stream = await lead_import.spool(request.stream())
+    try:
+        records = lead_import.read_records(stream, format)
+        if job is None:
+            job = await lead_import.create_job(db, name, format, source_id, operator_id, contact_status)
+        else:
+            job = await lead_import.reopen_job(db, job)
+    except (ValueError, UnicodeDecodeError) as exc:
+        stream.close()
+        raise HTTPException(status_code=400, detail=str(exc))
+    except Exception:
+        stream.close()
+        raise
+    lead_import.start(database.AsyncSessionLocal, job.id, records, stream)
+    response.headers["Location"] = f"/leads/imports/{job.id}"
+    return job
+
+@router.get("/leads/imports/{import_id}", response_model=schemas.LeadImport)
+async def get_lead_import(import_id: int, db: AsyncSession = Depends(database.get_read_db)):
+    # Progress of a running import, or the totals of a finished one
+    job = await lead_import.get_job(db, import_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return job
+
+@router.get("/stats/", response_model=schemas.DistributionStats)
+async def get_stats(db: AsyncSession = Depends(database.get_read_db)):
+    # Answered from the counter tables maintained on insert (see stats.py),
+    # not by aggregating the contacts table
+    distribution = await stats.read_distribution(db)
+    distribution["workload_policy"] = settings.workload_policy
+    if settings.workload_policy == workload.WINDOW:
+        distribution["workload_window_hours"] = settings.workload_window_hours
+    return distribution
+
+@router.get("/stats/timeseries", response_model=schemas.Timeseries)
+async def get_stats_timeseries(
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    granularity: Literal["minute", "hour", "day"] = "hour",
+    operator_id: Optional[int] = None,
+    source_id: Optional[int] = None,
+    db: AsyncSession = Depends(database.get_read_db),
+):
+    # Defaults to the last 24 hours; naive datetimes are taken as UTC
+    end = _as_utc(end) if end else rollups.utcnow()
+    start = _as_utc(start) if start else end - timedelta(hours=24)
+    if start >= end:
+        raise HTTPException(status_code=422, detail="'from' must be before 'to'")
+    points = await rollups.read_timeseries(db, start, end, granularity, operator_id, source_id)
+    return {"start": start, "end": end, "granularity": granularity, "points": points}
+
+def _as_utc(ts: datetime) -> datetime:
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+@router.get("/stats/group-commit", response_model=schemas.GroupCommitStats)
+async def get_group_commit_stats():
+    return group_commit.writer.stats()
+
+@router.get("/stats/intake", response_model=schemas.IntakeStats)
+async def get_intake_stats():
+    # Async-mode queue depth and worker activity
+    return intake.pool.stats()
+
+@router.get("/stats/lead-cache", response_model=schemas.CacheStats)
+async def get_lead_cache_stats():
+    return crud.lead_cache.stats()
+
+@router.get("/stats/affinity", response_model=schemas.AffinityStats)
+async def get_affinity_stats():
+    # Sticky routing counters for this process (see affinity.py)
+    return affinity.assignments.stats()
 
 @router.get("/documentation/")
 async def documentation_page(request: Request):
-    return templates.TemplateResponse("docs.html", {"request": request})
+    return delivery.render_page(request, "docs.html")
@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import math
+import random
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from . import models, workload
+
+logger = logging.getLogger(__name__)
+
+
+class AliasTable:
+    """Walker/Vose alias table: O(n) to build, O(1) per weighted draw."""
+
+    def __init__(self, items: list, weights: list[float]):
+        self.items = items
+        n = len(items)
+        total = float(sum(weights))
+        self._prob = [0.0] * n
+        self._alias = [0] * n
+        if n == 0 or total <= 0:
+            self.items = []
+            return
+
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self._prob[s] = scaled[s]
+            self._alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Leftovers are 1.0 up to float rounding
+        for i in small + large:
+            self._prob[i] = 1.0
+
+    def __len__(self):
+        return len(self.items)
+
+    def sample(self):
+        i = random.randrange(len(self.items))
+        return self.items[i] if random.random() < self._prob[i] else self.items[self._alias[i]]
+
+
+class BlockAliasTable:
+    """
+    Two-level alias table whose weights can change one item at a time.
+
+    Items are split into about sqrt(n) blocks, each with its own AliasTable,
+    plus one AliasTable over the block totals. A draw picks a block and then
+    an item in it, still O(1); changing one item's weight rebuilds only its
+    block and the top level, O(sqrt n) instead of O(n). Items with weight 0
+    stay in place and are never drawn.
+    """
+
+    def __init__(self, items: list, weights: list[float]):
+        size = max(1, math.isqrt(len(items)))
+        self._blocks = [items[i:i + size] for i in range(0, len(items), size)]
+        self._weights = [list(weights[i:i + size]) for i in range(0, len(items), size)]
+        self._where = {item: (b, i) for b, block in enumerate(self._blocks) for i, item in enumerate(block)}
+        self._tables = [None] * len(self._blocks)
+        self._totals = [0.0] * len(self._blocks)
+        for b in range(len(self._blocks)):
+            self._build_block(b)
+        self._build_top()
+
+    def _build_block(self, b: int):
+        pairs = [(item, w) for item, w in zip(self._blocks[b], self._weights[b]) if w > 0]
+        self._tables[b] = AliasTable([item for item, _ in pairs], [w for _, w in pairs])
+        self._totals[b] = float(sum(w for _, w in pairs))
+
+    def _build_top(self):
+        live = [b for b, total in enumerate(self._totals) if total > 0]
+        self._top = AliasTable(live, [self._totals[b] for b in live])
+        self._size = sum(len(self._tables[b]) for b in live)
+
+    def __len__(self):
+        # Items that can be drawn
+        return self._size
+
+    def set_weight(self, item, weight: float):
+        b, i = self._where[item]
+        if self._weights[b][i] == weight:
+            return
+        self._weights[b][i] = weight
+        self._build_block(b)
+        self._build_top()
+
+    def sample(self):
+        return self._tables[self._top.sample()].sample()
+
+
+class RoutingTable:
+    """
+    Prebuilt sampling structure for one source.
+
+    Holds every configured operator with a positive weight. Inactive operators
+    never enter the alias table; operators found at their workload limit get
+    weight 0 in it (only their block is rebuilt) until the workload counters
+    report free capacity for them again (see capacity_freed).
+
+    The counters are only a per-process pre-filter; the slot itself is taken
+    by logic.select_operator with a conditional UPDATE on operators.load.
+    """
+
+    def __init__(self, source_id: int, entries: list[tuple[int, int, bool, int]], version: int = 0):
+        # entries: (operator_id, weight, is_active, workload_limit)
+        self.source_id = source_id
+        # sources.config_version the entries were read at
+        self.version = version
+        self.operator_ids = {op_id for op_id, _, _, _ in entries}
+        self._candidates = {
+            op_id: (weight, limit)
+            for op_id, weight, is_active, limit in entries
+            if is_active and weight and weight > 0
+        }
+        self._saturated: set[int] = set()
+        ops = list(self._candidates)
+        self._alias = BlockAliasTable(ops, [self._candidates[op_id][0] for op_id in ops])
+
+    def _has_capacity(self, operator_id: int) -> bool:
+        return workload.counters.get(operator_id) < self._candidates[operator_id][1]
+
+    def _saturate(self, operator_id: int):
+        self._saturated.add(operator_id)
+        self._alias.set_weight(operator_id, 0)
+
+    def readmit(self, operator_id: int | None = None):
+        """Puts saturated operators (all of them if None) back in if they have capacity again."""
+        for op_id in list(self._saturated) if operator_id is None else [operator_id]:
+            if op_id in self._saturated and self._has_capacity(op_id):
+                self._saturated.discard(op_id)
+                self._alias.set_weight(op_id, self._candidates[op_id][0])
+
+    def select(self) -> int | None:
+        while len(self._alias):
+            operator_id = self._alias.sample()
+            if self._has_capacity(operator_id):
+                return operator_id
+            self._saturate(operator_id)
+        return None
+
+    def accepts(self, operator_id: int) -> bool:
+        """Whether the operator may get this source's contacts and has capacity, without a draw."""
+        return operator_id in self._candidates and self._has_capacity(operator_id)
+
+    def mark_full(self, operator_id: int):
+        # The DB refused a claim: another request or worker took the last slot
+        if operator_id in self._saturated or operator_id not in self._candidates:
+            return
+        workload.counters.saturate(operator_id, self._candidates[operator_id][1])
+        self._saturate(operator_id)
+
+
+class RoutingCache:
+    """Routing tables keyed by source_id, invalidated on weight/operator changes."""
+
+    def __init__(self):
+        self._tables: dict[int, RoutingTable] = {}
+        # Bumped on every invalidation so a table built from a read that raced
+        # with a config change is not stored
+        self._generation = 0
+
+    async def get(self, db: AsyncSession, source_id: int) -> RoutingTable:
+        table = self._tables.get(source_id)
+        if table is None:
+            generation = self._generation
+            table = await self._build(db, source_id)
+            if generation == self._generation:
+                self._tables[source_id] = table
+        return table
+
+    async def _build(self, db: AsyncSession, source_id: int) -> RoutingTable:
+        Config = models.SourceOperatorConfig
+        stmt = select(
+            models.Source.config_version,
+            Config.operator_id,
+            Config.weight,
+            models.Operator.is_active,
+            models.Operator.workload_limit,
+        ).select_from(models.Source).outerjoin(
+            Config, Config.source_id == models.Source.id
+        ).outerjoin(
+            models.Operator, Config.operator_id == models.Operator.id
+        ).where(models.Source.id == source_id)
+        rows = (await db.execute(stmt)).all()
+        version = rows[0].config_version if rows else 0
+        entries = [tuple(row)[1:] for row in rows if row.operator_id is not None]
+        return RoutingTable(source_id, entries, version)
+
+    async def check_versions(self, db: AsyncSession) -> int:
+        """Drops tables whose source config changed in the DB (e.g. in another worker)."""
+        if not self._tables:
+            return 0
+        generation = self._generation
+        cached = {source_id: table.version for source_id, table in self._tables.items()}
+        result = await db.execute(
+            select(models.Source.id, models.Source.config_version).where(models.Source.id.in_(list(cached)))
+        )
+        current = dict(result.all())
+        stale = [source_id for source_id, version in cached.items() if current.get(source_id) != version]
+        if generation == self._generation:
+            for source_id in stale:
+                self.invalidate_source(source_id)
+        return len(stale)
+
+    def invalidate_source(self, source_id: int):
+        self._generation += 1
+        self._tables.pop(source_id, None)
+
+    def invalidate_operator(self, operator_id: int):
+        self._generation += 1
+        for source_id in [s for s, t in self._tables.items() if operator_id in t.operator_ids]:
+            del self._tables[source_id]
+
+    def clear(self):
+        self._generation += 1
+        self._tables.clear()
+
+    def capacity_freed(self, operator_id: int | None):
+        # Called by the workload counters when a count dropped (None: all of
+        # them may have, after a load or reconcile)
+        for table in self._tables.values():
+            table.readmit(operator_id)
+
+
+tables = RoutingCache()
+workload.counters.subscribe(tables.capacity_freed)
+
+
+async def check_versions_forever(session_factory, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_factory() as db:
+                stale = await tables.check_versions(db)
+            if stale:
+                logger.info("Dropped %d stale routing table(s)", stale)
+        except Exception:
+            logger.exception("Routing config version check failed")
@@ -16,6 +16,11 @@ class Operator(OperatorBase):
     class Config:
         from_attributes = True
 
+class OperatorUpdate(BaseModel):
+    id: int
+    is_active: Optional[bool] = None
+    workload_limit: Optional[int] = None
+
 class SourceBase(BaseModel):
     name: str
 
@@ -24,6 +29,7 @@ class SourceCreate(SourceBase):
 
 class Source(SourceBase):
     id: int
+    config_version: int = 0
 
     class Config:
         from_attributes = True
@@ -32,6 +38,13 @@ class SourceWeight(BaseModel):
     operator_id: int
     weight: int
 
+class SourceWeightsResult(BaseModel):
+    status: str = "ok"
+    version: int
+    added: int
+    changed: int
+    removed: int
+
 class LeadBase(BaseModel):
     identifier: str
 
@@ -54,11 +67,114 @@ class Contact(BaseModel):
     source_id: int
     operator_id: Optional[int]
     created_at: datetime
+    status: str = "open"
+    closed_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
+class ContactStatusChange(BaseModel):
+    status: str
+    # Contacts that changed; ids already in the status or unknown are skipped
+    changed: int
+    contact_ids: List[int]
+
+class ContactBatchResult(BaseModel):
+    index: int
+    contact: Optional[Contact] = None
+    error: Optional[str] = None
+
 class DistributionStats(BaseModel):
     total_contacts: int
     by_operator: dict[str, int]
     by_source: dict[str, int]
+    workload_policy: str
+    workload_window_hours: Optional[int] = None
+
+class GroupCommitStats(BaseModel):
+    enabled: bool
+    window_ms: float
+    max_batch: int
+    batches: int
+    items: int
+    avg_batch_size: float
+    batch_size_histogram: dict[str, int]
+
+class CacheStats(BaseModel):
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+    hit_rate: float
+
+class AffinityStats(BaseModel):
+    mode: str
+    size: int
+    maxsize: int
+    lookups: int
+    reused: int
+    stale: int
+    misses: int
+    hit_rate: float
+
+class TimeseriesPoint(BaseModel):
+    bucket_start: datetime
+    operator_id: Optional[int]
+    source_id: int
+    count: int
+
+class Timeseries(BaseModel):
+    start: datetime
+    end: datetime
+    granularity: str
+    points: List[TimeseriesPoint]
+
+class ContactAccepted(BaseModel):
+    id: int
+    status: str
+    status_url: str
+
+class ContactIntake(BaseModel):
+    id: int
+    lead_identifier: str
+    source_id: int
+    status: str
+    attempts: int
+    created_at: datetime
+    processed_at: Optional[datetime]
+    contact_id: Optional[int]
+    operator_id: Optional[int]
+    error: Optional[str]
+
+    class Config:
+        from_attributes = True
+
+class LeadImport(BaseModel):
+    id: int
+    name: str
+    format: str
+    status: str
+    source_id: Optional[int]
+    operator_id: Optional[int]
+    contact_status: Optional[str]
+    rows_done: int
+    rows_skipped: int
+    leads_created: int
+    contacts_created: int
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime]
+    error: Optional[str]
+
+    class Config:
+        from_attributes = True
+
+class IntakeStats(BaseModel):
+    enabled: bool
+    workers: int
+    depth: int
+    in_flight: int
+    max_pending: int
+    done: int
+    retried: int
+    failed: int
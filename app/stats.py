@@ -0,0 +1,194 @@
+"""
+Incrementally maintained distribution counters.
+
+record_contacts() is called by crud before it commits new contacts, so the
+counters (and the time-bucketed rollups, see rollups.py) always match the
+contacts table plus contacts_archive: archival (archive.py) moves rows but
+never touches the counters, so GET /stats/ is unaffected by it. rebuild()
+recomputes them from scratch (one-time backfill, or repair) and check()
+compares them with the raw aggregation over both tables:
+
+    python -m app.stats rebuild
+    python -m app.stats check
+"""
+import asyncio
+import sys
+from collections import Counter
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import func, delete, insert, literal, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from . import models, rollups, workload
+
+_TABLES = (
+    models.OperatorContactCount,
+    models.SourceContactCount,
+    models.OperatorSourceContactCount,
+    models.ContactTotal,
+)
+
+
+async def _bump(db: AsyncSession, model, keys: list[str], counts: Counter):
+    if not counts:
+        return
+    stmt = sqlite_insert(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys, set_={"count": model.count + stmt.excluded.count}
+    )
+    rows = [dict(zip(keys, key if isinstance(key, tuple) else (key,)), count=n) for key, n in counts.items()]
+    await db.execute(stmt, rows)
+
+
+async def record_contacts(db: AsyncSession, contacts: list[tuple[int, int | None]]):
+    """Adds (source_id, operator_id) pairs to the counters. Does not commit."""
+    by_source = Counter(source_id for source_id, _ in contacts)
+    by_operator = Counter(op_id for _, op_id in contacts if op_id is not None)
+    by_pair = Counter((op_id, source_id) for source_id, op_id in contacts if op_id is not None)
+    await _bump(db, models.SourceContactCount, ["source_id"], by_source)
+    await _bump(db, models.OperatorContactCount, ["operator_id"], by_operator)
+    await _bump(db, models.OperatorSourceContactCount, ["operator_id", "source_id"], by_pair)
+    await _bump(db, models.ContactTotal, ["id"], Counter({1: len(contacts)}))
+    await rollups.record_contacts(db, contacts)
+
+
+async def read_distribution(db: AsyncSession) -> dict:
+    total = (await db.execute(select(models.ContactTotal.count))).scalar_one_or_none() or 0
+
+    op_res = await db.execute(
+        select(models.Operator.name, func.sum(models.OperatorContactCount.count))
+        .join(models.Operator, models.OperatorContactCount.operator_id == models.Operator.id)
+        .group_by(models.Operator.name)
+    )
+    src_res = await db.execute(
+        select(models.Source.name, func.sum(models.SourceContactCount.count))
+        .join(models.Source, models.SourceContactCount.source_id == models.Source.id)
+        .group_by(models.Source.name)
+    )
+    return {
+        "total_contacts": total,
+        "by_operator": {name: count for name, count in op_res.all() if count},
+        "by_source": {name: count for name, count in src_res.all() if count},
+    }
+
+
+def _all_contacts():
+    """contacts UNION ALL contacts_archive: the counters keep counting archived contacts."""
+    columns = lambda model: select(model.id, model.operator_id, model.source_id, model.created_at)
+    return union_all(columns(models.Contact), columns(models.ContactArchive)).subquery("all_contacts")
+
+
+def _raw_queries():
+    contact = _all_contacts().c
+    return {
+        models.OperatorContactCount: select(contact.operator_id, func.count(contact.id))
+        .where(contact.operator_id.is_not(None))
+        .group_by(contact.operator_id),
+        models.SourceContactCount: select(contact.source_id, func.count(contact.id))
+        .group_by(contact.source_id),
+        models.OperatorSourceContactCount: select(contact.operator_id, contact.source_id, func.count(contact.id))
+        .where(contact.operator_id.is_not(None))
+        .group_by(contact.operator_id, contact.source_id),
+        models.ContactTotal: select(literal(1), func.count(contact.id)),
+    }
+
+
+def _rollup_totals():
+    # Rollups summed over all buckets must match contacts per (operator, source)
+    rollup = models.ContactRollup
+    contact = _all_contacts().c
+    return (
+        select(rollup.operator_id, rollup.source_id, func.sum(rollup.count))
+        .group_by(rollup.operator_id, rollup.source_id),
+        select(func.coalesce(contact.operator_id, rollups.UNASSIGNED), contact.source_id, func.count(contact.id))
+        .group_by(contact.operator_id, contact.source_id),
+    )
+
+
+async def rebuild(db: AsyncSession):
+    """Recomputes every counter table (and operators.load) from contacts and the archive in one transaction."""
+    for model in _TABLES:
+        await db.execute(delete(model))
+    for model, query in _raw_queries().items():
+        columns = [c.name for c in model.__table__.primary_key.columns] + ["count"]
+        await db.execute(insert(model).from_select(columns, query))
+
+    # Rollups are rebuilt as minute buckets from created_at, then compacted
+    contact = _all_contacts().c
+    await db.execute(delete(models.ContactRollup))
+    await db.execute(insert(models.ContactRollup).from_select(
+        ["granularity", "bucket_start", "operator_id", "source_id", "count"],
+        select(
+            literal("minute"),
+            func.strftime("%Y-%m-%d %H:%M:00.000000", contact.created_at).label("bucket"),
+            func.coalesce(contact.operator_id, rollups.UNASSIGNED).label("op"),
+            contact.source_id,
+            func.count(contact.id),
+        ).group_by("bucket", "op", contact.source_id),
+    ))
+    await workload.sync_operator_loads(db)
+    await rollups.compact(db)
+
+
+async def check(db: AsyncSession) -> dict[str, list]:
+    """Returns, per counter table, the keys whose count differs from the raw aggregation."""
+    mismatches = {}
+    for model, query in _raw_queries().items():
+        keys = list(model.__table__.primary_key.columns)
+        stored = {tuple(row[:-1]): row[-1] for row in (await db.execute(select(*keys, model.count))).all()}
+        raw = {tuple(row[:-1]): row[-1] for row in (await db.execute(query)).all()}
+        diff = [
+            {"key": list(key), "stored": stored.get(key, 0), "actual": raw.get(key, 0)}
+            for key in stored.keys() | raw.keys()
+            if stored.get(key, 0) != raw.get(key, 0)
+        ]
+        if diff:
+            mismatches[model.__tablename__] = diff
+
+    stored_query, raw_query = _rollup_totals()
+    stored = {(op, src): n for op, src, n in (await db.execute(stored_query)).all()}
+    raw = {(op, src): n for op, src, n in (await db.execute(raw_query)).all()}
+    diff = [
+        {"key": list(key), "stored": stored.get(key, 0), "actual": raw.get(key, 0)}
+        for key in stored.keys() | raw.keys()
+        if stored.get(key, 0) != raw.get(key, 0)
+    ]
+    if diff:
+        mismatches[models.ContactRollup.__tablename__] = diff
+
+    # operators.load against the contacts counted by the workload policy;
+    # the window policy lags until the next reconcile, so it isn't compared
+    if workload.counters.policy != workload.WINDOW:
+        stored = {op_id: load for op_id, load in (await db.execute(select(models.Operator.id, models.Operator.load))).all()}
+        raw = await workload.count_workloads(db)
+        diff = [
+            {"key": [op_id], "stored": load, "actual": raw.get(op_id, 0)}
+            for op_id, load in stored.items()
+            if load != raw.get(op_id, 0)
+        ]
+        if diff:
+            mismatches["operators.load"] = diff
+    return mismatches
+
+
+async def _main(command: str) -> int:
+    from .database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        if command == "rebuild":
+            await rebuild(db)
+            print("Distribution counters rebuilt")
+            return 0
+        mismatches = await check(db)
+    for table, diff in mismatches.items():
+        print(f"{table}: {len(diff)} mismatched key(s)")
+        for entry in diff[:20]:
+            print(f"  {entry}")
+    print("Counters are consistent" if not mismatches else "Counters are INCONSISTENT, run: python -m app.stats rebuild")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in ("rebuild", "check"):
+        print("usage: python -m app.stats rebuild|check")
+        sys.exit(2)
+    sys.exit(asyncio.run(_main(sys.argv[1])))
@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import func, cast, literal, update, Integer
+from . import models
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Active-workload policies (WORKLOAD_POLICY):
+#   "open"     - contacts that haven't been closed count towards the limit
+#   "all_time" - every contact ever assigned counts towards the limit
+#   "window"   - only contacts from the last WORKLOAD_WINDOW_HOURS count
+OPEN = "open"
+ALL_TIME = "all_time"
+WINDOW = "window"
+
+
+def window_start() -> datetime:
+    # Naive UTC, comparable with contacts.created_at
+    since = datetime.now(timezone.utc) - timedelta(hours=settings.workload_window_hours)
+    return since.replace(tzinfo=None)
+
+
+def open_contacts():
+    # Rendered as a literal, not a bound parameter, so SQLite can match it
+    # against the partial index ix_contacts_open_operator_id
+    return models.Contact.status == literal(models.Contact.OPEN, literal_execute=True)
+
+
+def active_contacts_filter():
+    """Extra WHERE clause selecting the contacts that count as active workload, or None."""
+    if settings.workload_policy == WINDOW:
+        return models.Contact.created_at >= window_start()
+    if settings.workload_policy == OPEN:
+        return open_contacts()
+    return None
+
+
+def counts_closing() -> bool:
+    """Whether closing or reopening a contact changes its operator's workload."""
+    return settings.workload_policy == OPEN
+
+
+def counts_status(status: str) -> bool:
+    """Whether a new contact with this status counts towards its operator's workload."""
+    return settings.workload_policy != OPEN or status == models.Contact.OPEN
+
+
+def counts_archived() -> bool:
+    """
+    Whether contacts_archive counts too. Only under all_time: archive.py never
+    moves open contacts (open policy) or contacts inside the window.
+    """
+    return settings.workload_policy == ALL_TIME
+
+
+async def count_workloads(db: AsyncSession) -> dict[int, int]:
+    # One grouped query for every operator instead of a COUNT per operator
+    stmt = (
+        select(models.Contact.operator_id, func.count(models.Contact.id))
+        .where(models.Contact.operator_id.is_not(None))
+        .group_by(models.Contact.operator_id)
+    )
+    active = active_contacts_filter()
+    if active is not None:
+        stmt = stmt.where(active)
+    result = await db.execute(stmt)
+    counts = Counter(dict(result.all()))
+    if counts_archived():
+        archive = models.ContactArchive
+        result = await db.execute(
+            select(archive.operator_id, func.count(archive.id))
+            .where(archive.operator_id.is_not(None))
+            .group_by(archive.operator_id)
+        )
+        counts.update(dict(result.all()))
+    return dict(counts)
+
+
+async def count_window_buckets(db: AsyncSession, bucket_seconds: int) -> list[tuple[int, int, int]]:
+    """(operator_id, bucket index, count) for contacts inside the active window."""
+    bucket = cast(func.strftime("%s", models.Contact.created_at), Integer) // bucket_seconds
+    result = await db.execute(
+        select(models.Contact.operator_id, bucket.label("bucket"), func.count(models.Contact.id))
+        .where(models.Contact.operator_id.is_not(None), models.Contact.created_at >= window_start())
+        .group_by(models.Contact.operator_id, "bucket")
+    )
+    return [tuple(row) for row in result.all()]
+
+
+async def sync_operator_loads(db: AsyncSession):
+    """
+    Recomputes operators.load from contacts under the current policy in one
+    UPDATE. Claims commit together with their contact, so this is safe to run
+    while other workers assign contacts. Does not commit.
+    """
+    count = select(func.count(models.Contact.id)).where(models.Contact.operator_id == models.Operator.id)
+    active = active_contacts_filter()
+    if active is not None:
+        count = count.where(active)
+    load = count.scalar_subquery()
+    if counts_archived():
+        archive = models.ContactArchive
+        load = load + select(func.count(archive.id)).where(archive.operator_id == models.Operator.id).scalar_subquery()
+    await db.execute(update(models.Operator).values(load=load))
+
+
+class WindowCounter:
+    """
+    Ring buffer of per-bucket counts covering the last len(slots) buckets.
+
+    Buckets that fall out of the window are zeroed lazily when time advances,
+    so both add() and value() are amortized O(1).
+    """
+
+    def __init__(self, size: int):
+        self.slots = [0] * size
+        self.head: int | None = None  # newest bucket index seen
+        self.total = 0
+
+    def _advance(self, index: int):
+        if self.head is None:
+            self.head = index
+            return
+        if index <= self.head:
+            return
+        size = len(self.slots)
+        for step in range(1, min(index - self.head, size) + 1):
+            pos = (self.head + step) % size
+            self.total -= self.slots[pos]
+            self.slots[pos] = 0
+        self.head = index
+
+    def add(self, index: int, amount: int = 1):
+        self._advance(index)
+        if index <= self.head - len(self.slots):
+            return  # already expired
+        self.slots[index % len(self.slots)] += amount
+        self.total += amount
+
+    def value(self, index: int) -> int:
+        self._advance(index)
+        return self.total
+
+
+class WorkloadCounters:
+    """
+    In-memory per-operator workload.
+
+    Loaded once from the DB, bumped by crud.create_contact after each commit and
+    periodically reconciled, so select_operator can check limits in O(1)
+    instead of issuing a COUNT query per operator. Under the "window" policy
+    each operator gets a WindowCounter so old contacts expire without any
+    query touching historical rows.
+
+    Subscribers (the routing tables) are told when a count goes down, so an
+    operator at its limit can be drawn again: with its id after a decrement,
+    with None after a load or reconcile. Contacts expiring from the window
+    are noticed at the next reconcile.
+    """
+
+    def __init__(self):
+        self._counts: dict[int, int] = {}
+        self._windows: dict[int, WindowCounter] = {}
+        self._loaded = False
+        self._lock = asyncio.Lock()
+        self._subscribers: list[Callable[[int | None], None]] = []
+
+    def subscribe(self, callback: Callable[[int | None], None]):
+        self._subscribers.append(callback)
+
+    def _freed(self, operator_id: int | None):
+        for callback in self._subscribers:
+            callback(operator_id)
+
+    @property
+    def policy(self) -> str:
+        return settings.workload_policy
+
+    @property
+    def bucket_seconds(self) -> int:
+        return max(1, settings.workload_window_hours * 3600 // settings.workload_window_buckets)
+
+    def _bucket_now(self) -> int:
+        return int(time.time()) // self.bucket_seconds
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    async def ensure_loaded(self, db: AsyncSession):
+        if not self._loaded:
+            async with self._lock:
+                if not self._loaded:
+                    await self.load(db)
+
+    async def _read(self, db: AsyncSession):
+        if self.policy == WINDOW:
+            windows = {}
+            for operator_id, bucket, count in await count_window_buckets(db, self.bucket_seconds):
+                window = windows.setdefault(operator_id, WindowCounter(settings.workload_window_buckets))
+                window.add(bucket, count)
+            return {}, windows
+        return await count_workloads(db), {}
+
+    async def load(self, db: AsyncSession):
+        self._counts, self._windows = await self._read(db)
+        self._loaded = True
+        self._freed(None)
+
+    async def reconcile(self, db: AsyncSession) -> int:
+        """Re-read counts from the DB, returns how many operators had drifted."""
+        before = {op_id: self.get(op_id) for op_id in self._counts.keys() | self._windows.keys()}
+        self._counts, self._windows = await self._read(db)
+        self._loaded = True
+        self._freed(None)
+        return sum(
+            1 for op_id in before.keys() | self._counts.keys() | self._windows.keys()
+            if before.get(op_id, 0) != self.get(op_id)
+        )
+
+    def get(self, operator_id: int) -> int:
+        if self.policy == WINDOW:
+            window = self._windows.get(operator_id)
+            return window.value(self._bucket_now()) if window else 0
+        return self._counts.get(operator_id, 0)
+
+    def increment(self, operator_id: int, amount: int = 1):
+        if not self._loaded:
+            return
+        if self.policy == WINDOW:
+            window = self._windows.setdefault(operator_id, WindowCounter(settings.workload_window_buckets))
+            window.add(self._bucket_now(), amount)
+        else:
+            # Negative amounts come from closed contacts; never below zero
+            self._counts[operator_id] = max(0, self._counts.get(operator_id, 0) + amount)
+        if amount < 0:
+            self._freed(operator_id)
+
+    def saturate(self, operator_id: int, limit: int):
+        """Records that the operator is at its limit (a claim lost against another worker)."""
+        missing = limit - self.get(operator_id)
+        if missing > 0:
+            self.increment(operator_id, missing)
+
+    def reset(self):
+        self._counts = {}
+        self._windows = {}
+        self._loaded = False
+        self._freed(None)
+
+
+counters = WorkloadCounters()
+
+
+async def reconcile_forever(session_factory, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_factory() as db:
+                drifted = await counters.reconcile(db)
+                if settings.workload_policy == WINDOW:
+                    # Expire old contacts from the load column the claims check
+                    await sync_operator_loads(db)
+                    await db.commit()
+            if drifted:
+                logger.info("Workload counters reconciled, %d operator(s) drifted", drifted)
+        except Exception:
+            logger.exception("Workload counter reconciliation failed")
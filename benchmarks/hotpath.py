@@ -0,0 +1,245 @@
+"""
+Microbenchmarks for the distribution hot path at realistic data sizes.
+
+Seeds one SQLite database per (operators per source, contacts) combination,
+then times each hot-path function in isolation against it:
+
+- select_operator, warm (cached routing table; the draw plus the operators.load
+  claim UPDATE) and cold (table rebuilt)
+- the pre-cache selection algorithm: join + one COUNT per operator
+- crud.get_operator_workload and the workload counter load
+- lead resolution: LRU hit, upsert on a cache miss, plain lookup
+- /stats/ from the counter tables vs the raw contacts aggregation
+
+    python -m benchmarks.hotpath --operators 10,100,1000 --contacts 10000,1000000
+    python -m benchmarks.hotpath --output bench.json --baseline previous.json
+
+Seeded databases are kept in --data-dir and reused until the schema changes.
+Exits with status 1 if a benchmark is slower than --baseline by more than
+--threshold.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, logic, models, routing, stats, workload
+from app.database import Base
+
+SOURCES = 3
+
+
+def schema_tag() -> str:
+    """Short hash of the tables and columns, so a schema change reseeds."""
+    columns = sorted(f"{table.name}.{column.name}" for table in Base.metadata.tables.values() for column in table.columns)
+    return hashlib.sha1(",".join(columns).encode()).hexdigest()[:8]
+
+
+def seed(path: str, operators_per_source: int, contacts: int):
+    """Bulk-loads a database with sqlite3 directly; far faster than going through the app."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+
+    async def create_schema():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await engine.dispose()
+
+    asyncio.run(create_schema())
+    operators = operators_per_source * SOURCES
+    leads = max(1, contacts // 4)
+    rng = random.Random(42)
+    with sqlite3.connect(path) as conn:
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.executemany(
+            "INSERT INTO operators (id, name, is_active, workload_limit) VALUES (?, ?, 1, ?)",
+            ((i, f"op{i}", 10**9) for i in range(1, operators + 1)),
+        )
+        conn.executemany("INSERT INTO sources (id, name) VALUES (?, ?)", ((s, f"src{s}") for s in range(1, SOURCES + 1)))
+        conn.executemany(
+            "INSERT INTO source_operator_configs (source_id, operator_id, weight) VALUES (?, ?, ?)",
+            ((s, (s - 1) * operators_per_source + i, rng.randint(1, 10))
+             for s in range(1, SOURCES + 1) for i in range(1, operators_per_source + 1)),
+        )
+        conn.executemany("INSERT INTO leads (id, identifier) VALUES (?, ?)", ((i, f"lead{i}") for i in range(1, leads + 1)))
+
+        def contact_rows():
+            for i in range(1, contacts + 1):
+                source = rng.randint(1, SOURCES)
+                operator = (source - 1) * operators_per_source + rng.randint(1, operators_per_source)
+                yield i, rng.randint(1, leads), source, operator, f"2026-01-{rng.randint(1, 28):02d} 12:00:00"
+
+        conn.executemany(
+            "INSERT INTO contacts (id, lead_id, source_id, operator_id, created_at) VALUES (?, ?, ?, ?, ?)",
+            contact_rows(),
+        )
+        conn.commit()
+        conn.execute("ANALYZE")
+
+    async def build_counters():
+        session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async with session_factory() as db:
+            await stats.rebuild(db)
+        await engine.dispose()
+
+    asyncio.run(build_counters())
+
+
+async def legacy_select_operator(db: AsyncSession, source_id: int):
+    """The original algorithm: config join, then one COUNT(*) per configured operator."""
+    result = await db.execute(
+        select(models.SourceOperatorConfig, models.Operator)
+        .join(models.Operator, models.SourceOperatorConfig.operator_id == models.Operator.id)
+        .where(models.SourceOperatorConfig.source_id == source_id, models.Operator.is_active == True)
+    )
+    eligible, weights = [], []
+    for config, operator in result.all():
+        if await crud.get_operator_workload(db, operator.id) < operator.workload_limit:
+            eligible.append(operator.id)
+            weights.append(config.weight)
+    return random.choices(eligible, weights=weights)[0] if eligible else None
+
+
+async def legacy_stats(db: AsyncSession):
+    """The original /stats/: a full count plus two join-and-GROUP-BY aggregations."""
+    await db.execute(select(func.count(models.Contact.id)))
+    await db.execute(
+        select(models.Operator.name, func.count(models.Contact.id))
+        .join(models.Operator, models.Contact.operator_id == models.Operator.id)
+        .group_by(models.Operator.name)
+    )
+    await db.execute(
+        select(models.Source.name, func.count(models.Contact.id))
+        .join(models.Source, models.Contact.source_id == models.Source.id)
+        .group_by(models.Source.name)
+    )
+
+
+def benchmarks(leads: int) -> dict:
+    """name -> (setup, call); setup runs untimed before every call."""
+    def noop():
+        pass
+
+    def clear_routing():
+        routing.tables.clear()
+
+    def clear_leads():
+        crud.lead_cache.clear()
+
+    def prime_lead():
+        # Ids only enter the cache when a transaction commits, and the
+        # benchmark session never does; seed() gives lead1 the id 1
+        crud.lead_cache.put("lead1", 1)
+
+    return {
+        "select_operator_warm": (noop, lambda db: logic.select_operator(db, 1)),
+        "select_operator_cold": (clear_routing, lambda db: logic.select_operator(db, 1)),
+        "select_operator_legacy": (noop, lambda db: legacy_select_operator(db, 1)),
+        "get_operator_workload": (noop, lambda db: crud.get_operator_workload(db, 1)),
+        "workload_counters_load": (noop, lambda db: workload.counters.load(db)),
+        "resolve_lead_cached": (prime_lead, lambda db: crud.resolve_lead_id(db, "lead1")),
+        "resolve_lead_uncached": (clear_leads, lambda db: crud.resolve_lead_id(db, f"lead{random.randint(1, leads)}")),
+        "get_lead_by_identifier": (noop, lambda db: crud.get_lead_by_identifier(db, f"lead{random.randint(1, leads)}")),
+        "stats_counters": (noop, lambda db: stats.read_distribution(db)),
+        "stats_legacy": (noop, lambda db: legacy_stats(db)),
+    }
+
+
+async def run_dataset(path: str, contacts: int, repeat: int, only: set[str] | None) -> dict:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    routing.tables.clear()
+    workload.counters.reset()
+    crud.lead_cache.clear()
+    results = {}
+    async with session_factory() as db:
+        await workload.counters.load(db)
+        for name, (setup, call) in benchmarks(max(1, contacts // 4)).items():
+            if only and name not in only:
+                continue
+            await call(db)  # warm-up
+            samples = []
+            # Slow benchmarks get fewer iterations so big datasets stay tractable
+            budget = time.perf_counter() + 30
+            for _ in range(repeat):
+                setup()
+                start = time.perf_counter()
+                await call(db)
+                samples.append((time.perf_counter() - start) * 1000)
+                if time.perf_counter() > budget and len(samples) >= 3:
+                    break
+            await db.rollback()  # drop anything the upserts wrote
+            samples.sort()
+            results[name] = {
+                "median_ms": statistics.median(samples),
+                "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                "iterations": len(samples),
+            }
+    await engine.dispose()
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the distribution hot path")
+    parser.add_argument("--operators", default="10,100,1000", help="Operators per source, comma-separated")
+    parser.add_argument("--contacts", default="10000,1000000", help="Contact counts, comma-separated (e.g. add 10000000)")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--only", help="Comma-separated benchmark names")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "mini_crm_bench"))
+    parser.add_argument("--output", help="Write the JSON results here")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    only = set(args.only.split(",")) if args.only else None
+    results = {}
+    for operators in (int(x) for x in args.operators.split(",")):
+        for contacts in (int(x) for x in args.contacts.split(",")):
+            dataset = f"ops{operators}_contacts{contacts}"
+            path = os.path.join(args.data_dir, f"{dataset}_{schema_tag()}.db")
+            if not os.path.exists(path):
+                print(f"seeding {dataset} ...", flush=True)
+                start = time.perf_counter()
+                seed(path + ".tmp", operators, contacts)
+                os.replace(path + ".tmp", path)
+                print(f"  seeded in {time.perf_counter() - start:.1f}s", flush=True)
+            results[dataset] = asyncio.run(run_dataset(path, contacts, args.repeat, only))
+
+            print(f"\n{dataset}")
+            print(f"  {'benchmark':<26} {'median ms':>10} {'p95 ms':>10} {'iters':>6}")
+            for name, r in results[dataset].items():
+                print(f"  {name:<26} {r['median_ms']:>10.3f} {r['p95_ms']:>10.3f} {r['iterations']:>6}")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        for dataset, benches in results.items():
+            for name, r in benches.items():
+                before = baseline.get(dataset, {}).get(name)
+                if before and r["median_ms"] > before["median_ms"] * (1 + args.threshold):
+                    regressions.append(f"{dataset} {name}: {r['median_ms']:.3f} ms vs baseline {before['median_ms']:.3f} ms")
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results, "regressions": regressions, "threshold": args.threshold}, f, indent=2)
+        print(f"\nresults written to {args.output}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+Request latency through the full middleware stack for a JSON API route and
+an HTML page.
+
+    python -m benchmarks.middleware --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "middleware.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+
+import httpx
+
+from app import database
+from app.main import app
+
+
+async def measure(client: httpx.AsyncClient, method: str, url: str, requests: int, body=None) -> dict:
+    samples = []
+    for i in range(requests):
+        json = body(i) if body else None
+        start = time.perf_counter()
+        response = await client.request(method, url, json=json)
+        samples.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    samples.sort()
+    return {
+        "mean": statistics.fmean(samples),
+        "p50": samples[len(samples) // 2],
+        "p95": samples[int(len(samples) * 0.95)],
+    }
+
+
+async def main(requests: int):
+    async with database.engine.begin() as conn:
+        await conn.run_sync(database.Base.metadata.create_all)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            operator = (await client.post("/operators/", json={"name": "bench", "workload_limit": 10**9})).json()
+            source = (await client.post("/sources/", json={"name": "bench"})).json()
+            await client.post(f"/sources/{source['id']}/weights", json=[{"operator_id": operator["id"], "weight": 1}])
+
+            cases = [
+                ("GET /", "GET", "/", None),
+                ("POST /contacts/", "POST", "/contacts/",
+                 lambda i: {"lead_identifier": f"lead{i % 500}", "source_id": source["id"]}),
+                ("GET /docs", "GET", "/docs", None),
+            ]
+            print(f"{requests} sequential requests per route (ms)\n")
+            print(f"{'route':<18} {'mean':>8} {'p50':>8} {'p95':>8}")
+            for name, method, url, body in cases:
+                await measure(client, method, url, 50, body)  # warm-up
+                result = await measure(client, method, url, requests, body)
+                print(f"{name:<18} {result['mean']:>8.3f} {result['p50']:>8.3f} {result['p95']:>8.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
@@ -0,0 +1,72 @@
+"""
+Per-page latency of GET /leads/ at increasing depth: OFFSET (skip) vs keyset (after).
+
+Seeds a scratch database with --rows leads and fetches one page at several
+depths through the in-process app. OFFSET latency grows with depth, keyset
+latency should stay flat.
+
+    python -m benchmarks.pagination --rows 1000000
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "pagination.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+
+import httpx
+
+from app import database, pagination
+from app.main import app
+
+
+async def create_schema():
+    async with database.engine.begin() as conn:
+        await conn.run_sync(database.Base.metadata.create_all)
+
+
+def seed(rows: int):
+    with sqlite3.connect(DB_PATH) as conn:
+        conn.executemany(
+            "INSERT INTO leads (id, identifier) VALUES (?, ?)",
+            ((i, f"lead{i}@example.com") for i in range(1, rows + 1)),
+        )
+
+
+async def time_page(client: httpx.AsyncClient, params: dict, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = await client.get("/leads/", params=params)
+        samples.append(time.perf_counter() - start)
+        response.raise_for_status()
+    return statistics.median(samples) * 1000
+
+
+async def main(rows: int, limit: int, repeat: int):
+    await create_schema()
+    seed(rows)
+    depths = [0, rows // 10, rows // 2, rows - limit]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{rows} leads, page size {limit}, median of {repeat} requests\n")
+        print(f"{'depth':>10} {'skip (ms)':>12} {'after (ms)':>12}")
+        for depth in depths:
+            offset_ms = await time_page(client, {"skip": depth, "limit": limit}, repeat)
+            # Ids are dense here, so the row at `depth` has id == depth
+            keyset = {"limit": limit, **({"after": pagination.encode_cursor(depth)} if depth else {})}
+            keyset_ms = await time_page(client, keyset, repeat)
+            print(f"{depth:>10} {offset_ms:>12.2f} {keyset_ms:>12.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.limit, args.repeat))
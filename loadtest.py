@@ -0,0 +1,271 @@
+"""
+Concurrent load test for the Mini-CRM API.
+
+Drives a mix of contact creation, stats and read requests from N concurrent
+workers for a fixed duration, then reports throughput, latency percentiles
+and histograms, errors, and whether the weight distribution and workload
+limits still hold under concurrency.
+
+    python loadtest.py                                  # in-process app, scratch DB
+    python loadtest.py --url http://localhost:8000      # running server
+    python loadtest.py --concurrency 64 --duration 30 --mix contacts=80,stats=10,reads=10
+    python loadtest.py --output run.json --baseline baseline.json
+
+Exits with status 1 if a distribution check fails or the run regressed
+against --baseline by more than --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+# Latency histogram bucket upper bounds in milliseconds
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, math.inf]
+
+# Operators created for the run: (name suffix, weight, workload_limit)
+OPERATORS = [("alice", 1, 10**9), ("bob", 3, 10**9), ("capped", 2, 25)]
+
+
+def percentile(sorted_samples: list[float], q: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, math.ceil(q * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def histogram(samples: list[float]) -> dict[str, int]:
+    counts = {("inf" if b == math.inf else str(b)): 0 for b in BUCKETS_MS}
+    for sample in samples:
+        for bound in BUCKETS_MS:
+            if sample <= bound:
+                counts["inf" if bound == math.inf else str(bound)] += 1
+                break
+    return counts
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, dict[str, int]] = {}
+
+    def record(self, kind: str, elapsed_ms: float, error: str | None):
+        self.latencies.setdefault(kind, []).append(elapsed_ms)
+        if error:
+            by_kind = self.errors.setdefault(kind, {})
+            by_kind[error] = by_kind.get(error, 0) + 1
+
+    def summary(self, duration: float) -> dict:
+        routes = {}
+        for kind, samples in self.latencies.items():
+            samples = sorted(samples)
+            routes[kind] = {
+                "requests": len(samples),
+                "errors": sum(self.errors.get(kind, {}).values()),
+                "rps": len(samples) / duration,
+                "p50_ms": percentile(samples, 0.50),
+                "p95_ms": percentile(samples, 0.95),
+                "p99_ms": percentile(samples, 0.99),
+                "max_ms": samples[-1] if samples else 0.0,
+                "histogram_ms": histogram(samples),
+            }
+        everything = sorted(s for samples in self.latencies.values() for s in samples)
+        total = len(everything)
+        return {
+            "duration_s": duration,
+            "requests": total,
+            "errors": sum(r["errors"] for r in routes.values()),
+            "rps": total / duration,
+            "p50_ms": percentile(everything, 0.50),
+            "p95_ms": percentile(everything, 0.95),
+            "p99_ms": percentile(everything, 0.99),
+            "routes": routes,
+            "error_details": self.errors,
+        }
+
+
+async def setup(client: httpx.AsyncClient, run_id: str) -> dict:
+    operators = {}
+    for suffix, weight, limit in OPERATORS:
+        response = await client.post("/operators/", json={"name": f"{run_id}-{suffix}", "workload_limit": limit})
+        response.raise_for_status()
+        operators[suffix] = {**response.json(), "weight": weight, "workload_limit": limit}
+    source = (await client.post("/sources/", json={"name": f"{run_id}-source"})).json()
+    await client.post(
+        f"/sources/{source['id']}/weights",
+        json=[{"operator_id": op["id"], "weight": op["weight"]} for op in operators.values()],
+    )
+    return {"operators": operators, "source": source}
+
+
+async def worker(client: httpx.AsyncClient, plan: dict, mix: dict[str, int], deadline: float, recorder: Recorder, run_id: str):
+    kinds, weights = zip(*mix.items())
+    source_id = plan["source"]["id"]
+    while time.perf_counter() < deadline:
+        kind = random.choices(kinds, weights=weights)[0]
+        if kind == "contacts":
+            request = client.post("/contacts/", json={
+                "lead_identifier": f"{run_id}-lead-{random.randrange(100_000)}", "source_id": source_id,
+            })
+        elif kind == "stats":
+            request = client.get("/stats/")
+        else:
+            request = client.get(random.choice(["/leads/", "/operators/"]), params={"limit": 50})
+
+        start = time.perf_counter()
+        error = None
+        try:
+            response = await request
+            if response.status_code >= 400:
+                error = f"HTTP {response.status_code}"
+        except httpx.HTTPError as exc:
+            error = type(exc).__name__
+        recorder.record(kind, (time.perf_counter() - start) * 1000, error)
+
+
+async def check_distribution(client: httpx.AsyncClient, plan: dict) -> dict:
+    """Observed assignments must follow the weights and never exceed a limit."""
+    stats = (await client.get("/stats/")).json()["by_operator"]
+    operators = plan["operators"]
+    counts = {suffix: stats.get(op["name"], 0) for suffix, op in operators.items()}
+    checks = {}
+
+    for suffix, op in operators.items():
+        checks[f"limit_{suffix}"] = {
+            "ok": counts[suffix] <= op["workload_limit"],
+            "assigned": counts[suffix],
+            "limit": op["workload_limit"],
+        }
+
+    # Uncapped operators should split their share in proportion to weight;
+    # allow 4 standard deviations of binomial noise
+    alice, bob = counts["alice"], counts["bob"]
+    n = alice + bob
+    expected = operators["bob"]["weight"] / (operators["alice"]["weight"] + operators["bob"]["weight"])
+    observed = bob / n if n else expected
+    tolerance = 4 * math.sqrt(expected * (1 - expected) / n) if n else 0.0
+    checks["weights"] = {
+        "ok": abs(observed - expected) <= tolerance,
+        "expected_share": expected,
+        "observed_share": observed,
+        "tolerance": tolerance,
+        "samples": n,
+    }
+    return checks
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    if result["rps"] < baseline["rps"] * (1 - tolerance):
+        regressions.append(f"throughput {result['rps']:.1f} req/s vs baseline {baseline['rps']:.1f}")
+    for key in ("p50_ms", "p95_ms", "p99_ms"):
+        if result[key] > baseline[key] * (1 + tolerance):
+            regressions.append(f"{key} {result[key]:.2f} vs baseline {baseline[key]:.2f}")
+    return regressions
+
+
+def print_report(result: dict):
+    print(f"\n{result['requests']} requests in {result['duration_s']:.1f}s "
+          f"({result['rps']:.1f} req/s), {result['errors']} errors")
+    print(f"latency p50 {result['p50_ms']:.2f} ms, p95 {result['p95_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms\n")
+    print(f"{'route':<10} {'reqs':>7} {'err':>5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for kind, r in sorted(result["routes"].items()):
+        print(f"{kind:<10} {r['requests']:>7} {r['errors']:>5} {r['rps']:>8.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['max_ms']:>8.2f}")
+    for kind, r in sorted(result["routes"].items()):
+        print(f"\n{kind} latency histogram (ms):")
+        peak = max(r["histogram_ms"].values()) or 1
+        for bound, count in r["histogram_ms"].items():
+            if count:
+                print(f"  <= {bound:>5} {count:>7} {'#' * max(1, round(40 * count / peak))}")
+    if result["error_details"]:
+        print(f"\nerrors: {json.dumps(result['error_details'])}")
+    print("\nchecks:")
+    for name, check in result["checks"].items():
+        details = ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in check.items() if k != "ok")
+        print(f"  {'ok  ' if check['ok'] else 'FAIL'} {name}: {details}")
+
+
+async def run(args) -> dict:
+    mix = {}
+    for part in args.mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("contacts", "stats", "reads"):
+            raise SystemExit(f"unknown mix entry: {name}")
+        mix[name] = int(weight)
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=30, limits=httpx.Limits(max_connections=args.concurrency))
+        lifespan = None
+    else:
+        # In-process: scratch database, no network
+        os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'loadtest.db')}")
+        from app import database
+        from app.main import app
+        async with database.engine.begin() as conn:
+            await conn.run_sync(database.Base.metadata.create_all)
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=30)
+
+    try:
+        async with client:
+            run_id = uuid.uuid4().hex[:8]
+            plan = await setup(client, run_id)
+            recorder = Recorder()
+            print(f"running {args.concurrency} workers for {args.duration}s, mix {mix}, "
+                  f"target {args.url or 'in-process app'}")
+            start = time.perf_counter()
+            deadline = start + args.duration
+            await asyncio.gather(*[
+                worker(client, plan, mix, deadline, recorder, run_id) for _ in range(args.concurrency)
+            ])
+            result = recorder.summary(time.perf_counter() - start)
+            result["config"] = {"concurrency": args.concurrency, "duration": args.duration, "mix": mix,
+                                "target": args.url or "in-process"}
+            result["checks"] = await check_distribution(client, plan)
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Concurrent load test for the Mini-CRM API")
+    parser.add_argument("--url", help="Base URL of a running server (default: in-process app)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds")
+    parser.add_argument("--mix", default="contacts=70,stats=10,reads=20",
+                        help="Relative weights of contacts, stats and reads requests")
+    parser.add_argument("--output", help="Write the JSON result here")
+    parser.add_argument("--baseline", help="JSON result of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression vs baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print_report(result)
+
+    failed = [name for name, check in result["checks"].items() if not check["ok"]]
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        result["regressions"] = regressions
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        failed += regressions
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nresult written to {args.output}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+Multi-process workload-limit stress test.
+
+Starts several OS processes, each running its own copy of the app (like
+uvicorn --workers) against one shared SQLite database, and has them create
+far more contacts than the operators can take, through both POST /contacts/
+and POST /contacts/batch. Afterwards it checks in the database that no
+operator got more contacts than its workload_limit, that operators.load
+matches the contacts actually assigned, and that capacity was used up.
+
+    python stress_limits.py
+    python stress_limits.py --processes 8 --concurrency 32 --contacts 4000
+
+Exits with status 1 if any check fails. tests/test_stress_limits.py runs a
+smaller version of the same scenario.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+# (name, weight, workload_limit)
+OPERATORS = [("a", 1, 40), ("b", 3, 120), ("c", 2, 75), ("d", 5, 60), ("e", 1, 1)]
+
+
+def migrate(database_url: str):
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini"))
+    config.set_main_option("sqlalchemy.url", database_url)
+    command.upgrade(config, "head")
+
+
+def setup(db_path: str) -> list[int]:
+    with sqlite3.connect(db_path) as conn:
+        source_ids = []
+        for s in range(2):
+            source_ids.append(conn.execute("INSERT INTO sources (name) VALUES (?)", (f"stress-src{s}",)).lastrowid)
+        for name, weight, limit in OPERATORS:
+            op_id = conn.execute(
+                "INSERT INTO operators (name, is_active, workload_limit, load) VALUES (?, 1, ?, 0)", (name, limit)
+            ).lastrowid
+            for source_id in source_ids:
+                conn.execute(
+                    "INSERT INTO source_operator_configs (source_id, operator_id, weight) VALUES (?, ?, ?)",
+                    (source_id, op_id, weight),
+                )
+    return source_ids
+
+
+async def hammer(worker: int, contacts: int, concurrency: int, source_ids: list[int]) -> dict:
+    import httpx
+    from app.main import app
+
+    results = {"created": 0, "errors": 0, "error_details": {}}
+
+    def failed(size: int, error: str):
+        results["errors"] += size
+        results["error_details"][error] = results["error_details"].get(error, 0) + 1
+
+    remaining = [contacts]
+
+    async def client_loop(client: httpx.AsyncClient):
+        while remaining[0] > 0:
+            # One in four requests is a small batch
+            size = min(remaining[0], random.choice([1, 1, 1, random.randint(2, 20)]))
+            remaining[0] -= size
+            items = [
+                {"lead_identifier": f"w{worker}-{random.randrange(10**9)}", "source_id": random.choice(source_ids)}
+                for _ in range(size)
+            ]
+            try:
+                if size == 1:
+                    response = await client.post("/contacts/", json=items[0])
+                else:
+                    response = await client.post("/contacts/batch", json=items)
+                if response.status_code >= 400:
+                    failed(size, f"HTTP {response.status_code}")
+                else:
+                    results["created"] += size
+            except Exception as exc:
+                failed(size, f"{type(exc).__name__}: {str(exc).splitlines()[0][:100]}")
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://stress", timeout=60) as client:
+            await asyncio.gather(*[client_loop(client) for _ in range(concurrency)])
+    return results
+
+
+def run_worker(worker: int, database_url: str, contacts: int, concurrency: int, source_ids: list[int], queue):
+    os.environ["DATABASE_URL"] = database_url
+    # SQLite's busy handler isn't fair: with dozens of writers across processes
+    # a single one can wait longer than the default 5s for the write lock
+    os.environ.setdefault("SQLITE_BUSY_TIMEOUT_MS", "30000")
+    try:
+        queue.put(asyncio.run(hammer(worker, contacts, concurrency, source_ids)))
+    except BaseException as exc:
+        # Always report back, or the parent waits forever
+        queue.put({"created": 0, "errors": contacts, "crashed": f"{type(exc).__name__}: {exc}"})
+        raise
+
+
+def check(db_path: str) -> dict:
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute(
+            "SELECT o.name, o.workload_limit, o.load, "
+            "(SELECT count(*) FROM contacts c WHERE c.operator_id = o.id) FROM operators o ORDER BY o.id"
+        ).fetchall()
+        total = conn.execute("SELECT count(*) FROM contacts").fetchone()[0]
+        unassigned = conn.execute("SELECT count(*) FROM contacts WHERE operator_id IS NULL").fetchone()[0]
+
+    checks = {}
+    for name, limit, load, assigned in rows:
+        checks[f"limit_{name}"] = {"ok": assigned <= limit, "assigned": assigned, "limit": limit}
+        checks[f"load_{name}"] = {"ok": load == assigned, "load": load, "assigned": assigned}
+    capacity = sum(limit for _, _, limit in OPERATORS)
+    # More contacts than capacity were sent, so every slot should be taken
+    checks["capacity_used"] = {"ok": total - unassigned == capacity, "assigned": total - unassigned, "capacity": capacity}
+    checks["total"] = {"ok": True, "contacts": total, "unassigned": unassigned}
+    return checks
+
+
+def stress(processes: int, concurrency: int, contacts: int) -> dict:
+    """Runs the whole scenario on a fresh database and returns the checks."""
+    db_path = os.path.join(tempfile.mkdtemp(), "stress.db")
+    database_url = f"sqlite+aiosqlite:///{db_path}"
+    migrate(database_url)
+    source_ids = setup(db_path)
+
+    capacity = sum(limit for _, _, limit in OPERATORS)
+    print(f"{processes} processes x {concurrency} clients, {processes * contacts} contacts for {capacity} slots")
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    workers = [
+        context.Process(target=run_worker, args=(i, database_url, contacts, concurrency, source_ids, queue))
+        for i in range(processes)
+    ]
+    start = time.perf_counter()
+    for process in workers:
+        process.start()
+    results = [queue.get() for _ in workers]
+    for process in workers:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    error_details = {}
+    for result in results:
+        if "crashed" in result:
+            print(f"worker crashed: {result['crashed']}")
+        for error, count in result.get("error_details", {}).items():
+            error_details[error] = error_details.get(error, 0) + count
+    for error, count in sorted(error_details.items(), key=lambda kv: -kv[1]):
+        print(f"  {count:>5} x {error}")
+    created = sum(r["created"] for r in results)
+    errors = sum(r["errors"] for r in results)
+    print(f"{created} contacts created, {errors} failed, in {elapsed:.1f}s\n")
+    checks = check(db_path)
+    checks["no_errors"] = {"ok": errors == 0, "errors": errors}
+    return checks
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Multi-process workload-limit stress test")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients per process")
+    parser.add_argument("--contacts", type=int, default=1000, help="Contacts created per process")
+    args = parser.parse_args()
+
+    checks = stress(args.processes, args.concurrency, args.contacts)
+    for name, result in checks.items():
+        details = ", ".join(f"{k}={v}" for k, v in result.items() if k != "ok")
+        print(f"  {'ok  ' if result['ok'] else 'FAIL'} {name}: {details}")
+    return 0 if all(result["ok"] for result in checks.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+Shared fixtures: one scratch SQLite database built through the Alembic
+migrations for the whole session, and an in-process HTTP client talking to
+the app running with its lifespan.
+
+DATABASE_URL must be set before anything imports app.database, which is why
+it happens at import time here.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "tests.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+
+import httpx
+import pytest
+from alembic import command
+from alembic.config import Config
+
+from app import profiler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="session")
+def db_path() -> str:
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("sqlalchemy.url", os.environ["DATABASE_URL"])
+    command.upgrade(config, "head")
+    return DB_PATH
+
+
+@pytest.fixture(scope="module")
+async def client(db_path):
+    # Per module: the lifespan's background workers are stopped again before
+    # modules that drive the intake pool or imports by hand
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+
+
+@pytest.fixture
+async def db(db_path):
+    from app import database
+
+    async with database.AsyncSessionLocal() as session:
+        yield session
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Context manager that records the block's SQL with profiler.capture() and
+    fails if it issues more than `budget` statements or repeats a statement
+    shape often enough to look like an N+1 (executemany batches excepted).
+    """
+    @contextmanager
+    def check(name: str, budget: int):
+        with profiler.capture(name) as profile:
+            yield profile
+        timeline = "\n".join(f"{e['ms']:7.3f} ms  {e['sql'][:110]}" for e in profile.report()["timeline"])
+        suspects = [g for g in profile.n_plus_one() if not g["executemany"]]
+        assert not suspects, f"{name}: N+1 suspects {[(g['count'], g['sql'][:110]) for g in suspects]}\n{timeline}"
+        assert profile.count <= budget, f"{name}: {profile.count} statements, budget {budget}\n{timeline}"
+
+    return check
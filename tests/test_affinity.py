@@ -0,0 +1,145 @@
+import random
+
+import pytest
+from sqlalchemy import update
+
+from app import affinity, models
+from app.config import settings
+
+
+@pytest.fixture
+def assignments(monkeypatch):
+    # An empty map the app uses instead of the shared one
+    fresh = affinity.AffinityMap(1000)
+    monkeypatch.setattr(affinity, "assignments", fresh)
+    return fresh
+
+
+@pytest.fixture
+def mode(monkeypatch, assignments):
+    def set_mode(value: str):
+        monkeypatch.setattr(settings, "affinity_mode", value)
+    return set_mode
+
+
+@pytest.fixture
+def rng():
+    state = random.getstate()
+    random.seed(20261018)
+    yield
+    random.setstate(state)
+
+
+async def make_operators(client, prefix: str, limits: list[int]) -> list[int]:
+    response = await client.post(
+        "/operators/batch", json=[{"name": f"{prefix}{i}", "workload_limit": limit} for i, limit in enumerate(limits)]
+    )
+    return [operator["id"] for operator in response.json()]
+
+
+async def make_source(client, name: str, weights: dict[int, int]) -> int:
+    source = (await client.post("/sources/", json={"name": name})).json()["id"]
+    await set_weights(client, source, weights)
+    return source
+
+
+async def set_weights(client, source_id: int, weights: dict[int, int]):
+    response = await client.post(
+        f"/sources/{source_id}/weights", json=[{"operator_id": op_id, "weight": w} for op_id, w in weights.items()]
+    )
+    assert response.status_code == 200
+
+
+async def create(client, identifier: str, source_id: int) -> int | None:
+    response = await client.post("/contacts/", json={"lead_identifier": identifier, "source_id": source_id})
+    return response.json()["operator_id"]
+
+
+def test_keys_per_mode(mode, assignments):
+    mode(affinity.OFF)
+    assignments.remember(1, 10, 100)
+    assert assignments.lookup(1, 10) is None
+
+    mode(affinity.SOURCE)
+    assignments.remember(1, 10, 100)
+    assignments.remember(1, 11, None)  # unassigned: nothing to remember
+    assert assignments.lookup(1, 10) == 100
+    assert assignments.lookup(1, 11) is None
+
+    mode(affinity.ANY)
+    assignments.remember(2, 10, 200)
+    assignments.remember(2, 11, 201)
+    assert assignments.lookup(2, 10) == assignments.lookup(2, 12) == 201
+
+
+async def test_source_mode_sticks_per_source(client, mode, assignments):
+    mode(affinity.SOURCE)
+    ops = await make_operators(client, "affinity-src-op", [50, 50, 50])
+    first = await make_source(client, "affinity-src-1", {ops[0]: 1, ops[1]: 1})
+    second = await make_source(client, "affinity-src-2", {ops[2]: 1})
+
+    operator = await create(client, "affinity-src-lead", first)
+    assert {await create(client, "affinity-src-lead", first) for _ in range(10)} == {operator}
+    # Another source is another key: its own draw, then sticky there too
+    assert await create(client, "affinity-src-lead", second) == ops[2]
+    assert await create(client, "affinity-src-lead", first) == operator
+    assert assignments.stats()["reused"] == 11
+    assert assignments.stats()["stale"] == 0
+
+
+async def test_any_mode_follows_lead_across_sources(client, mode, assignments):
+    mode(affinity.ANY)
+    ops = await make_operators(client, "affinity-any-op", [50, 50])
+    first = await make_source(client, "affinity-any-1", {ops[0]: 1})
+    second = await make_source(client, "affinity-any-2", {ops[1]: 1})
+
+    assert await create(client, "affinity-any-lead", first) == ops[0]
+    # Not configured for the second source, but it had the lead last
+    assert await create(client, "affinity-any-lead", second) == ops[0]
+    assert assignments.stats()["reused"] == 1
+
+    mode(affinity.SOURCE)
+    assert await create(client, "affinity-any-lead2", first) == ops[0]
+    assert await create(client, "affinity-any-lead2", second) == ops[1]
+
+
+async def test_full_previous_operator_is_repicked_by_weight(client, mode, assignments, rng):
+    mode(affinity.SOURCE)
+    leads = [f"affinity-full-{i}" for i in range(200)]
+    ops = await make_operators(client, "affinity-full-op", [len(leads), 500, 500])
+    source = await make_source(client, "affinity-full-src", {ops[0]: 1})
+
+    batch = [{"lead_identifier": lead, "source_id": source} for lead in leads]
+    response = await client.post("/contacts/batch", json=batch)
+    assert {item["contact"]["operator_id"] for item in response.json()} == {ops[0]}
+
+    # ops[0] is now at its limit; its leads come back and are drawn 1:3
+    await set_weights(client, source, {ops[0]: 1, ops[1]: 1, ops[2]: 3})
+    response = await client.post("/contacts/batch", json=batch)
+    picked = [item["contact"]["operator_id"] for item in response.json()]
+    assert ops[0] not in picked
+    assert picked.count(ops[2]) / len(picked) == pytest.approx(0.75, abs=0.08)
+    assert assignments.stats()["stale"] == len(leads)
+
+    # The map follows the new operators
+    assert await create(client, leads[0], source) == picked[0]
+
+
+async def test_previous_operator_refused_by_claim(client, mode, assignments, db):
+    mode(affinity.SOURCE)
+    ops = await make_operators(client, "affinity-claim-op", [5, 5])
+    source = await make_source(client, "affinity-claim-src", {ops[0]: 1})
+    assert await create(client, "affinity-claim-1", source) == ops[0]
+    assert await create(client, "affinity-claim-2", source) == ops[0]
+    await set_weights(client, source, {ops[0]: 1, ops[1]: 1})
+
+    # Another worker fills ops[0]; this process's counters don't know yet
+    await db.execute(update(models.Operator).where(models.Operator.id == ops[0]).values(load=5))
+    await db.commit()
+    assert await create(client, "affinity-claim-1", source) == ops[1]
+    assert assignments.stats()["stale"] == 1
+
+    # Now known to be full here: refused before any claim, in a batch too
+    response = await client.post("/contacts/batch", json=[{"lead_identifier": "affinity-claim-2", "source_id": source}])
+    assert response.json()[0]["contact"]["operator_id"] == ops[1]
+    assert assignments.stats()["stale"] == 2
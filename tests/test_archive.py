@@ -0,0 +1,45 @@
+import json
+from datetime import timedelta
+
+from sqlalchemy import select, update
+
+from app import archive, models, stats, workload
+from app.rollups import utcnow
+
+
+async def test_archive_batch_keeps_counts_and_exports(client, db):
+    operator = (await client.post("/operators/", json={"name": "archive-op", "workload_limit": 10})).json()
+    source = (await client.post("/sources/", json={"name": "archive-src"})).json()
+    await client.post(f"/sources/{source['id']}/weights", json=[{"operator_id": operator["id"], "weight": 1}])
+    contacts = [
+        (await client.post("/contacts/", json={"lead_identifier": f"archive-{i}", "source_id": source["id"]})).json()
+        for i in range(4)
+    ]
+    ids = [contact["id"] for contact in contacts]
+    await client.post("/contacts/close", json=ids[:3])
+    await db.execute(
+        update(models.Contact).where(models.Contact.id.in_(ids)).values(created_at=utcnow() - timedelta(days=100))
+    )
+    intake = models.ContactIntake(
+        lead_identifier="archive-0", source_id=source["id"], status=models.ContactIntake.DONE, attempts=1,
+        created_at=utcnow(), available_at=utcnow(), contact_id=ids[0],
+    )
+    db.add(intake)
+    await db.commit()
+    before = (await workload.count_workloads(db), workload.counters.get(operator["id"]))
+
+    # Under the open policy only the closed ones move
+    assert await archive.archive_batch(db, archive.cutoff_for(30), 100) == 3
+    assert await archive.archive_batch(db, archive.cutoff_for(30), 100) == 0
+    hot = (await db.scalars(select(models.Contact.id).where(models.Contact.id.in_(ids)))).all()
+    assert hot == [ids[3]]
+
+    assert await stats.check(db) == {}
+    assert (await workload.count_workloads(db), workload.counters.get(operator["id"])) == before
+    db.expunge_all()
+    assert (await db.get(models.ContactIntake, intake.id)).contact_id is None
+
+    exported = (await client.get("/contacts/export", params={"source_id": source["id"]})).text.splitlines()
+    assert sorted(json.loads(line)["id"] for line in exported) == ids
+    leads = (await client.get("/leads/export", params={"source_id": source["id"]})).text.splitlines()
+    assert sorted(json.loads(line)["identifier"] for line in leads) == [f"archive-{i}" for i in range(4)]
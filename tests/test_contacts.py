@@ -0,0 +1,49 @@
+from sqlalchemy import func, select
+
+from app import crud, models, stats, workload
+
+
+async def test_batch_with_unknown_source_creates_no_lead(client, db):
+    source = (await client.post("/sources/", json={"name": "contacts-known-src"})).json()
+    response = await client.post("/contacts/batch", json=[
+        {"lead_identifier": "contacts-kept", "source_id": source["id"]},
+        {"lead_identifier": "contacts-ghost", "source_id": 10**9},
+    ])
+    assert [(item.get("contact") is not None, item.get("error")) for item in response.json()] == [
+        (True, None), (False, "Source not found"),
+    ]
+    identifiers = (await db.scalars(
+        select(models.Lead.identifier).where(models.Lead.identifier.in_(["contacts-kept", "contacts-ghost"]))
+    )).all()
+    assert identifiers == ["contacts-kept"]
+    assert crud.lead_cache.get("contacts-ghost") is None
+
+
+async def test_close_frees_capacity_and_reopen_counts_again(client, db):
+    operator = (await client.post("/operators/", json={"name": "contacts-op", "workload_limit": 2})).json()
+    source = (await client.post("/sources/", json={"name": "contacts-status-src"})).json()
+    await client.post(f"/sources/{source['id']}/weights", json=[{"operator_id": operator["id"], "weight": 1}])
+
+    async def create(identifier: str) -> dict:
+        return (await client.post("/contacts/", json={"lead_identifier": identifier, "source_id": source["id"]})).json()
+
+    first, second = await create("contacts-s1"), await create("contacts-s2")
+    assert first["operator_id"] == second["operator_id"] == operator["id"]
+    assert (await create("contacts-s3"))["operator_id"] is None
+
+    closed = await client.post(f"/contacts/{first['id']}/close")
+    assert closed.json()["status"] == models.Contact.CLOSED
+    assert (await create("contacts-s4"))["operator_id"] == operator["id"]
+
+    # A reopened contact counts again, even past the limit
+    reopened = await client.post("/contacts/reopen", json=[first["id"]])
+    assert reopened.status_code == 200
+    assert workload.counters.get(operator["id"]) == 3
+
+    open_contacts = (await db.execute(
+        select(func.count(models.Contact.id))
+        .where(models.Contact.operator_id == operator["id"], models.Contact.status == models.Contact.OPEN)
+    )).scalar_one()
+    load = (await db.execute(select(models.Operator.load).where(models.Operator.id == operator["id"]))).scalar_one()
+    assert load == open_contacts == 3
+    assert await stats.check(db) == {}
@@ -0,0 +1,81 @@
+import httpx
+import pytest
+
+from app import delivery
+from app.delivery import PrecompressedStatic, _Asset
+
+TEXT = b"body { color: black; }\n" * 200
+ENCODINGS = ["identity", "gzip"] + (["br"] if delivery.brotli is not None else [])
+
+
+@pytest.fixture
+async def static(tmp_path):
+    (tmp_path / "app.css").write_bytes(TEXT)
+    app = PrecompressedStatic(str(tmp_path))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app), base_url="http://test") as client:
+        yield app, client
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("gzip;q=1, br;q=0.1", "gzip"),
+        ("br;q=0.1, gzip", "gzip"),
+        ("GZIP; Q=0.8 , br ; q=0.2", "gzip"),
+        ("br, gzip", "br"),
+        ("gzip;q=0.5, br;q=0.5", "br"),
+        ("*", "br"),
+        ("*;q=0.5, br;q=0", "gzip"),
+        ("identity, gzip;q=0.5", "identity"),
+        ("gzip;q=0, br;q=0", "identity"),
+        ("gzip;q=oops", "identity"),
+        ("*;q=0", "identity"),
+        ("", "identity"),
+    ],
+)
+def test_pick_highest_quality(header, expected):
+    asset = _Asset(TEXT, "text/css")
+    asset.variants.setdefault("br", (b"br", '"br"'))
+    assert asset.pick(header) == expected
+
+
+def test_pick_skips_missing_variants():
+    asset = _Asset(TEXT, "text/css")
+    asset.variants.pop("br", None)
+    assert asset.pick("br;q=1, gzip;q=0.1") == "gzip"
+    assert asset.pick("br") == "identity"
+
+
+async def test_serves_chosen_variant(static):
+    app, client = static
+    response = await client.get("/app.css", headers={"Accept-Encoding": "gzip;q=1, br;q=0.1"})
+    body, etag = app.assets["app.css"].variants["gzip"]
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == etag
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.content == TEXT  # httpx decodes gzip
+    assert int(response.headers["content-length"]) == len(body)
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+async def test_not_modified_per_variant(static, encoding):
+    app, client = static
+    accept = {"Accept-Encoding": encoding}
+    etag = (await client.get("/app.css", headers=accept)).headers["etag"]
+    assert etag == app.assets["app.css"].variants[encoding][1]
+
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}'):
+        response = await client.get("/app.css", headers={**accept, "If-None-Match": if_none_match})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert "content-encoding" not in response.headers
+
+    # Another variant's ETag doesn't validate this one
+    for other in ENCODINGS:
+        if other != encoding:
+            other_etag = app.assets["app.css"].variants[other][1]
+            response = await client.get("/app.css", headers={**accept, "If-None-Match": other_etag})
+            assert response.status_code == 200
+            assert response.headers["etag"] == etag
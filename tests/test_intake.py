@@ -0,0 +1,137 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import delete, func, select, update
+
+from app import crud, database, intake, logic, models, schemas
+from app.rollups import utcnow
+
+Intake = models.ContactIntake
+
+
+@pytest.fixture
+async def source(db):
+    # Rows left by other modules would be claimed by these pools
+    await db.execute(delete(Intake))
+    await db.commit()
+    return await crud.create_source(db, schemas.SourceCreate(name=f"intake-src-{utcnow().timestamp()}"))
+
+
+def make_pool(lease: float = 60.0, max_attempts: int = 5) -> intake.IntakePool:
+    return intake.IntakePool(database.AsyncSessionLocal, 2, 100, max_attempts, 0.01, 0.05, lease)
+
+
+async def contacts_for(db, identifier: str) -> int:
+    return (await db.execute(
+        select(func.count(models.Contact.id)).join(models.Lead).where(models.Lead.identifier == identifier)
+    )).scalar_one()
+
+
+async def intake_row(db, intake_id: int):
+    db.expunge_all()
+    return (await db.execute(select(Intake).where(Intake.id == intake_id))).scalar_one()
+
+
+async def test_expired_lease_is_requeued_once(db, source):
+    first, second = make_pool(), make_pool()
+    queued = await first.enqueue(db, schemas.ContactCreate(lead_identifier="intake-lease", source_id=source.id))
+    [stale] = await first._claim(5)
+    # The first worker stalls past its lease
+    await db.execute(update(Intake).where(Intake.id == queued.id).values(claimed_at=utcnow() - timedelta(hours=1)))
+    await db.commit()
+
+    assert await second._sweep() == 1
+    assert await second._sweep() == 0
+    [fresh] = await second._claim(5)
+    assert (fresh.id, fresh.attempts) == (queued.id, 2)
+    # A fresh claim is not swept again
+    assert await second._sweep() == 0
+    await second._process(fresh)
+    # The late worker's attempt is dropped instead of assigning a second time
+    await first._process(stale)
+
+    assert await contacts_for(db, "intake-lease") == 1
+    row = await intake_row(db, queued.id)
+    assert (row.status, row.attempts) == (Intake.DONE, 2)
+    assert (second.done, first.done) == (1, 0)
+
+
+async def test_create_contact_skips_a_row_no_longer_leased(db, source):
+    pool = make_pool()
+    await pool.enqueue(db, schemas.ContactCreate(lead_identifier="intake-stolen", source_id=source.id))
+    [row] = await pool._claim(5)
+    # Claimed again elsewhere after the lease expired
+    await db.execute(update(Intake).where(Intake.id == row.id).values(attempts=row.attempts + 1))
+    await db.commit()
+
+    lead_id = await crud.resolve_lead_id(db, "intake-stolen")
+    contact = await crud.create_contact(
+        db, lead_id, source.id, None, intake_id=row.id, intake_attempts=row.attempts
+    )
+    assert contact is None
+    assert await contacts_for(db, "intake-stolen") == 0
+    assert (await intake_row(db, row.id)).status == Intake.PROCESSING
+
+
+async def test_failures_are_retried_then_failed(db, source, monkeypatch):
+    async def broken(*args, **kwargs):
+        raise RuntimeError("routing down")
+
+    monkeypatch.setattr(logic, "select_operator", broken)
+    pool = make_pool(max_attempts=2)
+    queued = await pool.enqueue(db, schemas.ContactCreate(lead_identifier="intake-retry", source_id=source.id))
+    [row] = await pool._claim(5)
+    await pool._process(row)
+    retried = await intake_row(db, queued.id)
+    assert (retried.status, retried.attempts, pool.retried) == (Intake.PENDING, 1, 1)
+    assert "routing down" in retried.error
+
+    # Due again once the backoff is over
+    await db.execute(update(Intake).where(Intake.id == queued.id).values(available_at=utcnow()))
+    await db.commit()
+    [row] = await pool._claim(5)
+    await pool._process(row)
+    failed = await intake_row(db, queued.id)
+    assert (failed.status, failed.attempts, pool.failed) == (Intake.FAILED, 2, 1)
+    assert pool._held == {}
+
+
+async def test_retry_of_a_row_claimed_elsewhere_is_lost(db, source, monkeypatch):
+    pool = make_pool()
+    queued = await pool.enqueue(db, schemas.ContactCreate(lead_identifier="intake-lost", source_id=source.id))
+    [row] = await pool._claim(5)
+    await db.execute(update(Intake).where(Intake.id == row.id).values(attempts=row.attempts + 1))
+    await db.commit()
+    await pool._retry_or_fail(row, RuntimeError("late"))
+    unchanged = await intake_row(db, queued.id)
+    assert (unchanged.status, unchanged.error, pool.retried, pool.failed) == (Intake.PROCESSING, None, 0, 0)
+
+
+async def test_stop_releases_only_its_own_claims(db, source):
+    mine, other = make_pool(), make_pool()
+    for name in ("intake-mine", "intake-other"):
+        await mine.enqueue(db, schemas.ContactCreate(lead_identifier=name, source_id=source.id))
+    [held] = await mine._claim(1)
+    [taken] = await other._claim(1)
+    await mine.start()
+    await mine.stop()
+    assert (await intake_row(db, held.id)).status == Intake.PENDING
+    assert (await intake_row(db, taken.id)).status == Intake.PROCESSING
+
+
+async def test_full_queue_answers_503(client, source, monkeypatch):
+    await intake.pool.start()
+    try:
+        monkeypatch.setattr(intake.pool, "max_pending", 2)
+        monkeypatch.setattr(intake.pool, "depth", 2)
+        body = {"lead_identifier": "intake-full", "source_id": source.id}
+        response = await client.post("/contacts/", json=body)
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+
+        intake.pool.depth = 1
+        response = await client.post("/contacts/", json=body)
+        assert response.status_code == 202
+        assert response.headers["location"].startswith("/contacts/intake/")
+    finally:
+        await intake.pool.stop()
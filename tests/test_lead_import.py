@@ -0,0 +1,50 @@
+import io
+
+import pytest
+from sqlalchemy import func, select
+
+from app import crud, database, lead_import, models, schemas
+
+Job = models.LeadImport
+
+
+def csv_file() -> str:
+    # 25 records: 23 new leads, one blank (skipped), one lead that already exists
+    rows = [f"Import-R{i}@Example.com" for i in range(23)]
+    rows[12:12] = ['""']
+    rows[5:5] = ["import-existing"]
+    return "identifier\n" + "\n".join(rows) + "\n"
+
+
+async def test_resume_after_stop_skips_committed_batches(db, monkeypatch):
+    source = await crud.create_source(db, schemas.SourceCreate(name="import-src"))
+    await crud.create_lead(db, "import-existing")
+    job = await lead_import.create_job(db, "leads.csv", "csv", source.id)
+
+    def stop_after_first_batch(progress):
+        monkeypatch.setattr(lead_import, "_stopping", True)
+
+    records = lead_import.read_records(io.StringIO(csv_file()), "csv")
+    with pytest.raises(lead_import.Interrupted):
+        await lead_import.run(database.AsyncSessionLocal, job.id, records, batch_size=10, progress=stop_after_first_batch)
+    monkeypatch.setattr(lead_import, "_stopping", False)
+    db.expunge_all()  # the job was written by run()'s own sessions
+    stopped = await lead_import.get_job(db, job.id)
+    assert (stopped.status, stopped.rows_done) == (Job.FAILED, 10)
+
+    resumed = await lead_import.reopen_job(db, stopped)
+    assert resumed.status == Job.RUNNING
+    records = lead_import.read_records(io.StringIO(csv_file()), "csv")
+    done = await lead_import.run(database.AsyncSessionLocal, job.id, records, batch_size=10)
+
+    assert (done.status, done.rows_done, done.rows_skipped) == (Job.DONE, 25, 1)
+    assert (done.leads_created, done.contacts_created) == (23, 24)
+    leads = (await db.execute(
+        select(models.Lead.identifier).where(models.Lead.identifier.like("import-%"))
+    )).scalars().all()
+    assert len(leads) == len(set(leads)) == 24
+    assert "import-r0@example.com" in leads
+    contacts = (await db.execute(
+        select(func.count(models.Contact.id)).where(models.Contact.source_id == source.id)
+    )).scalar_one()
+    assert contacts == 24
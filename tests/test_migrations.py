@@ -0,0 +1,45 @@
+import os
+import sqlite3
+
+from alembic import command
+from alembic.config import Config
+
+from conftest import ROOT
+
+
+def test_normalize_lead_identifiers(tmp_path):
+    db_path = os.path.join(tmp_path, "migrate.db")
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("sqlalchemy.url", f"sqlite+aiosqlite:///{db_path}")
+    command.upgrade(config, "212bc540ad90")
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany("INSERT INTO leads (identifier) VALUES (?)", [
+            ("Élodie@x.com",), ("\xa0padded\u2003",), (" Bob@Y.COM ",), ("Plain",), ("dup@x.com",), ("DUP@x.com",),
+        ])
+    command.upgrade(config, "f81f76ac7b98")
+    with sqlite3.connect(db_path) as conn:
+        identifiers = [row[0] for row in conn.execute("SELECT identifier FROM leads ORDER BY id")]
+    # Non-ASCII case and Unicode spaces are normalized like at runtime; a
+    # spelling whose normalized form already exists is left alone
+    assert identifiers == ["élodie@x.com", "padded", "bob@y.com", "Plain", "dup@x.com", "DUP@x.com"]
+
+
+def test_intake_claimed_at_round_trip(tmp_path):
+    db_path = os.path.join(tmp_path, "round-trip.db")
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("sqlalchemy.url", f"sqlite+aiosqlite:///{db_path}")
+    command.upgrade(config, "head")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "INSERT INTO contact_intake (lead_identifier, source_id, status, attempts, created_at, available_at, claimed_at)"
+            " VALUES ('round-trip', 1, 'processing', 1, '2026-10-18', '2026-10-18', '2026-10-18')"
+        )
+    command.downgrade(config, "b64fb82100e1")
+    with sqlite3.connect(db_path) as conn:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(contact_intake)")}
+        indexes = {row[1] for row in conn.execute("PRAGMA index_list(contact_intake)")}
+        rows = conn.execute("SELECT lead_identifier, status FROM contact_intake").fetchall()
+    assert "claimed_at" not in columns
+    assert "ix_contact_intake_status_available_at" in indexes
+    assert rows == [("round-trip", "processing")]
+    command.upgrade(config, "head")
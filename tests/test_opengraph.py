@@ -0,0 +1,86 @@
+import gzip
+
+import httpx
+import pytest
+
+from app.opengraph import OpenGraphMiddleware, _Injector
+
+META = b"<meta og>"
+
+
+def inject(chunks: list[bytes]) -> bytes:
+    injector = _Injector(META)
+    return b"".join(injector.feed(chunk) for chunk in chunks) + injector.finish()
+
+
+@pytest.mark.parametrize("split", range(1, 40))
+def test_marker_split_across_chunks(split):
+    page = b"<html><HEAD><title>t</title></HeAd><body>x</body></html>"
+    assert inject([page[:split], page[split:]]) == page.replace(b"</HeAd>", META + b"    </HeAd>")
+
+
+def test_many_chunks_before_body():
+    page = b"<html>" + b"<!-- filler -->" * 50 + b"<BODY>x</BODY></html>"
+    chunks = [page[i:i + 3] for i in range(0, len(page), 3)]
+    assert inject(chunks) == page.replace(b"<BODY>", b"<head>" + META + b"</head>\n<BODY>")
+
+
+def test_existing_og_title_split_is_left_alone():
+    page = b'<html><head><meta property="og:title" content="x"></head><body></body></html>'
+    split = page.index(b"og:title") + 4
+    assert inject([page[:split], page[split:]]) == page
+
+
+def test_fragment_in_many_chunks_is_wrapped():
+    fragment = b"<p>hello</p>" * 100
+    out = inject([fragment[i:i + 5] for i in range(0, len(fragment), 5)])
+    assert out == b"<!DOCTYPE html><html><head>" + META + b"</head><body>" + fragment + b"</body></html>"
+
+
+def test_streams_after_the_head():
+    injector = _Injector(META)
+    assert injector.feed(b"<html><head>") == b""
+    assert injector.feed(b"</head>") == b"<html><head>" + META + b"    </head>"
+    assert injector.feed(b"<body>rest") == b"<body>rest"
+    assert injector.finish() == b""
+
+
+def html_app(chunks: list[bytes], content_type: bytes = b"text/html; charset=utf-8", extra_headers=()):
+    async def app(scope, receive, send):
+        headers = [(b"content-type", content_type), *extra_headers]
+        if len(chunks) == 1:
+            headers.append((b"content-length", str(len(chunks[0])).encode()))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+    return OpenGraphMiddleware(app)
+
+
+async def get(app) -> httpx.Response:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://og.test") as client:
+        return await client.get("/page")
+
+
+async def test_single_body_gets_exact_content_length():
+    response = await get(html_app([b"<html><head></head><body>x</body></html>"]))
+    assert b"og:title" in response.content
+    assert response.headers["content-length"] == str(len(response.content))
+
+
+async def test_streamed_body_drops_content_length():
+    response = await get(html_app([b"<html><he", b"ad></head>", b"<body>x</body></html>"]))
+    assert "content-length" not in response.headers
+    assert response.content.count(b"og:title") == 1
+    assert response.content.endswith(b"<body>x</body></html>")
+
+
+async def test_other_responses_pass_through():
+    body = b"<html><head></head></html>"
+    response = await get(html_app([body], b"application/json"))
+    assert response.content == body
+    assert response.headers["content-length"] == str(len(body))
+
+    compressed = gzip.compress(body)
+    response = await get(html_app([compressed], b"text/html", [(b"content-encoding", b"gzip")]))
+    assert response.content == body
+    assert response.headers["content-length"] == str(len(compressed))
@@ -0,0 +1,64 @@
+"""
+Query-count regression test: each API endpoint, measured warm, is held to a
+statement budget and must not show N+1 suspects. Lower a budget when an
+endpoint gets cheaper; raising one should come with a reason in the commit.
+"""
+import pytest
+
+# (name, method, path, json body, max statements); {op}, {source}, {lead}
+# and {contact} are filled in from the seeded data
+BUDGETS = [
+    ("create operator", "POST", "/operators/", {"name": "budget-op", "workload_limit": 10}, 2),
+    ("list operators", "GET", "/operators/?limit=50", None, 1),
+    ("update operator", "PATCH", "/operators/{op}?is_active=true&workload_limit=1000", None, 2),
+    ("create operators", "POST", "/operators/batch",
+     [{"name": f"budget-op-{i}", "workload_limit": 10} for i in range(50)], 1),
+    ("update operators", "PATCH", "/operators/batch",
+     [{"id": "{op}", "workload_limit": 1000}, {"id": "{op}", "is_active": True}], 3),
+    ("create source", "POST", "/sources/", {"name": "budget-src"}, 2),
+    ("set weights", "POST", "/sources/{source}/weights", [{"operator_id": "{op}", "weight": 2}], 4),
+    ("contact, warm", "POST", "/contacts/", {"lead_identifier": "{lead}", "source_id": "{source}"}, 9),
+    ("contact, new lead", "POST", "/contacts/", {"lead_identifier": "budget-new", "source_id": "{source}"}, 9),
+    ("contact batch", "POST", "/contacts/batch",
+     [{"lead_identifier": f"budget-batch-{i}", "source_id": "{source}"} for i in range(50)], 11),
+    ("close contact", "POST", "/contacts/{contact}/close", None, 2),
+    ("reopen contacts", "POST", "/contacts/reopen", ["{contact}"], 2),
+    ("list leads", "GET", "/leads/?limit=50", None, 1),
+    ("stats", "GET", "/stats/", None, 3),
+    ("timeseries", "GET", "/stats/timeseries?granularity=hour", None, 1),
+]
+
+
+def fill(value, ids: dict):
+    if isinstance(value, str):
+        for key, id_ in ids.items():
+            if value == "{" + key + "}":
+                return id_
+            value = value.replace("{" + key + "}", str(id_))
+        return value
+    if isinstance(value, list):
+        return [fill(v, ids) for v in value]
+    if isinstance(value, dict):
+        return {k: fill(v, ids) for k, v in value.items()}
+    return value
+
+
+@pytest.fixture(scope="module")
+async def ids(client) -> dict:
+    operators = [
+        (await client.post("/operators/", json={"name": f"op{i}", "workload_limit": 1000})).json() for i in range(5)
+    ]
+    source = (await client.post("/sources/", json={"name": "budget-seed-src"})).json()
+    await client.post(f"/sources/{source['id']}/weights",
+                      json=[{"operator_id": op["id"], "weight": i + 1} for i, op in enumerate(operators)])
+    for i in range(20):
+        contact = (await client.post("/contacts/", json={"lead_identifier": f"seed{i}", "source_id": source["id"]})).json()
+    return {"op": operators[0]["id"], "source": source["id"], "lead": "seed1", "contact": contact["id"]}
+
+
+@pytest.mark.parametrize("name, method, path, body, budget", BUDGETS, ids=[b[0] for b in BUDGETS])
+async def test_query_budget(client, ids, query_budget, name, method, path, body, budget):
+    # Every endpoint is measured warm, the way it runs in production
+    with query_budget(name, budget):
+        response = await client.request(method, fill(path, ids), json=fill(body, ids))
+    assert response.status_code < 400, response.text
@@ -0,0 +1,180 @@
+"""
+Query-plan regression test: runs every query path in crud.py, logic.py,
+routers/view.py, export.py and workload.py against the migrated scratch
+database while recording the SQL they emit, then runs EXPLAIN QUERY PLAN on
+each statement and fails if any of them falls back to a full scan of the
+contacts table. stats.rebuild/check aggregate the whole table and may scan
+it once.
+"""
+import re
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event
+from starlette.responses import Response
+
+from app import (
+    affinity, archive, crud, database, export, intake, lead_import, logic, models, pagination, routing, schemas,
+    stats, workload,
+)
+from app.config import settings
+from app.routers import view
+
+# "SCAN contacts" without "USING [COVERING] INDEX" reads every row of the
+# table (contacts_archive, the cold table, may be scanned)
+FULL_SCAN = re.compile(r"^SCAN contacts\b(?! USING)")
+
+
+async def seed():
+    async with database.AsyncSessionLocal() as db:
+        operators = [
+            await crud.create_operator(db, schemas.OperatorCreate(name=f"op{i}", workload_limit=1000))
+            for i in range(5)
+        ]
+        sources = [await crud.create_source(db, schemas.SourceCreate(name=f"src{i}")) for i in range(3)]
+        for source in sources:
+            await crud.set_source_weights(
+                db, source.id, [schemas.SourceWeight(operator_id=op.id, weight=i + 1) for i, op in enumerate(operators)]
+            )
+        await logic.distribute_contacts(
+            db, [schemas.ContactCreate(lead_identifier=f"seed{i}", source_id=sources[i % 3].id) for i in range(300)]
+        )
+        return operators, sources
+
+
+async def exercise(operators, sources):
+    """Every DB-touching path we care about. Extend this when adding queries."""
+    op, source = operators[0], sources[0]
+    async with database.AsyncSessionLocal() as db:
+        await crud.get_operators(db)
+        await crud.get_operators(db, after_id=2)
+        await crud.get_operator(db, op.id)
+        await crud.update_operator(db, op.id, True, 1000)
+        await crud.update_operators(db, [schemas.OperatorUpdate(id=op.id, workload_limit=1000)])
+        await crud.create_operators(db, [schemas.OperatorCreate(name="plan-op")])
+        await crud.set_source_weights(db, source.id, [schemas.SourceWeight(operator_id=op.id, weight=1)])
+        await routing.tables.get(db, source.id)
+        await routing.tables.check_versions(db)
+        await crud.get_lead_by_identifier(db, "seed1")
+        await crud.create_lead(db, "plan-lead")
+        crud.lead_cache.clear()
+        lead_id = await crud.resolve_lead_id(db, "seed2")
+        await crud.resolve_lead_ids(db, ["seed3", "plan-new"])
+        await crud.get_existing_source_ids(db, {source.id})
+        await crud.create_contact(db, lead_id, source.id, op.id)
+        await crud.get_operator_workload(db, op.id)
+        contact_ids = [c.id for c in await crud.set_contacts_status(db, [1, 2], models.Contact.CLOSED)]
+        await crud.set_contacts_status(db, contact_ids, models.Contact.OPEN)
+        await crud.get_contact(db, 1)
+        await workload.count_workloads(db)
+
+        workload.counters.reset()
+        await logic.select_operator(db, source.id)
+        await logic.select_operators(db, [s.id for s in sources])
+        await logic.distribute_contacts(db, [schemas.ContactCreate(lead_identifier="plan-batch", source_id=source.id)])
+
+        # Sticky routing: warm-up query, then a hit claims the previous operator
+        settings.affinity_mode = affinity.SOURCE
+        await affinity.assignments.warm(db)
+        await logic.select_operator(db, source.id, lead_id)
+        await logic.select_operators(db, [source.id], [lead_id])
+        settings.affinity_mode = affinity.OFF
+        affinity.assignments.clear()
+
+        queued = await intake.pool.enqueue(db, schemas.ContactCreate(lead_identifier="plan-queued", source_id=source.id))
+        await intake.count_waiting(db)
+        await intake.get_intake(db, queued.id)
+        for row in await intake.pool._claim(4):
+            await intake.pool._process(row)
+        await intake.pool._sweep()
+        queued = await intake.pool.enqueue(db, schemas.ContactCreate(lead_identifier="plan-released", source_id=source.id))
+        await intake.pool._claim(1)
+        await intake.pool._release(db, intake.pool._held)
+
+        job = await lead_import.create_job(db, "plan.ndjson", "ndjson", source.id, op.id)
+        await lead_import.run(database.AsyncSessionLocal, job.id, iter(["seed4", "plan-import", None]))
+        await lead_import.get_job(db, job.id)
+        await archive.archive_batch(db, archive.cutoff_for(0), 10)
+
+        # Counters and operators.load under the other workload policies;
+        # the load rewrites are rolled back
+        for policy in (workload.WINDOW, workload.ALL_TIME):
+            settings.workload_policy = policy
+            await workload.count_workloads(db)
+            await workload.count_window_buckets(db, workload.counters.bucket_seconds)
+            await workload.sync_operator_loads(db)
+            await db.rollback()
+        settings.workload_policy = workload.OPEN
+
+    async with database.ReadSessionLocal() as db:
+        await view.read_leads(Response(), skip=10, limit=10, after=None, db=db)
+        await view.read_leads(Response(), skip=0, limit=10, after=pagination.encode_cursor(10), db=db)
+        await view.get_stats(db=db)
+        await view.get_stats_timeseries(start=None, end=None, granularity="hour", operator_id=None, source_id=None, db=db)
+
+        since = datetime.now(timezone.utc) - timedelta(days=1)
+        for filters in (
+            {"created_from": since, "created_to": since + timedelta(days=2)},
+            {"source_id": source.id, "created_from": since},
+            {"operator_id": op.id, "created_to": since},
+        ):
+            await db.execute(export.contacts_query(**filters))
+            await db.execute(export.leads_query(**filters))
+
+
+async def exercise_maintenance():
+    """Whole-table aggregations: they may read contacts once, but only once."""
+    async with database.AsyncSessionLocal() as db:
+        await stats.rebuild(db)
+        await db.commit()
+        await stats.check(db)
+
+
+def explain(db_path: str, statement: str, parameters: tuple) -> list[str]:
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    return [row[-1] for row in rows]
+
+
+@pytest.fixture(scope="module")
+async def captured(db_path) -> list[tuple[str, tuple, bool]]:
+    # (statement, parameters, issued by exercise_maintenance)
+    statements = []
+    maintenance = False
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        statements.append((statement, tuple(parameters or ()), maintenance))
+
+    operators, sources = await seed()
+    engines = {database.engine, database.read_engine}
+    for engine in engines:
+        event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        await exercise(operators, sources)
+        maintenance = True
+        await exercise_maintenance()
+    finally:
+        for engine in engines:
+            event.remove(engine.sync_engine, "before_cursor_execute", capture)
+    return statements
+
+
+async def test_no_full_scan_of_contacts(db_path, captured):
+    # Hot-path statements may not scan contacts at all, maintenance ones
+    # once; a statement issued by both is held to the hot-path rule
+    allowed = {}
+    parameters = {}
+    for statement, params, maintenance in captured:
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT")):
+            allowed[statement] = min(allowed.get(statement, 1), int(maintenance))
+            parameters.setdefault(statement, params)
+    failures = []
+    for statement, params in parameters.items():
+        plan = explain(db_path, statement, params)
+        if sum(bool(FULL_SCAN.match(line)) for line in plan) > allowed[statement]:
+            failures.append(" ".join(statement.split())[:110] + "".join(f"\n    {line}" for line in plan))
+    assert parameters
+    assert not failures, f"{len(failures)} of {len(parameters)} statements scan contacts:\n" + "\n".join(failures)
@@ -0,0 +1,130 @@
+import collections
+import random
+
+import pytest
+from sqlalchemy import update
+
+from app import crud, models, routing, schemas, workload
+
+DRAWS = 100_000
+
+
+@pytest.fixture
+def rng():
+    state = random.getstate()
+    random.seed(20261018)
+    yield
+    random.setstate(state)
+
+
+@pytest.fixture
+def counters(monkeypatch):
+    # Loaded, empty counters the tables under test read instead of the app's
+    fresh = workload.WorkloadCounters()
+    fresh._loaded = True
+    monkeypatch.setattr(workload, "counters", fresh)
+    return fresh
+
+
+def frequencies(sample, draws: int = DRAWS) -> dict:
+    counts = collections.Counter(sample() for _ in range(draws))
+    return {item: count / draws for item, count in counts.items()}
+
+
+@pytest.mark.parametrize("table_class", [routing.AliasTable, routing.BlockAliasTable])
+def test_draws_follow_weights(rng, table_class):
+    items = list(range(12))
+    weights = [1, 2, 3, 4, 5, 0, 7, 8, 9, 10, 1, 50]
+    table = table_class(items, weights)
+    seen = frequencies(table.sample)
+    assert 5 not in seen
+    for item, weight in zip(items, weights):
+        assert seen.get(item, 0) == pytest.approx(weight / sum(weights), abs=0.005)
+
+
+@pytest.mark.parametrize("table_class", [routing.AliasTable, routing.BlockAliasTable])
+def test_zero_and_single_weights(table_class):
+    assert len(table_class([], [])) == 0
+    assert len(table_class([1, 2], [0, 0])) == 0
+    single = table_class([7], [3])
+    assert len(single) == 1
+    assert {single.sample() for _ in range(100)} == {7}
+    assert {table_class([1, 2, 3], [0, 4, 0]).sample() for _ in range(100)} == {2}
+
+
+def test_block_weights_change_one_item_at_a_time(rng):
+    table = routing.BlockAliasTable(list(range(20)), [1] * 20)
+    for item in range(19):
+        table.set_weight(item, 0)
+    assert len(table) == 1
+    assert {table.sample() for _ in range(100)} == {19}
+    table.set_weight(3, 3)
+    seen = frequencies(table.sample)
+    assert set(seen) == {3, 19}
+    assert seen[3] == pytest.approx(0.75, abs=0.01)
+
+
+def test_routing_table_skips_inactive_and_zero_weight(counters):
+    table = routing.RoutingTable(1, [(1, 1, False, 5), (2, 0, True, 5), (3, 2, True, 5)])
+    assert {table.select() for _ in range(100)} == {3}
+    assert routing.RoutingTable(2, [(1, 1, False, 5)]).select() is None
+    assert routing.RoutingTable(3, []).select() is None
+
+
+def test_mark_full_then_readmit(counters, rng):
+    table = routing.RoutingTable(1, [(1, 1, True, 5), (2, 1, True, 5)])
+    table.mark_full(1)
+    assert counters.get(1) == 5
+    assert {table.select() for _ in range(200)} == {2}
+    # Still at the limit: stays out
+    table.readmit(1)
+    assert {table.select() for _ in range(200)} == {2}
+    counters.increment(1, -1)
+    table.readmit(1)
+    assert {table.select() for _ in range(200)} == {1, 2}
+
+
+def test_saturated_by_counters_and_all_full(counters):
+    table = routing.RoutingTable(1, [(1, 1, True, 2), (2, 1, True, 2)])
+    for op_id in (1, 2):
+        counters.increment(op_id, 2)
+    assert table.select() is None
+    assert not table.accepts(1)
+
+
+def test_freed_capacity_readmits_cached_tables(counters, rng):
+    cache = routing.RoutingCache()
+    counters.subscribe(cache.capacity_freed)
+    table = routing.RoutingTable(1, [(1, 1, True, 3), (2, 1, True, 3)])
+    cache._tables[1] = table
+    table.mark_full(1)
+    assert {table.select() for _ in range(200)} == {2}
+    counters.increment(1, -1)
+    assert {table.select() for _ in range(200)} == {1, 2}
+
+
+async def test_cache_rebuilds_after_config_version_change(db):
+    ops = [
+        await crud.create_operator(db, schemas.OperatorCreate(name=f"routing-op{i}", workload_limit=10))
+        for i in range(2)
+    ]
+    source = await crud.create_source(db, schemas.SourceCreate(name="routing-src"))
+    await crud.set_source_weights(db, source.id, [schemas.SourceWeight(operator_id=ops[0].id, weight=1)])
+    cache = routing.RoutingCache()
+    table = await cache.get(db, source.id)
+    assert await cache.get(db, source.id) is table
+    assert await cache.check_versions(db) == 0
+
+    # Another worker changes the weights: only config_version tells this one
+    db.add(models.SourceOperatorConfig(source_id=source.id, operator_id=ops[1].id, weight=4))
+    await db.execute(
+        update(models.Source).where(models.Source.id == source.id)
+        .values(config_version=models.Source.config_version + 1)
+    )
+    await db.commit()
+    assert await cache.get(db, source.id) is table
+    assert await cache.check_versions(db) == 1
+    rebuilt = await cache.get(db, source.id)
+    assert rebuilt is not table
+    assert rebuilt.version == table.version + 1
+    assert rebuilt.operator_ids == {ops[0].id, ops[1].id}
@@ -0,0 +1,128 @@
+from sqlalchemy import select
+
+from app import models, routing
+
+
+async def make_operators(client, prefix: str, count: int) -> list[int]:
+    response = await client.post(
+        "/operators/batch", json=[{"name": f"{prefix}{i}", "workload_limit": 5} for i in range(count)]
+    )
+    return [operator["id"] for operator in response.json()]
+
+
+async def stored_weights(db, source_id: int) -> dict[int, int]:
+    db.expunge_all()
+    Config = models.SourceOperatorConfig
+    result = await db.execute(select(Config.operator_id, Config.weight).where(Config.source_id == source_id))
+    return dict(result.all())
+
+
+async def config_version(db, source_id: int) -> int:
+    return await db.scalar(select(models.Source.config_version).where(models.Source.id == source_id))
+
+
+async def test_set_weights_writes_only_the_difference(client, db):
+    ops = await make_operators(client, "weights-op", 4)
+    source = (await client.post("/sources/", json={"name": "weights-src"})).json()
+    url = f"/sources/{source['id']}/weights"
+    assert source["config_version"] == 0
+
+    response = await client.post(url, json=[{"operator_id": ops[0], "weight": 1}, {"operator_id": ops[1], "weight": 2}])
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok", "version": 1, "added": 2, "changed": 0, "removed": 0}
+    assert await stored_weights(db, source["id"]) == {ops[0]: 1, ops[1]: 2}
+
+    # One kept, one changed, one added; a repeated operator keeps its last weight
+    response = await client.post(url, json=[
+        {"operator_id": ops[0], "weight": 1},
+        {"operator_id": ops[1], "weight": 7},
+        {"operator_id": ops[2], "weight": 1},
+        {"operator_id": ops[2], "weight": 3},
+    ])
+    assert response.json() == {"status": "ok", "version": 2, "added": 1, "changed": 1, "removed": 0}
+    assert await stored_weights(db, source["id"]) == {ops[0]: 1, ops[1]: 7, ops[2]: 3}
+
+    response = await client.post(url, json=[{"operator_id": ops[0], "weight": 1}, {"operator_id": ops[3], "weight": 4}])
+    assert response.json() == {"status": "ok", "version": 3, "added": 1, "changed": 0, "removed": 2}
+    assert await stored_weights(db, source["id"]) == {ops[0]: 1, ops[3]: 4}
+
+    # Same weights again: nothing written, version unchanged
+    response = await client.post(url, json=[{"operator_id": ops[3], "weight": 4}, {"operator_id": ops[0], "weight": 1}])
+    assert response.json() == {"status": "ok", "version": 3, "added": 0, "changed": 0, "removed": 0}
+    assert await config_version(db, source["id"]) == 3
+
+    response = await client.post(url, json=[])
+    assert response.json() == {"status": "ok", "version": 4, "added": 0, "changed": 0, "removed": 2}
+    assert await stored_weights(db, source["id"]) == {}
+
+
+async def test_set_weights_invalidates_routing_table(client, db):
+    ops = await make_operators(client, "weights-cache-op", 2)
+    source = (await client.post("/sources/", json={"name": "weights-cache-src"})).json()
+    url = f"/sources/{source['id']}/weights"
+    await client.post(url, json=[{"operator_id": ops[0], "weight": 1}])
+    table = await routing.tables.get(db, source["id"])
+    assert table.operator_ids == {ops[0]}
+
+    await client.post(url, json=[{"operator_id": ops[0], "weight": 1}])
+    assert await routing.tables.get(db, source["id"]) is table
+    await client.post(url, json=[{"operator_id": ops[1], "weight": 1}])
+    rebuilt = await routing.tables.get(db, source["id"])
+    assert rebuilt.operator_ids == {ops[1]}
+    assert rebuilt.version == 2
+
+
+async def test_set_weights_unknown_source(client, db):
+    ops = await make_operators(client, "weights-unknown-op", 1)
+    source_ids = await db.scalars(select(models.Source.id))
+    unknown = max(source_ids, default=0) + 1000
+    response = await client.post(f"/sources/{unknown}/weights", json=[{"operator_id": ops[0], "weight": 1}])
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Source not found"}
+    db.expunge_all()
+    configs = await db.scalars(select(models.SourceOperatorConfig).where(models.SourceOperatorConfig.operator_id == ops[0]))
+    assert configs.all() == []
+
+
+async def test_update_operators_bumps_their_sources(client, db):
+    ops = await make_operators(client, "update-op", 3)
+    sources = [(await client.post("/sources/", json={"name": f"update-src{i}"})).json()["id"] for i in range(3)]
+    await client.post(f"/sources/{sources[0]}/weights", json=[{"operator_id": ops[0], "weight": 1}])
+    await client.post(f"/sources/{sources[1]}/weights", json=[{"operator_id": ops[1], "weight": 1}])
+    await client.post(f"/sources/{sources[2]}/weights", json=[{"operator_id": ops[2], "weight": 1}])
+
+    response = await client.patch("/operators/batch", json=[
+        {"id": ops[0], "workload_limit": 9},
+        {"id": ops[1], "is_active": False},
+        {"id": ops[0], "is_active": False},
+    ])
+    assert response.status_code == 200
+    body = {operator["id"]: operator for operator in response.json()}
+    assert list(body) == [ops[0], ops[1]]
+    assert (body[ops[0]]["workload_limit"], body[ops[0]]["is_active"]) == (9, False)
+    assert (body[ops[1]]["workload_limit"], body[ops[1]]["is_active"]) == (5, False)
+    # Only the sources routing to an updated operator are bumped
+    assert [await config_version(db, source_id) for source_id in sources] == [2, 2, 1]
+
+    # Id-only items change nothing and bump nothing
+    response = await client.patch("/operators/batch", json=[{"id": ops[2]}])
+    assert response.status_code == 200
+    assert await config_version(db, sources[2]) == 1
+
+
+async def test_update_operators_unknown_id_writes_nothing(client, db):
+    ops = await make_operators(client, "update-missing-op", 2)
+    source = (await client.post("/sources/", json={"name": "update-missing-src"})).json()["id"]
+    await client.post(f"/sources/{source}/weights", json=[{"operator_id": ops[0], "weight": 1}])
+    unknown = ops[-1] + 1000
+
+    response = await client.patch("/operators/batch", json=[
+        {"id": ops[0], "workload_limit": 1},
+        {"id": unknown, "workload_limit": 1},
+    ])
+    assert response.status_code == 404
+    assert response.json() == {"detail": f"Operators not found: [{unknown}]"}
+    db.expunge_all()
+    operator = await db.get(models.Operator, ops[0])
+    assert operator.workload_limit == 5
+    assert await config_version(db, source) == 1
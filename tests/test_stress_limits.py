@@ -0,0 +1,11 @@
+"""
+Workload limits across processes: two app processes share one database and
+create twice as many contacts as there are slots (see stress_limits.py).
+"""
+import stress_limits
+
+
+def test_limits_hold_and_capacity_is_used():
+    checks = stress_limits.stress(processes=2, concurrency=8, contacts=150)
+    failed = {name: result for name, result in checks.items() if not result["ok"]}
+    assert not failed
@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import update
+
+from app import crud, models, routing, schemas, workload
+from app.config import settings
+
+
+def test_window_counter_expires_old_buckets():
+    window = workload.WindowCounter(4)
+    window.add(10)
+    window.add(11, 2)
+    window.add(13, 3)
+    assert window.value(13) == 6
+    # Window is now buckets 11-14: bucket 10 drops out, the rest stay
+    assert window.value(14) == 5
+    assert window.value(15) == 3
+    assert window.value(16) == 3
+    assert window.value(17) == 0
+    assert window.slots == [0, 0, 0, 0]
+
+
+def test_window_counter_late_and_expired_adds():
+    window = workload.WindowCounter(4)
+    window.add(20)
+    # Late but still inside the window: counted; older than the window: dropped
+    window.add(18, 2)
+    window.add(16, 5)
+    assert window.value(20) == 3
+    # Asking about an older bucket doesn't move the window back
+    assert window.value(17) == 3
+    assert window.value(22) == 1
+
+
+def test_window_counter_jump_clears_everything():
+    window = workload.WindowCounter(4)
+    for index in range(100, 104):
+        window.add(index, index)
+    window.add(1000)
+    assert window.value(1000) == 1
+    assert sorted(window.slots) == [0, 0, 0, 1]
+
+
+@pytest.fixture
+def window_policy(monkeypatch):
+    # 4-hour window in 4 one-hour buckets
+    monkeypatch.setattr(settings, "workload_policy", workload.WINDOW)
+    monkeypatch.setattr(settings, "workload_window_hours", 4)
+    monkeypatch.setattr(settings, "workload_window_buckets", 4)
+
+
+@pytest.fixture
+def counters(monkeypatch, window_policy):
+    fresh = workload.WorkloadCounters()
+    fresh._loaded = True
+    monkeypatch.setattr(workload, "counters", fresh)
+    return fresh
+
+
+@pytest.fixture
+def clock(monkeypatch, counters):
+    # Current bucket index, moved by the test instead of time.time()
+    now = [1000]
+    monkeypatch.setattr(counters, "_bucket_now", lambda: now[0])
+    return now
+
+
+def test_window_counts_expire_with_the_clock(counters, clock):
+    counters.increment(1)
+    clock[0] += 1
+    counters.increment(1, 2)
+    assert counters.get(1) == 3
+    clock[0] += 3
+    assert counters.get(1) == 2
+    clock[0] += 1
+    assert counters.get(1) == 0
+
+
+def test_operator_readmitted_once_assignments_leave_window(counters, clock):
+    table = routing.RoutingTable(1, [(1, 1, True, 2), (2, 1, True, 2)])
+    counters.increment(1)
+    clock[0] += 2
+    counters.increment(1)
+    # At its limit: left out of the draw until readmitted
+    assert not table.accepts(1)
+    assert {table.select() for _ in range(100)} == {2}
+
+    # The first assignment is still inside the window
+    clock[0] += 1
+    table.readmit(1)
+    assert {table.select() for _ in range(100)} == {2}
+
+    clock[0] += 1
+    assert counters.get(1) == 1
+    table.readmit(1)
+    assert table.accepts(1)
+    assert {table.select() for _ in range(200)} == {1, 2}
+
+
+async def test_reconcile_readmits_after_contacts_leave_window(db, counters):
+    ops = [
+        await crud.create_operator(db, schemas.OperatorCreate(name=f"window-op{i}", workload_limit=2))
+        for i in range(2)
+    ]
+    source = await crud.create_source(db, schemas.SourceCreate(name="window-src"))
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    db.add_all(
+        models.Contact(source_id=source.id, operator_id=ops[0].id, created_at=now - timedelta(minutes=minutes))
+        for minutes in (10, 20)
+    )
+    await db.commit()
+    await counters.load(db)
+    assert counters.get(ops[0].id) == 2
+
+    cache = routing.RoutingCache()
+    counters.subscribe(cache.capacity_freed)
+    table = routing.RoutingTable(source.id, [(ops[0].id, 1, True, 2), (ops[1].id, 1, True, 2)])
+    cache._tables[source.id] = table
+    assert {table.select() for _ in range(100)} == {ops[1].id}
+
+    # Time passes: one of the contacts is now older than the window
+    await db.execute(
+        update(models.Contact)
+        .where(models.Contact.operator_id == ops[0].id, models.Contact.created_at <= now - timedelta(minutes=20))
+        .values(created_at=now - timedelta(hours=5))
+    )
+    await db.commit()
+    assert await counters.reconcile(db) == 1
+    assert counters.get(ops[0].id) == 1
+    assert {table.select() for _ in range(200)} == {ops[0].id, ops[1].id}